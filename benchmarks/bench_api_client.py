@@ -0,0 +1,134 @@
+"""
+Micro-benchmark of the CalrissianContext construction with and without the
+shared ApiClient
+
+A local HTTP server stands in for the API server and counts the TCP
+connections it accepts, each context is created and checks its namespace once.
+
+    python -m benchmarks.bench_api_client --contexts 200
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+from loguru import logger
+
+from pycalrissian.clients import clear_api_clients
+from pycalrissian.context import CalrissianContext
+
+
+class CountingServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class NamespaceHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # headers and body are separate writes, avoid Nagle delays on reuse
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        body = json.dumps(
+            {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": "bench"}}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def write_kubeconfig(server_url: str) -> str:
+
+    kubeconfig = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "bench", "cluster": {"server": server_url}}],
+        "users": [{"name": "bench", "user": {"token": "bench"}}],
+        "contexts": [
+            {"name": "bench", "context": {"cluster": "bench", "user": "bench"}}
+        ],
+        "current-context": "bench",
+    }
+    handle, path = tempfile.mkstemp(suffix=".yaml")
+    with os.fdopen(handle, "w") as stream:
+        yaml.safe_dump(kubeconfig, stream)
+    return path
+
+
+def run(server: CountingServer, contexts: int, shared: bool):
+
+    clear_api_clients()
+    server.connections = 0
+
+    start = time.perf_counter()
+    for index in range(contexts):
+        context = CalrissianContext(
+            namespace="bench",
+            storage_class="bench",
+            volume_size="1G",
+            share_api_client=shared,
+        )
+        context.is_namespace_created()
+    elapsed = time.perf_counter() - start
+
+    return elapsed, server.connections
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contexts", type=int, default=200)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    server = CountingServer(("127.0.0.1", 0), NamespaceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.pop("HTTP_PROXY", None)
+    os.environ["KUBECONFIG"] = write_kubeconfig(
+        f"http://127.0.0.1:{server.server_address[1]}"
+    )
+
+    try:
+        print(
+            f"{'api client':<12}{'contexts':>10}{'time (s)':>12}"
+            f"{'per context (ms)':>20}{'connections':>14}"
+        )
+        for shared in [False, True]:
+            elapsed, connections = run(server, args.contexts, shared)
+            print(
+                f"{'shared' if shared else 'per context':<12}{args.contexts:>10}"
+                f"{elapsed:>12.3f}{1000 * elapsed / args.contexts:>20.2f}"
+                f"{connections:>14}"
+            )
+    finally:
+        server.shutdown()
+        os.remove(os.environ["KUBECONFIG"])
+
+
+if __name__ == "__main__":
+    main()
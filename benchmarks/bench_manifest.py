@@ -0,0 +1,121 @@
+"""
+Micro-benchmark of the job manifest rendering, kubernetes models serialised
+with the pure python YAML emitter against the plain dictionaries manifest
+serialised with the libyaml emitter
+
+The jobs of a parameter sweep are created against a fake cluster (no API call
+is made) and rendered as a manifest and as YAML.
+
+    python -m benchmarks.bench_manifest --jobs 10000
+"""
+
+import argparse
+import time
+
+import yaml
+from loguru import logger
+
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob, ManifestDumper, get_model_client
+
+CWL = {
+    "cwlVersion": "v1.0",
+    "$graph": [
+        {
+            "class": "Workflow",
+            "id": "main",
+            "inputs": {"tile": "string", "date": "string"},
+            "outputs": {},
+            "steps": {
+                "process": {
+                    "run": "#process",
+                    "in": {"tile": "tile", "date": "date"},
+                    "out": [],
+                }
+            },
+        },
+        {
+            "class": "CommandLineTool",
+            "id": "process",
+            "baseCommand": ["process"],
+            "inputs": {
+                "tile": {"type": "string", "inputBinding": {"prefix": "--tile"}},
+                "date": {"type": "string", "inputBinding": {"prefix": "--date"}},
+            },
+            "outputs": {},
+        },
+    ],
+}
+
+
+def build_models(job: CalrissianJob) -> dict:
+
+    job.invalidate()
+    return get_model_client().sanitize_for_serialization(job.to_k8s_job())
+
+
+def build_manifest(job: CalrissianJob) -> dict:
+
+    job.invalidate()
+    return job.to_manifest()
+
+
+def render_models(job: CalrissianJob) -> str:
+
+    job.invalidate()
+    manifest = get_model_client().sanitize_for_serialization(job.to_k8s_job())
+    return yaml.dump(manifest, Dumper=yaml.Dumper, default_flow_style=False)
+
+
+def render_manifest(job: CalrissianJob) -> str:
+
+    job.invalidate()
+    return yaml.dump(job.to_manifest(), Dumper=ManifestDumper, default_flow_style=False)
+
+
+def render_memoised(job: CalrissianJob) -> str:
+
+    return yaml.dump(job.to_manifest(), Dumper=ManifestDumper, default_flow_style=False)
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10000)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    context = FakeKubernetes().context(namespace="bench")
+
+    start = time.perf_counter()
+    jobs = [
+        CalrissianJob(
+            cwl=CWL,
+            params={"tile": f"T{index:05d}", "date": "2023-01-01"},
+            runtime_context=context,
+            cwl_entry_point="main",
+            pod_env_vars={"A": "1"},
+        )
+        for index in range(args.jobs)
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"{'jobs created':<22}{args.jobs:>8}{elapsed:>12.3f}s")
+
+    print(f"{'rendering':<22}{'jobs':>8}{'time (s)':>12}{'jobs/s':>12}")
+    for name, render in [
+        ("models", build_models),
+        ("manifest", build_manifest),
+        ("models + yaml.Dumper", render_models),
+        ("manifest + libyaml", render_manifest),
+        ("memoised manifest", render_memoised),
+    ]:
+        start = time.perf_counter()
+        for job in jobs:
+            render(job)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{args.jobs:>8}{elapsed:>12.3f}{args.jobs / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the pod listing of a namespace, deserialised as kubernetes
+models against parsed as raw JSON with json and orjson
+
+The pods are created in a fake cluster from the calrissian pod template.
+
+    python -m benchmarks.bench_raw --pods 500 --lists 20
+"""
+
+import argparse
+import json
+import time
+
+import orjson
+from loguru import logger
+
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob
+
+CWL = {
+    "cwlVersion": "v1.0",
+    "$graph": [{"class": "Workflow", "id": "main"}],
+}
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pods", type=int, default=500)
+    parser.add_argument("--lists", type=int, default=20)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    cluster = FakeKubernetes()
+    context = cluster.context(namespace="bench")
+    context.create_namespace()
+
+    template = CalrissianJob(
+        cwl=CWL,
+        params={"tile": "T00000"},
+        runtime_context=context,
+        cwl_entry_point="main",
+        pod_env_vars={"A": "1"},
+    ).to_manifest()["spec"]["template"]
+
+    for index in range(args.pods):
+        cluster.create(
+            "pods",
+            "bench",
+            {
+                "metadata": {**template["metadata"], "name": f"pod-{index}"},
+                "spec": template["spec"],
+            },
+        )
+
+    list_pods = context.core_v1_api.list_namespaced_pod
+
+    print(f"{'parsing':<16}{'lists':>8}{'time (s)':>12}{'pods/s':>12}")
+    for name, list_method in [
+        ("models", lambda: list_pods("bench").items),
+        ("json", lambda: json.loads(list_pods("bench", _preload_content=False).data)),
+        (
+            "orjson",
+            lambda: orjson.loads(list_pods("bench", _preload_content=False).data),
+        ),
+    ]:
+        start = time.perf_counter()
+        for _ in range(args.lists):
+            list_method()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:<16}{args.lists:>8}{elapsed:>12.3f}"
+            f"{args.pods * args.lists / elapsed:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of the state retained per execution, the kubernetes job model
+deserialised from each response against the compact ExecutionRecord updated
+from the JSON response
+
+A job is run against a fake cluster and its final JSON is used for every
+execution.
+
+    python -m benchmarks.bench_records --executions 10000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from loguru import logger
+
+from pycalrissian.execution import CalrissianExecution, ExecutionRecord
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob, get_model_client
+
+CWL = {
+    "cwlVersion": "v1.0",
+    "$graph": [{"class": "Workflow", "id": "main"}],
+}
+
+
+class Response:
+    """Stands for the API response deserialised by the kubernetes client"""
+
+    def __init__(self, data: str):
+        self.data = data
+
+
+def get_job_data() -> str:
+
+    cluster = FakeKubernetes(job_duration=0.1)
+    context = cluster.context(namespace="bench")
+    context.initialise()
+
+    job = CalrissianJob(
+        cwl=CWL,
+        params={"tile": "T00000"},
+        runtime_context=context,
+        cwl_entry_point="main",
+        pod_env_vars={"A": "1"},
+    )
+    execution = CalrissianExecution(job=job, runtime_context=context)
+    execution.submit()
+    execution.monitor(interval=0.05)
+
+    return json.dumps(cluster.get("jobs", "bench", job.job_name))
+
+
+def retain_models(data: str, executions: int) -> list:
+
+    client = get_model_client()
+    return [client.deserialize(Response(data), "V1Job") for _ in range(executions)]
+
+
+def retain_records(data: str, executions: int) -> list:
+
+    records = []
+    for index in range(executions):
+        record = ExecutionRecord(
+            name=f"job-{index}", namespace="bench", output_location="output.json"
+        )
+        record.update(json.loads(data))
+        records.append(record)
+    return records
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--executions", type=int, default=10000)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    data = get_job_data()
+
+    print(f"{'state':<16}{'executions':>12}{'time (s)':>12}{'memory (MB)':>14}")
+    for name, retain in [("V1Job models", retain_models), ("records", retain_records)]:
+        start = time.perf_counter()
+        retain(data, args.executions)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        retained = retain(data, args.executions)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del retained
+
+        print(
+            f"{name:<16}{args.executions:>12}{elapsed:>12.3f}{memory / 1024**2:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
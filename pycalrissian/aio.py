@@ -0,0 +1,1138 @@
+"""
+Asyncio counterparts of CalrissianContext and CalrissianExecution built on
+kubernetes_asyncio, a single event loop drives many executions without a
+thread per monitored job
+"""
+
+import asyncio
+import base64
+import json
+import math
+import os
+import tempfile
+import time
+import uuid
+from http import HTTPStatus
+from typing import Dict, List, Optional, TextIO
+
+from loguru import logger
+
+from pycalrissian.context import CONTENT_ADDRESSED_LABEL, known_config_maps
+from pycalrissian.execution import ExecutionRecord, JobStatus
+from pycalrissian.job import CalrissianJob, ContainerNames
+
+try:
+    from aiohttp import ClientError
+    from kubernetes_asyncio import client, config, watch
+    from kubernetes_asyncio.client.rest import ApiException
+    from kubernetes_asyncio.stream import WsApiClient
+    from kubernetes_asyncio.stream.ws_client import (
+        ERROR_CHANNEL,
+        STDERR_CHANNEL,
+        STDOUT_CHANNEL,
+    )
+except ImportError:  # pragma: no cover
+    client = None
+
+
+# mount path of the calrissian-wdir volume in the helper pod, as in the jobs
+_HELPER_POD_MOUNT_PATH = "/calrissian"
+
+
+def _get_helper_pod_manifest(pod_name: str, claim_name: str) -> Dict:
+    """Returns the manifest of a busybox pod mounting the calrissian-wdir
+    volume, the files of the jobs are read with exec calls"""
+    return {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {"name": pod_name},
+        "spec": {
+            "volumes": [
+                {
+                    "name": "volume-calrissian-wdir",
+                    "persistentVolumeClaim": {"claimName": claim_name},
+                }
+            ],
+            "containers": [
+                {
+                    "image": "busybox",
+                    "name": "container-kube-cp",
+                    "args": [
+                        "/bin/sh",
+                        "-c",
+                        "while true;do date;sleep 5; done",
+                    ],
+                    "volumeMounts": [
+                        {
+                            "name": "volume-calrissian-wdir",
+                            "mountPath": _HELPER_POD_MOUNT_PATH,
+                        }
+                    ],
+                    "resources": {
+                        "limits": {"cpu": "100m", "memory": "100Mi"},
+                        "requests": {"cpu": "100m", "memory": "100Mi"},
+                    },
+                }
+            ],
+        },
+    }
+
+
+async def _exec(core_v1_api, pod_name: str, namespace: str, command: List[str]) -> str:
+    """Runs a command in a pod with a WsApiClient backed CoreV1Api, reads its
+    standard output and error apart and checks its exit status
+
+    Raises:
+        RuntimeError: if the command fails
+    """
+    stdout, stderr, returncode = [], [], None
+    connection = await core_v1_api.connect_get_namespaced_pod_exec(
+        pod_name,
+        namespace,
+        command=command,
+        stderr=True,
+        stdin=False,
+        stdout=True,
+        tty=False,
+        _preload_content=False,
+    )
+    async with connection as websocket:
+        async for message in websocket:
+            data = message.data
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            if len(data) < 2:
+                continue
+            channel, payload = data[0], data[1:]
+            if channel == STDOUT_CHANNEL:
+                stdout.append(payload)
+            elif channel == STDERR_CHANNEL:
+                stderr.append(payload)
+            elif channel == ERROR_CHANNEL:
+                returncode = WsApiClient.parse_error_data(payload)
+
+    if returncode != 0:
+        raise RuntimeError(
+            f"{command[0]} failed in pod {pod_name} (exit status {returncode}): "
+            f"{b''.join(stderr).decode('utf-8', errors='replace').strip()}"
+        )
+
+    return b"".join(stdout).decode("utf-8")
+
+
+class AsyncCalrissianContext:
+    """Creates a kubernetes namespace to run calrissian jobs, asyncio version"""
+
+    def __init__(
+        self,
+        namespace: str,
+        storage_class: str,
+        volume_size: str,
+        resource_quota: Dict = None,
+        image_pull_secrets: Dict = None,
+        kubeconfig_file: TextIO = None,
+        labels: Dict = None,
+        annotations: Dict = None,
+    ):
+        """Creates an AsyncCalrissianContext object, the kubernetes client is
+        created by connect() or on first use
+
+        Args:
+            namespace (str): name of the kubernetes namespace
+            storage_class (str): name of the storage class for the RWX persistent volume claim    # noqa: E501
+            volume_size (str): size for the RWX volume (e.g. 10G)
+            image_pull_secrets (dict): a dictionary with the image pull secrets
+            kubeconfig_file (TextIO): path to the kubeconfig file to access the kubernetes cluster # noqa: E501
+
+        Returns:
+            None: none
+
+        """
+        if client is None:
+            raise ImportError(
+                "kubernetes_asyncio is required, install pycalrissian[asyncio]"
+            )
+
+        self.kubeconfig_file = kubeconfig_file
+
+        self.api_client = None
+        self.core_v1_api = None
+        self.batch_v1_api = None
+        self.rbac_authorization_v1_api = None
+
+        self.namespace = namespace
+        self.storage_class = storage_class
+        self.volume_size = volume_size
+
+        self.resource_quota = resource_quota
+
+        self.image_pull_secrets = image_pull_secrets
+        self.secret_name = "container-rg"
+        self.secret_names = []
+        self.calrissian_wdir = "calrissian-wdir"
+
+        self.labels = labels
+        self.annotations = annotations
+
+        # the helper pod reading the job files on the calrissian-wdir volume,
+        # shared by the executions while the context is connected
+        self.helper_pod_name = None
+        # created on first use: before Python 3.10 a lock binds to the event
+        # loop current at its creation, not the one running the context
+        self._connect_lock = None
+        self._helper_pod_lock = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """Creates the kubernetes client, does nothing if already connected"""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.api_client is not None:
+                return
+
+            proxy_url = os.getenv("HTTP_PROXY", None)
+            kubeconfig = os.getenv("KUBECONFIG", None) or self.kubeconfig_file
+
+            if proxy_url:
+                api_config = client.Configuration(host=proxy_url)
+                api_config.proxy = proxy_url
+                self.api_client = client.ApiClient(api_config)
+            else:
+                api_config = client.Configuration()
+                await config.load_kube_config(
+                    config_file=kubeconfig, client_configuration=api_config
+                )
+                self.api_client = client.ApiClient(api_config)
+
+            self.core_v1_api = client.CoreV1Api(api_client=self.api_client)
+            self.batch_v1_api = client.BatchV1Api(api_client=self.api_client)
+            self.rbac_authorization_v1_api = client.RbacAuthorizationV1Api(
+                api_client=self.api_client
+            )
+
+    async def close(self):
+        """Deletes the helper pod and closes the kubernetes client connections"""
+        if self.api_client is not None:
+            await self.dismiss_helper_pod()
+            await self.api_client.close()
+            self.api_client = None
+
+    async def initialise(self) -> Dict:
+        """Create the kubernetes resources to run a Calrissian job
+
+        The namespace is created first, the other objects are then created
+        concurrently
+
+        Returns:
+            Dict: the provisioning time in seconds of each object
+        """
+        await self.connect()
+
+        report = {}
+
+        async def timed(name, coroutine):
+            start = time.perf_counter()
+            await coroutine
+            report[name] = time.perf_counter() - start
+            logger.info(f"{name} provisioned in {report[name]:.2f}s")
+
+        async def create_role(name, verbs, role_binding):
+            await timed(f"role/{name}", self.create_role(name=name, verbs=verbs))
+            await timed(
+                f"rolebinding/{role_binding}",
+                self.create_role_binding(name=role_binding, role=name),
+            )
+
+        async def create_secrets():
+            if (
+                "imagePullSecrets" in self.image_pull_secrets
+                and self.image_pull_secrets["imagePullSecrets"] is not None
+                and len(self.image_pull_secrets["imagePullSecrets"].keys()) > 0
+            ):
+                await timed(
+                    f"secret/{self.secret_name}",
+                    self.create_image_pull_secret(self.secret_name),
+                )
+            if (
+                "additionalImagePullSecrets" in self.image_pull_secrets
+                and self.image_pull_secrets["additionalImagePullSecrets"] is not None
+            ):
+                await timed(
+                    "secret/additional",
+                    self.create_additional_image_pull_secret(
+                        self.image_pull_secrets["additionalImagePullSecrets"]
+                    ),
+                )
+            await timed("serviceaccount/default", self.patch_service_account())
+
+        await timed(
+            "namespace",
+            self.create_namespace(labels=self.labels, annotations=self.annotations),
+        )
+
+        tasks = [
+            create_role(
+                "pod-manager-role",
+                ["create", "patch", "delete", "list", "watch"],
+                "pod-manager-default-binding",
+            ),
+            create_role(
+                "log-reader-role", ["get", "list"], "log-reader-default-binding"
+            ),
+            timed(
+                f"pvc/{self.calrissian_wdir}",
+                self.create_pvc(
+                    name=self.calrissian_wdir,
+                    size=self.volume_size,
+                    storage_class=self.storage_class,
+                    access_modes=["ReadWriteMany"],
+                ),
+            ),
+        ]
+
+        if self.image_pull_secrets:
+            tasks.append(create_secrets())
+
+        if self.resource_quota:
+            tasks.append(
+                timed(
+                    "resourcequota/calrissian-resource-quota",
+                    self.create_resource_quota(name="calrissian-resource-quota"),
+                )
+            )
+
+        await asyncio.gather(*tasks)
+
+        self.provisioning_report = report
+
+        return report
+
+    async def dispose(self):
+
+        await self.connect()
+
+        try:
+            await asyncio.gather(
+                self.batch_v1_api.delete_collection_namespaced_job(
+                    self.namespace, propagation_policy="Background"
+                ),
+                self.core_v1_api.delete_collection_namespaced_pod(
+                    self.namespace, grace_period_seconds=0
+                ),
+            )
+        except ApiException as e:
+            if e.status != HTTPStatus.NOT_FOUND:
+                logger.error(f"Exception when deleting the workloads: {e}\n")
+
+        # deleted with the pods
+        self.helper_pod_name = None
+
+        namespace_key = (self.api_client.configuration.host, self.namespace)
+        known_config_maps.discard_if(lambda known_key: known_key[:2] == namespace_key)
+
+        logger.info(f"dispose namespace {self.namespace}")
+        try:
+            response = await self.core_v1_api.delete_namespace(
+                name=self.namespace, grace_period_seconds=0
+            )
+            logger.info(f"namespace {self.namespace} deleted")
+            return response
+
+        except ApiException as e:
+            logger.info(
+                f"namespace {self.namespace} not deleted "
+                "in the time interval assigned"
+            )
+            raise e
+
+    async def delete_pod(self, name):
+
+        try:
+            return await self.core_v1_api.delete_namespaced_pod(name, self.namespace)
+        except ApiException as e:
+            logger.error(f"Exception when delete namespaced pod {name}: {e}\n")
+
+    async def get_helper_pod(self) -> str:
+        """Returns the name of the helper pod mounting the calrissian-wdir
+        volume, created on first use and again if it is no longer running"""
+        await self.connect()
+
+        if self._helper_pod_lock is None:
+            self._helper_pod_lock = asyncio.Lock()
+        async with self._helper_pod_lock:
+            if self.helper_pod_name is not None:
+                try:
+                    pod = await self.core_v1_api.read_namespaced_pod(
+                        name=self.helper_pod_name, namespace=self.namespace
+                    )
+                    if (
+                        pod.status.phase == "Running"
+                        and pod.metadata.deletion_timestamp is None
+                    ):
+                        return self.helper_pod_name
+                except ApiException as e:
+                    if e.status != HTTPStatus.NOT_FOUND:
+                        raise e
+                logger.warning(f"helper pod {self.helper_pod_name} is not running")
+                await self.delete_pod(self.helper_pod_name)
+                self.helper_pod_name = None
+
+            pod_name = f"kube-cp-{str(uuid.uuid4())[-6:]}"
+            await self.core_v1_api.create_namespaced_pod(
+                namespace=self.namespace,
+                body=_get_helper_pod_manifest(pod_name, self.calrissian_wdir),
+            )
+            while True:
+                pod = await self.core_v1_api.read_namespaced_pod(
+                    name=pod_name, namespace=self.namespace
+                )
+                if pod.status.phase != "Pending":
+                    break
+                await asyncio.sleep(1)
+
+            self.helper_pod_name = pod_name
+            return pod_name
+
+    async def dismiss_helper_pod(self):
+        """Deletes the helper pod, if any"""
+        if self._helper_pod_lock is None:
+            self._helper_pod_lock = asyncio.Lock()
+        async with self._helper_pod_lock:
+            if self.helper_pod_name is None:
+                return
+            try:
+                await self.core_v1_api.delete_namespaced_pod(
+                    self.helper_pod_name, self.namespace
+                )
+            except ApiException as e:
+                if e.status != HTTPStatus.NOT_FOUND:
+                    logger.error(
+                        f"helper pod {self.helper_pod_name} not deleted: {e.reason}"
+                    )
+            self.helper_pod_name = None
+
+    def _get_read_methods(self) -> Dict:
+
+        return {
+            "read_namespace": self.core_v1_api.read_namespace,
+            "read_namespaced_role": self.rbac_authorization_v1_api.read_namespaced_role,
+            "read_namespaced_role_binding": (
+                self.rbac_authorization_v1_api.read_namespaced_role_binding
+            ),
+            "read_namespaced_config_map": self.core_v1_api.read_namespaced_config_map,
+            "read_namespaced_persistent_volume_claim": (
+                self.core_v1_api.read_namespaced_persistent_volume_claim
+            ),
+            "read_namespaced_secret": self.core_v1_api.read_namespaced_secret,
+            "read_namespaced_resource_quota": (
+                self.core_v1_api.read_namespaced_resource_quota
+            ),
+        }
+
+    def _get_list_methods(self) -> Dict:
+
+        return {
+            "read_namespace": self.core_v1_api.list_namespace,
+            "read_namespaced_role": self.rbac_authorization_v1_api.list_namespaced_role,
+            "read_namespaced_role_binding": (
+                self.rbac_authorization_v1_api.list_namespaced_role_binding
+            ),
+            "read_namespaced_config_map": self.core_v1_api.list_namespaced_config_map,
+            "read_namespaced_persistent_volume_claim": (
+                self.core_v1_api.list_namespaced_persistent_volume_claim
+            ),
+            "read_namespaced_secret": self.core_v1_api.list_namespaced_secret,
+            "read_namespaced_resource_quota": (
+                self.core_v1_api.list_namespaced_resource_quota
+            ),
+        }
+
+    async def read_object(self, read_method, **kwargs):
+        """Reads an object, returns None if it does not exist"""
+        await self.connect()
+
+        name = kwargs.get("name", self.namespace)
+        try:
+            if read_method == "read_namespace":
+                return await self.core_v1_api.read_namespace(name=name)
+            return await self._get_read_methods()[read_method](
+                name=name, namespace=self.namespace
+            )
+        except ApiException as exc:
+            if exc.status == HTTPStatus.NOT_FOUND:
+                return None
+            raise exc
+
+    async def is_object_created(self, read_method, **kwargs) -> bool:
+
+        return await self.read_object(read_method, **kwargs) is not None
+
+    async def is_namespace_created(self, **kwargs):
+
+        return await self.is_object_created("read_namespace", **kwargs)
+
+    async def is_config_map_created(self, **kwargs):
+
+        return await self.is_object_created("read_namespaced_config_map", **kwargs)
+
+    async def wait_for_object(self, read_method, timeout: int = 60, **kwargs) -> bool:
+        """Waits until an object exists using a watch on its kind
+
+        Args:
+            read_method (str): the read method of the object kind
+            timeout (int): deadline in seconds
+            name (str): the object name, defaults to the namespace name
+
+        Returns:
+            bool: True if the object exists before the deadline
+        """
+        list_method = self._get_list_methods()[read_method]
+
+        list_kwargs = {
+            "field_selector": f"metadata.name={kwargs.get('name', self.namespace)}"
+        }
+        if read_method != "read_namespace":
+            list_kwargs["namespace"] = self.namespace
+
+        deadline = time.monotonic() + timeout
+
+        try:
+            while time.monotonic() < deadline:
+                response = await list_method(**list_kwargs)
+                if response.items:
+                    return True
+
+                async with watch.Watch() as object_watch:
+                    async for event in object_watch.stream(
+                        list_method,
+                        resource_version=response.metadata.resource_version,
+                        timeout_seconds=max(1, int(deadline - time.monotonic())),
+                        **list_kwargs,
+                    ):
+                        if event["type"] in ["ADDED", "MODIFIED"]:
+                            return True
+            return False
+
+        except ApiException as exc:
+            if exc.status not in [
+                HTTPStatus.FORBIDDEN,
+                HTTPStatus.METHOD_NOT_ALLOWED,
+                HTTPStatus.GONE,
+            ]:
+                raise exc
+
+        interval = 0.5
+        while time.monotonic() < deadline:
+            if await self.is_object_created(read_method, **kwargs):
+                return True
+            await asyncio.sleep(interval)
+            interval = min(5, interval * 2)
+        return False
+
+    async def _create_object(self, read_method, create, name, **kwargs):
+        """Creates an object unless it exists and waits for it"""
+        await self.connect()
+
+        existing = await self.read_object(read_method, name=name)
+        if existing is not None:
+            return existing
+
+        try:
+            response = await create(**kwargs)
+            if not await self.wait_for_object(read_method, name=name):
+                raise ApiException(status=HTTPStatus.REQUEST_TIMEOUT)
+            logger.info(f"{read_method.split('_', 1)[1]} {name} created")
+            return response
+        except ApiException as e:
+            logger.error(f"{name} not created in the time interval assigned: {e}\n")
+            raise e
+
+    async def create_namespace(self, labels: dict = None, annotations: dict = None):
+
+        return await self._create_object(
+            "read_namespace",
+            self.core_v1_api.create_namespace,
+            name=self.namespace,
+            body={
+                "metadata": {
+                    "name": self.namespace,
+                    "labels": labels,
+                    "annotations": annotations,
+                }
+            },
+        )
+
+    async def create_role(
+        self,
+        name: str,
+        verbs: list,
+        resources: list = ["pods", "pods/log"],
+        api_groups: list = ["*"],
+    ):
+
+        return await self._create_object(
+            "read_namespaced_role",
+            self.rbac_authorization_v1_api.create_namespaced_role,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "metadata": {"name": name, "namespace": self.namespace},
+                "rules": [
+                    {"apiGroups": api_groups, "resources": resources, "verbs": verbs}
+                ],
+            },
+        )
+
+    async def create_role_binding(self, name: str, role: str):
+
+        return await self._create_object(
+            "read_namespaced_role_binding",
+            self.rbac_authorization_v1_api.create_namespaced_role_binding,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "metadata": {"name": name, "namespace": self.namespace},
+                "roleRef": {"apiGroup": "", "kind": "Role", "name": role},
+                "subjects": [
+                    {
+                        "apiGroup": "",
+                        "kind": "ServiceAccount",
+                        "name": "default",
+                        "namespace": self.namespace,
+                    }
+                ],
+            },
+        )
+
+    async def create_resource_quota(self, name):
+
+        return await self._create_object(
+            "read_namespaced_resource_quota",
+            self.core_v1_api.create_namespaced_resource_quota,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "metadata": {"name": name, "namespace": self.namespace},
+                "spec": {"hard": self.resource_quota},
+            },
+        )
+
+    async def create_pvc(self, name, access_modes, size, storage_class):
+
+        return await self._create_object(
+            "read_namespaced_persistent_volume_claim",
+            self.core_v1_api.create_namespaced_persistent_volume_claim,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "metadata": {"name": name, "namespace": self.namespace},
+                "spec": {
+                    "accessModes": access_modes,
+                    "resources": {"requests": {"storage": size}},
+                    "storageClassName": storage_class,
+                },
+            },
+        )
+
+    async def create_configmap(
+        self,
+        name,
+        key=None,
+        content=None,
+        annotations: Dict = {},
+        labels: Dict = {},
+        data: Dict = None,
+        binary_data: Dict = None,
+    ):
+
+        await self.connect()
+
+        if await self.is_config_map_created(name=name):
+            try:
+                await self.core_v1_api.delete_namespaced_config_map(
+                    namespace=self.namespace, name=name
+                )
+            except ApiException as e:
+                if e.status != HTTPStatus.NOT_FOUND:
+                    raise e
+
+        return await self._create_object(
+            "read_namespaced_config_map",
+            self.core_v1_api.create_namespaced_config_map,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "data": data if data is not None else {key: content},
+                "binaryData": binary_data or None,
+                "metadata": {
+                    "annotations": annotations,
+                    "labels": labels,
+                    "name": name,
+                    "namespace": self.namespace,
+                },
+            },
+        )
+
+    async def create_immutable_configmap(
+        self,
+        name,
+        key=None,
+        content=None,
+        annotations: Dict = {},
+        labels: Dict = {},
+        data: Dict = None,
+        binary_data: Dict = None,
+    ):
+        """Creates an immutable config map unless it is known to exist, see
+        CalrissianContext.create_immutable_configmap"""
+        await self.connect()
+
+        known_key = (self.api_client.configuration.host, self.namespace, name)
+
+        if known_key in known_config_maps:
+            logger.info(f"config map {name} exists, skipping creation")
+            return
+
+        try:
+            response = await self.core_v1_api.create_namespaced_config_map(
+                namespace=self.namespace,
+                body={
+                    "apiVersion": "v1",
+                    "kind": "ConfigMap",
+                    "data": data if data is not None else {key: content},
+                    "binaryData": binary_data or None,
+                    "immutable": True,
+                    "metadata": {
+                        "annotations": annotations,
+                        "labels": {**labels, CONTENT_ADDRESSED_LABEL: "true"},
+                        "name": name,
+                        "namespace": self.namespace,
+                    },
+                },
+            )
+            logger.info(f"config map {name} created")
+        except ApiException as e:
+            if e.status != HTTPStatus.CONFLICT:
+                logger.error(f"config map {name} not created: {e}\n")
+                raise e
+            logger.info(f"config map {name} exists, skipping creation")
+            response = None
+
+        known_config_maps.add(known_key)
+
+        return response
+
+    async def _create_image_pull_secret(self, name, content):
+
+        return await self._create_object(
+            "read_namespaced_secret",
+            self.core_v1_api.create_namespaced_secret,
+            name=name,
+            namespace=self.namespace,
+            body={
+                "apiVersion": "v1",
+                "data": content,
+                "kind": "Secret",
+                "metadata": {"name": name, "namespace": self.namespace},
+                "type": "kubernetes.io/dockerconfigjson",
+            },
+        )
+
+    async def create_image_pull_secret(self, name):
+
+        data = {
+            ".dockerconfigjson": base64.b64encode(
+                json.dumps(self.image_pull_secrets["imagePullSecrets"]).encode()
+            ).decode()
+        }
+
+        self.secret_names.append(name)
+        return await self._create_image_pull_secret(name, data)
+
+    async def create_additional_image_pull_secret(self, secrets_list):
+
+        try:
+            for secret in secrets_list:
+                self.secret_names.append(secret["name"])
+                # Fetch the pre-existing secret from the ORIGIN_NAMESPACE
+                response = await self.core_v1_api.read_namespaced_secret(
+                    namespace=os.environ["ORIGIN_NAMESPACE"], name=secret["name"]
+                )
+                await self._create_image_pull_secret(secret["name"], response.data)
+        except Exception as e:
+            logger.error(f"Exception when creating image pull secret: {e}\n")
+
+    async def patch_service_account(self):
+        # adds the secrets to the namespace default service account
+
+        service_account = await self.core_v1_api.read_namespaced_service_account(
+            name="default", namespace=self.namespace
+        )
+
+        secrets = [
+            {"name": secret.name} for secret in (service_account.secrets or [])
+        ] + [{"name": name} for name in self.secret_names]
+        image_pull_secrets = [
+            {"name": secret.name}
+            for secret in (service_account.image_pull_secrets or [])
+        ] + [{"name": name} for name in self.secret_names]
+
+        await self.core_v1_api.patch_namespaced_service_account(
+            name="default",
+            namespace=self.namespace,
+            body={"secrets": secrets, "imagePullSecrets": image_pull_secrets},
+        )
+
+
+class AsyncCalrissianExecution:
+    """Submits and monitors a CalrissianJob, asyncio version"""
+
+    def __init__(
+        self, job: CalrissianJob, runtime_context: AsyncCalrissianContext
+    ) -> None:
+        self.job = job
+        self.runtime_context = runtime_context
+        self.killed = False
+        # the last job status read or watched, set on submission
+        self.record: Optional[ExecutionRecord] = None
+
+    def _validate(self):
+        """Checks that the job can be submitted without a helper pod
+
+        Raises:
+            ValueError: if documents of the job are staged on the volume
+        """
+        staged_documents = self.job.get_staged_documents()
+        if staged_documents:
+            keys = ", ".join(document["key"] for document in staged_documents)
+            raise ValueError(
+                f"{keys} larger than the staging threshold, staging on the "
+                "volume is only supported by CalrissianExecution"
+            )
+
+    async def submit(self):
+        """Creates the job config maps and submits the job to the cluster
+
+        Raises:
+            ValueError: if documents of the job are staged on the volume,
+                nothing is created
+        """
+        self._validate()
+
+        await self.runtime_context.connect()
+
+        await asyncio.gather(
+            *[
+                (
+                    self.runtime_context.create_immutable_configmap
+                    if config_map.pop("immutable")
+                    else self.runtime_context.create_configmap
+                )(**config_map)
+                for config_map in self.job.get_config_maps()
+            ]
+        )
+
+        logger.info(f"submit job {self.job.job_name}")
+        # set before the creation, the job may be watched as soon as it exists
+        self.namespaced_job_name = self.job.job_name
+        self.record = ExecutionRecord(
+            name=self.job.job_name,
+            namespace=self.runtime_context.namespace,
+            output_location=os.path.join(self.job.calrissian_job_path, "output.json"),
+        )
+        try:
+            response = await self.runtime_context.batch_v1_api.create_namespaced_job(
+                self.runtime_context.namespace, self.job.to_manifest()
+            )
+        except ApiException as e:
+            self.record = None
+            raise e
+        if self.record.resource_version is None:
+            self._update_status(response)
+        logger.info(f"job {self.job.job_name} submitted")
+
+    async def _read_status(self) -> bool:
+        """Reads the job status and returns True if it changed"""
+        try:
+            response = (
+                await self.runtime_context.batch_v1_api.read_namespaced_job_status(
+                    name=self.namespaced_job_name,
+                    namespace=self.runtime_context.namespace,
+                )
+            )
+        except ApiException as e:
+            logger.error(f"Exception when calling get status: {e}\n")
+            raise e
+        return self._update_status(response)
+
+    def _update_status(self, job) -> bool:
+
+        # the models are not retained, only the record of their status
+        if not isinstance(job, dict):
+            job = self.runtime_context.api_client.sanitize_for_serialization(job)
+        return self.record.update(job)
+
+    def is_finished(self) -> bool:
+        """Returns True once the job has its Complete or Failed condition, its
+        status no longer changes"""
+        return self.record is not None and self.record.finished
+
+    async def get_status(self):
+        """Returns the job status, read from the cluster until the job finishes"""
+        if self.killed:
+            return JobStatus.KILLED
+        if not self.is_finished():
+            await self._read_status()
+        return self.record.phase
+
+    async def is_complete(self) -> bool:
+        """Returns True if the job execution is completed (success or failed)"""
+        return await self.get_status() in [
+            JobStatus.SUCCEEDED,
+            JobStatus.FAILED,
+            JobStatus.KILLED,
+        ]
+
+    async def is_succeeded(self) -> bool:
+        """Returns True if the job execution is completed and succeeded"""
+        return await self.get_status() in [JobStatus.SUCCEEDED]
+
+    async def is_active(self) -> bool:
+        """Returns True if the job execution is on-going"""
+        return await self.get_status() in [JobStatus.ACTIVE]
+
+    async def get_start_time(self):
+        """Returns the start time"""
+        if self.record.start_time is None:
+            await self._read_status()
+        return self.record.start_time
+
+    async def get_completion_time(self):
+        """Returns either the completion time or the last transition time"""
+        if not self.is_finished():
+            await self._read_status()
+        return self.record.completion_time
+
+    async def _kill(self):
+
+        self.killed = True
+        await self.runtime_context.batch_v1_api.delete_namespaced_job(
+            namespace=self.runtime_context.namespace,
+            name=self.namespaced_job_name,
+            propagation_policy="Background",
+        )
+
+    async def monitor(
+        self,
+        interval: int = 5,
+        grace_period=120,
+        wall_time: Optional[int] = None,
+        max_interval: int = 60,
+        watch_timeout: int = 300,
+    ) -> None:
+        """Waits for the job to finish
+
+        The job status is updated from a watch on the job and, if the watch
+        fails or is closed early, by polling it every interval seconds, up to
+        max_interval seconds while it does not change. The job is killed after
+        wall_time seconds or if its pods wait with ImagePullBackOff, checked
+        every grace_period seconds.
+        """
+        if not await self.is_active():
+            logger.warning("job is not submitted")
+            return
+
+        start = time.monotonic()
+        next_check = start + grace_period
+        delay = interval
+        watch_failures = 0
+
+        while not self.is_finished() and not self.killed:
+
+            now = time.monotonic()
+            if wall_time is not None and now - start > wall_time:
+                logger.warning("reached wall time for execution, killing job")
+                await self._kill()
+                return
+
+            if now >= next_check:
+                next_check = now + grace_period
+                if await self.get_waiting_pods():
+                    logger.warning(
+                        "found pods in waiting status with reason ImagePullBackOff, killing job"  # noqa: E501
+                    )
+                    await self._kill()
+                    return
+
+            timeout = next_check - now
+            if wall_time is not None:
+                timeout = min(timeout, start + wall_time - now)
+
+            if watch_failures < 3:
+                watch_window = min(timeout, watch_timeout)
+                try:
+                    await self._watch_status(timeout=watch_window)
+                    watch_failures = 0
+                    if (
+                        self.is_finished()
+                        or self.killed
+                        or time.monotonic() - now >= watch_window
+                    ):
+                        continue
+                    # closed by the server before its timeout, the status is
+                    # read after a pause rather than reconnecting at once
+                except ApiException as e:
+                    if e.status == HTTPStatus.GONE:
+                        # the resource version is too old, read it again
+                        await self._read_status()
+                        continue
+                    watch_failures += 1
+                    logger.warning(f"watch on job {self.job.job_name} failed: {e}")
+                except (ClientError, asyncio.TimeoutError, OSError) as e:
+                    watch_failures += 1
+                    logger.warning(f"watch on job {self.job.job_name} failed: {e}")
+
+            # polling, slower while the status does not change
+            await asyncio.sleep(max(0, min(delay, timeout)))
+            if await self._read_status():
+                delay = interval
+            else:
+                delay = min(delay * 2, max_interval)
+
+        logger.info("execution is complete")
+        if await self.get_status() == JobStatus.SUCCEEDED:
+            logger.info("the outcome is: success!")
+
+    async def _watch_status(self, timeout: float):
+        """Updates the job status from a watch until the job finishes or the
+        timeout expires"""
+        job_watch = watch.Watch()
+        try:
+            async for event in job_watch.stream(
+                self.runtime_context.batch_v1_api.list_namespaced_job,
+                namespace=self.runtime_context.namespace,
+                field_selector=f"metadata.name={self.namespaced_job_name}",
+                resource_version=self.record.resource_version,
+                timeout_seconds=max(1, math.ceil(timeout)),
+            ):
+                if event["type"] == "DELETED":
+                    logger.warning(f"job {self.job.job_name} was deleted")
+                    self.killed = True
+                    return
+                self._update_status(event["raw_object"])
+                logger.info(
+                    f"job {self.job.job_name} is "
+                    f"{getattr(self.record.phase, 'value', None)}"
+                )
+                if self.is_finished():
+                    return
+        finally:
+            await job_watch.close()
+
+    async def wait(
+        self, interval: int = 5, grace_period=120, wall_time: Optional[int] = None
+    ) -> JobStatus:
+        """Waits for the job to complete and returns its final status"""
+        await self.monitor(
+            interval=interval, grace_period=grace_period, wall_time=wall_time
+        )
+        return await self.get_status()
+
+    async def get_waiting_pods(self) -> List:
+
+        response = await self.runtime_context.core_v1_api.list_namespaced_pod(
+            self.runtime_context.namespace
+        )
+
+        return [
+            pod
+            for pod in response.items
+            if any(
+                con_status.state.waiting
+                and con_status.state.waiting.reason in ["ImagePullBackOff"]
+                for con_status in (pod.status.container_statuses or [])
+            )
+        ]
+
+    async def get_log(self):
+        """Returns the job execution log"""
+        if await self.is_complete():
+            return await self._get_container_log(ContainerNames.CALRISSIAN)
+        return None
+
+    async def _get_container_log(self, container):
+
+        pods_list = await self.runtime_context.core_v1_api.list_namespaced_pod(
+            namespace=self.runtime_context.namespace,
+            label_selector=f"job-name={self.job.job_name}",
+            timeout_seconds=10,
+        )
+        return await self.runtime_context.core_v1_api.read_namespaced_pod_log(
+            name=pods_list.items[0].metadata.name,
+            namespace=self.runtime_context.namespace,
+            container=container.value,
+        )
+
+    async def get_output(self) -> Dict:
+        """Returns the job output"""
+        if await self.is_succeeded():
+            with tempfile.TemporaryDirectory() as staging_path:
+                filename = (
+                    await self.get_file_from_volume(["output.json"], staging_path)
+                )[0]
+                with open(filename, "r") as staged_file:
+                    return json.load(staged_file)
+
+    async def get_usage_report(self) -> Dict:
+        """Returns the job usage report"""
+        if await self.is_complete():
+            try:
+                with tempfile.TemporaryDirectory() as staging_path:
+                    filename = (
+                        await self.get_file_from_volume(["report.json"], staging_path)
+                    )[0]
+                    with open(filename, "r") as staged_file:
+                        return json.load(staged_file)
+            except json.decoder.JSONDecodeError:
+                return {}
+
+    async def get_tool_logs(self):
+        """stages the tool logs from k8s volume"""
+        usage_report = await self.get_usage_report()
+        if "children" in usage_report.keys():
+            return await self.get_file_from_volume(
+                [tool["name"] + ".log" for tool in usage_report["children"]]
+            )
+
+    async def get_file_from_volume(self, filenames, destination_path="."):
+        """Copies files of the job working directory with the helper pod of
+        the context"""
+        pod_name = await self.runtime_context.get_helper_pod()
+        namespace = self.runtime_context.namespace
+
+        destinations = []
+        async with WsApiClient(
+            configuration=self.runtime_context.api_client.configuration
+        ) as ws_api_client:
+            ws_core_v1_api = client.CoreV1Api(api_client=ws_api_client)
+            for filename in filenames:
+                content = await _exec(
+                    ws_core_v1_api,
+                    pod_name,
+                    namespace,
+                    ["cat", os.path.join(self.job.calrissian_job_path, filename)],
+                )
+                destination = os.path.join(destination_path, os.path.basename(filename))
+                with open(destination, "w") as staged_file:
+                    staged_file.write(content)
+                destinations.append(destination)
+        return destinations
@@ -0,0 +1,134 @@
+"""
+Wraps the kubernetes API objects (CoreV1Api, BatchV1Api, ...) of a
+CalrissianContext so that every call goes through the context's API layer:
+rate limiter, circuit breaker, retry policy and instrumentation
+"""
+
+import time
+from functools import wraps
+from typing import Optional
+
+from kubernetes.client.rest import ApiException
+
+from pycalrissian.instrumentation import Instrumentation, parse_method, retry_attempt
+from pycalrissian.throttling import CircuitBreaker, RetryPolicy, TokenBucket
+
+
+def get_status(response) -> Optional[int]:
+    """Returns the HTTP status code of a raw response (_preload_content=False),
+    None for a deserialised object"""
+    status = getattr(response, "status", None)
+    if isinstance(status, int):
+        return status
+    if hasattr(response, "getcode"):
+        return response.getcode()
+    return None
+
+
+class ApiProxy:
+    """Calls a kubernetes API object through the context's API layer"""
+
+    def __init__(
+        self,
+        api,
+        instrumentation: Instrumentation = None,
+        rate_limiter: TokenBucket = None,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+    ):
+        self.api = api
+        self.api_client = api.api_client
+        self.instrumentation = instrumentation
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+
+    def __getattr__(self, name):
+
+        attribute = getattr(self.api, name)
+
+        # connect_* methods are websocket calls made through kubernetes.stream
+        # which needs the bound method of the API object
+        if not callable(attribute) or name.startswith(("_", "connect_")):
+            return attribute
+
+        wrapped = self._wrap(name, attribute)
+        # cache the wrapper, __getattr__ is not called again for this name
+        setattr(self, name, wrapped)
+        return wrapped
+
+    def _wrap(self, name, method):
+
+        verb, kind, subresource = parse_method(name)
+        # returns the status code along with the data
+        http_info_method = getattr(self.api, f"{name}_with_http_info", None)
+
+        @wraps(method)
+        def call(*args, **kwargs):
+            call_verb = "watch" if kwargs.get("watch") else verb
+            called = method
+            if http_info_method is not None and "_return_http_data_only" not in kwargs:
+                called = http_info_method
+            # a watch is a stream, it is not sent again
+            max_tries = (
+                self.retry_policy.max_tries
+                if self.retry_policy is not None and call_verb != "watch"
+                else 1
+            )
+
+            for attempt in range(max_tries):
+                try:
+                    return self._call(
+                        called, call_verb, kind, subresource, attempt, args, kwargs
+                    )
+                except Exception as exc:
+                    if attempt == max_tries - 1 or not self.retry_policy.is_retryable(
+                        exc, call_verb
+                    ):
+                        raise
+                    time.sleep(self.retry_policy.get_delay(attempt, exc))
+
+        return call
+
+    def _call(self, method, verb, kind, subresource, attempt, args, kwargs):
+
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        start_time = time.time()
+        start = time.perf_counter()
+        # unknown if the response does not tell
+        status = None
+        try:
+            response = method(*args, **kwargs)
+            if isinstance(response, tuple):
+                # (data, status, headers) of a *_with_http_info method
+                response, status, _ = response
+            else:
+                status = get_status(response)
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_success()
+            return response
+        except ApiException as exc:
+            status = exc.status or 0
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure(exc)
+            raise
+        except Exception as exc:
+            status = 0
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure(exc)
+            raise
+        finally:
+            if self.instrumentation is not None:
+                self.instrumentation.record(
+                    verb,
+                    kind,
+                    time.perf_counter() - start,
+                    status,
+                    attempt=retry_attempt.get() + attempt,
+                    subresource=subresource,
+                    start_time=start_time,
+                )
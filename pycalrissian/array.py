@@ -0,0 +1,430 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import yaml
+from kubernetes.client.models.v1_job_status import V1JobStatus
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from pycalrissian.context import CalrissianContext
+from pycalrissian.execution import CalrissianExecution, JobStatus
+from pycalrissian.job import CalrissianJob, YamlDumper
+from pycalrissian.utils import copy_from_volume
+
+# labels of the jobs of an array
+ARRAY_LABEL = "pycalrissian/job-array"
+ARRAY_INDEX_LABEL = "pycalrissian/job-array-index"
+
+# substituted by kubernetes with the index of the pod of an Indexed Job
+INDEX_PLACEHOLDER = "$(JOB_COMPLETION_INDEX)"
+
+# the config map size limit, minus some room for the metadata
+MAX_CONFIG_MAP_SIZE = 1000 * 1024
+
+_INDEX_ENV_VAR = {
+    "name": "JOB_COMPLETION_INDEX",
+    "valueFrom": {
+        "fieldRef": {
+            "fieldPath": "metadata.annotations['batch.kubernetes.io/job-completion-index']"  # noqa: E501
+        }
+    },
+}
+
+_COMPLETED_STATUSES = [JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.KILLED]
+
+
+def parse_indexes(value: Optional[str]) -> Set[int]:
+    """Parses the completedIndexes and failedIndexes of an Indexed Job status,
+    e.g. "1,3-5" is {1, 3, 4, 5}"""
+    indexes = set()
+    for interval in (value or "").split(","):
+        if not interval:
+            continue
+        first, _, last = interval.partition("-")
+        indexes.update(range(int(first), int(last or first) + 1))
+    return indexes
+
+
+def get_finished_status(status: Optional[V1JobStatus]) -> Optional[JobStatus]:
+    """Returns SUCCEEDED or FAILED once a job has the Complete or Failed
+    condition, None while it runs: a failed pod awaiting its retry does not
+    finish the job"""
+    for condition in (status.conditions if status else None) or []:
+        if condition.status != "True":
+            continue
+        if condition.type == "Complete":
+            return JobStatus.SUCCEEDED
+        if condition.type == "Failed":
+            return JobStatus.FAILED
+    return None
+
+
+class IndexedCalrissianJob(CalrissianJob):
+    """A kubernetes Indexed Job running calrissian once per parameter set
+
+    The parameter sets are keys of the bundled job config map, the pod of
+    index i reads params-<i>.yml and writes its files in <job>/<i>. The
+    documents are neither compressed nor staged: all the parameter sets must
+    fit in the config map.
+    """
+
+    def __init__(
+        self,
+        cwl: Dict,
+        params: List[Dict],
+        runtime_context: CalrissianContext,
+        parallelism: int = None,
+        job_name: str = None,
+        **kwargs,
+    ):
+        self.params_list = params
+        self.parallelism = parallelism
+
+        super().__init__(
+            cwl=cwl, params=None, runtime_context=runtime_context, **kwargs
+        )
+
+        if job_name is not None:
+            self.job_name = job_name
+        self.bundle_config_maps = True
+        self.compression_threshold = sys.maxsize
+        self.calrissian_job_path = os.path.join(
+            self.calrissian_base_path, self.job_name, INDEX_PLACEHOLDER
+        )
+        self.calrissian_inputs_path = os.path.join(self.calrissian_job_path, "inputs")
+
+        # fails early if the parameter sets do not fit in the config map
+        self._get_documents()
+
+    def get_index_path(self, index: int) -> str:
+        """Returns the working directory of the pod of an index"""
+        return os.path.join(self.calrissian_base_path, self.job_name, str(index))
+
+    def _list_documents(self) -> List[Dict]:
+
+        documents = [
+            document
+            for document in super()._list_documents()
+            if document["key"] != "params"
+        ]
+        config_map = self.get_config_map_name("inputs")
+
+        for index, params in enumerate(self.params_list):
+            documents.append(
+                {
+                    "key": f"params-{index}",
+                    "file": f"params-{index}.yml",
+                    "mount_path": self.inputs_path,
+                    "content": yaml.dump(params, Dumper=YamlDumper),
+                    "config_map": config_map,
+                    "immutable": False,
+                }
+            )
+
+        size = sum(
+            len(document["content"].encode("utf-8"))
+            for document in documents
+            if document["config_map"] == config_map
+        )
+        if size > MAX_CONFIG_MAP_SIZE:
+            raise ValueError(
+                f"the parameter sets ({size} bytes) do not fit in a config map, "
+                "submit them as a batch of jobs"
+            )
+
+        return documents
+
+    def _get_document_path(self, key: str) -> str:
+
+        if key == "params":
+            return os.path.join(self.inputs_path, f"params-{INDEX_PLACEHOLDER}.yml")
+        return super()._get_document_path(key)
+
+    def _build_manifest(self) -> Dict:
+
+        manifest = super()._build_manifest()
+
+        spec = manifest["spec"]
+        spec["completionMode"] = "Indexed"
+        spec["completions"] = len(self.params_list)
+        # the backoff limit applies to each index: a failing index must not use
+        # up the retries of the others and fail the whole array. The job-wide
+        # limit is raised accordingly, it still bounds the retries on clusters
+        # ignoring backoffLimitPerIndex
+        spec["backoffLimitPerIndex"] = self.backoff_limit
+        spec["backoffLimit"] = (self.backoff_limit + 1) * len(self.params_list)
+        if self.parallelism is not None:
+            spec["parallelism"] = self.parallelism
+
+        pod_spec = spec["template"]["spec"]
+        for container in pod_spec["initContainers"] + pod_spec["containers"]:
+            container["env"] = container.get("env", []) + [_INDEX_ENV_VAR]
+
+        return manifest
+
+
+class CalrissianJobArray:
+    """Runs a CWL workflow over many parameter sets
+
+    The parameter sets are either submitted as a single kubernetes Indexed Job
+    (indexed=True) or as one job per parameter set, at most parallelism of them
+    running at the same time. The jobs share the workflow config map.
+    """
+
+    def __init__(
+        self,
+        cwl: Dict,
+        params: Iterable[Dict],
+        runtime_context: CalrissianContext,
+        parallelism: int = 10,
+        indexed: bool = True,
+        **job_kwargs,
+    ):
+        """Creates a CalrissianJobArray object
+
+        Args:
+            cwl (Dict): the CWL document
+            params (Iterable[Dict]): the parameter sets, consumed as the jobs
+                are submitted if indexed is False
+            runtime_context (CalrissianContext): the initialised context
+            parallelism (int): maximum number of parameter sets processed
+                at the same time
+            indexed (bool): submit an Indexed Job instead of a batch of jobs
+            job_kwargs: other CalrissianJob arguments (e.g. max_cores)
+
+        Returns:
+            None: none
+        """
+        self.cwl = cwl
+        self.runtime_context = runtime_context
+        self.parallelism = parallelism
+        self.indexed = indexed
+        self.job_kwargs = job_kwargs
+
+        self.name = f"job-array-{uuid.uuid4().hex[:12]}"
+        self.labels = {ARRAY_LABEL: self.name}
+
+        # index -> status of the submitted parameter sets
+        self._statuses: Dict[int, JobStatus] = {}
+        # indexes completed but not yet returned by as_completed
+        self._completed: List[int] = []
+
+        if indexed:
+            self.params = list(params)
+            self.size = len(self.params)
+            self.job = IndexedCalrissianJob(
+                cwl=cwl,
+                params=self.params,
+                runtime_context=runtime_context,
+                parallelism=parallelism,
+                job_name=self.name,
+                labels=self.labels,
+                **job_kwargs,
+            )
+        else:
+            self._params = enumerate(params)
+            # number of parameter sets, None until they are all read
+            self.size = None
+            self.executions: Dict[int, CalrissianExecution] = {}
+            self._cwl_content = None
+
+    def submit(self):
+        """Submits the Indexed Job or the first jobs of the batch"""
+        if self.indexed:
+            self.job.create_config_maps()
+            logger.info(f"submit job array {self.name} of {self.size} jobs")
+            self.runtime_context.batch_v1_api.create_namespaced_job(
+                self.runtime_context.namespace, self.job.to_manifest()
+            )
+            self._statuses = {index: JobStatus.ACTIVE for index in range(self.size)}
+        else:
+            self._submit_next()
+
+    def _submit_next(self):
+
+        active = sum(
+            status not in _COMPLETED_STATUSES for status in self._statuses.values()
+        )
+
+        while self.size is None and active < self.parallelism:
+            try:
+                index, params = next(self._params)
+            except StopIteration:
+                self.size = len(self.executions)
+                break
+
+            job = CalrissianJob(
+                cwl=self.cwl,
+                params=params,
+                runtime_context=self.runtime_context,
+                labels={**self.labels, ARRAY_INDEX_LABEL: str(index)},
+                **self.job_kwargs,
+            )
+            # the jobs dump the same workflow
+            if self._cwl_content is None:
+                self._cwl_content = job._get_cwl_content()
+            job._cwl_content = self._cwl_content
+
+            execution = CalrissianExecution(
+                job=job, runtime_context=self.runtime_context
+            )
+            execution.submit()
+            self.executions[index] = execution
+            self._statuses[index] = JobStatus.ACTIVE
+            active += 1
+
+    def _update(self):
+        """Reads the jobs status and submits the next jobs of the batch"""
+        if self.indexed:
+            response = self.runtime_context.batch_v1_api.read_namespaced_job_status(
+                name=self.name, namespace=self.runtime_context.namespace
+            )
+            statuses = {
+                index: JobStatus.SUCCEEDED
+                for index in parse_indexes(response.status.completed_indexes)
+            }
+            statuses.update(
+                {
+                    index: JobStatus.FAILED
+                    for index in parse_indexes(
+                        getattr(response.status, "failed_indexes", None)
+                    )
+                }
+            )
+            finished = get_finished_status(response.status) is not None
+            for index in range(self.size):
+                statuses.setdefault(
+                    index, JobStatus.FAILED if finished else JobStatus.ACTIVE
+                )
+        else:
+            response = self.runtime_context.batch_v1_api.list_namespaced_job(
+                namespace=self.runtime_context.namespace,
+                label_selector=f"{ARRAY_LABEL}={self.name}",
+            )
+            statuses = dict(self._statuses)
+            for job in response.items:
+                index = int(job.metadata.labels[ARRAY_INDEX_LABEL])
+                statuses[index] = get_finished_status(job.status) or JobStatus.ACTIVE
+
+        for index, status in statuses.items():
+            if (
+                status in _COMPLETED_STATUSES
+                and self._statuses.get(index) not in _COMPLETED_STATUSES
+            ):
+                self._completed.append(index)
+        self._statuses = statuses
+
+        if not self.indexed:
+            self._submit_next()
+
+    def get_statuses(self) -> Dict[int, JobStatus]:
+        """Returns the status of the submitted parameter sets by index"""
+        self._update()
+        return dict(self._statuses)
+
+    def get_counts(self) -> Dict[JobStatus, int]:
+        """Returns the number of submitted parameter sets by status"""
+        return dict(Counter(self.get_statuses().values()))
+
+    def get_status(self) -> JobStatus:
+        """Returns ACTIVE until all the parameter sets are processed, then
+        SUCCEEDED if they all succeeded and FAILED otherwise"""
+        statuses = self.get_statuses().values()
+        if self.size is None or any(
+            status not in _COMPLETED_STATUSES for status in statuses
+        ):
+            return JobStatus.ACTIVE
+        if all(status == JobStatus.SUCCEEDED for status in statuses):
+            return JobStatus.SUCCEEDED
+        return JobStatus.FAILED
+
+    def get_output(self, index: int) -> Optional[Dict]:
+        """Returns the output of a parameter set"""
+        if not self.indexed:
+            return self.executions[index].get_output()
+
+        volume = {
+            "name": self.job.volume_calrissian_wdir,
+            "persistentVolumeClaim": {
+                "claimName": self.runtime_context.calrissian_wdir
+            },
+        }
+        volume_mount = {
+            "name": self.job.volume_calrissian_wdir,
+            "mountPath": self.job.calrissian_base_path,
+        }
+        with tempfile.TemporaryDirectory() as staging_path:
+            copy_from_volume(
+                context=self.runtime_context,
+                volume=volume,
+                volume_mount=volume_mount,
+                source_paths=[
+                    os.path.join(self.job.get_index_path(index), "output.json")
+                ],
+                destination_path=staging_path,
+            )
+            with open(os.path.join(staging_path, "output.json")) as staged_file:
+                return json.load(staged_file)
+
+    def get_outputs(self) -> Dict[int, Dict]:
+        """Returns the outputs of the succeeded parameter sets by index"""
+        return {
+            index: self.get_output(index)
+            for index, status in self.get_statuses().items()
+            if status == JobStatus.SUCCEEDED
+        }
+
+    def as_completed(
+        self, interval: float = 5, timeout: float = None, outputs: bool = True
+    ) -> Iterator[Tuple[int, JobStatus, Optional[Dict]]]:
+        """Yields the parameter sets as they complete
+
+        Args:
+            interval (float): seconds between two status updates
+            timeout (float): maximum time to wait in seconds
+            outputs (bool): read the output of the succeeded parameter sets
+
+        Yields:
+            Tuple[int, JobStatus, Optional[Dict]]: the index, the status and
+                the output, None if it failed or outputs is False
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            self._update()
+
+            while self._completed:
+                index = self._completed.pop(0)
+                status = self._statuses[index]
+                output = None
+                if outputs and status == JobStatus.SUCCEEDED:
+                    try:
+                        output = self.get_output(index)
+                    except (ApiException, OSError, ValueError) as e:
+                        logger.error(f"output of {index} not read: {e}")
+                yield index, status, output
+
+            if self.size is not None and all(
+                status in _COMPLETED_STATUSES for status in self._statuses.values()
+            ):
+                return
+
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"job array {self.name} not completed in time")
+
+            time.sleep(interval)
+
+    def monitor(self, interval: float = 5, timeout: float = None) -> JobStatus:
+        """Waits for all the parameter sets and returns the aggregated status"""
+        for index, status, _ in self.as_completed(
+            interval=interval, timeout=timeout, outputs=False
+        ):
+            logger.info(f"job array {self.name}: {index} is {status.value}")
+
+        return self.get_status()
@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Callable, Dict, Hashable, List
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+
+class InformerCache:
+    """In-memory cache of the objects of a namespace, kept up to date with a
+    list and a watch per kind"""
+
+    def __init__(
+        self,
+        context,
+        read_methods: List[str] = None,
+        watch_timeout: int = 300,
+        error_interval: int = 5,
+    ):
+        """Creates an InformerCache object
+
+        Args:
+            context (CalrissianContext): the context whose namespace is cached
+            read_methods (List[str]): the kinds to cache, identified by their
+                read method (e.g. read_namespaced_config_map), defaults to all
+                the kinds the context knows
+            watch_timeout (int): server side timeout of each watch in seconds
+            error_interval (int): delay in seconds before re-listing after an error
+
+        Returns:
+            None: none
+        """
+        self.context = context
+        self.list_methods = context._get_list_methods()
+        self.read_methods = (
+            read_methods if read_methods is not None else list(self.list_methods)
+        )
+        self.watch_timeout = watch_timeout
+        self.error_interval = error_interval
+
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Dict] = {key: {} for key in self.read_methods}
+        self._resource_versions: Dict[str, str] = {}
+        self._synced = {key: threading.Event() for key in self.read_methods}
+        self._stopped = threading.Event()
+        self._watches: Dict[str, watch.Watch] = {}
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Starts a daemon thread per kind"""
+        with self._lock:
+            if self._stopped.is_set():
+                # restarted: the threads of the stopped watches may still be
+                # streaming, they keep the set event and drop their events
+                self._stopped = threading.Event()
+            stopped = self._stopped
+        for read_method in self.read_methods:
+            thread = threading.Thread(
+                target=self._run,
+                args=(read_method, stopped),
+                name=f"informer-{self.context.namespace}-{read_method}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stops the watches, the cached objects are dropped and the next
+        start lists them again"""
+        with self._lock:
+            self._stopped.set()
+            # the events missed while stopped are not replayed
+            self._resource_versions.clear()
+            for read_method in self.read_methods:
+                self._objects[read_method] = {}
+                self._synced[read_method].clear()
+        for object_watch in list(self._watches.values()):
+            object_watch.stop()
+        self._threads = []
+
+    def wait_for_sync(self, timeout: float = None) -> bool:
+        """Waits until every kind has been listed at least once"""
+        return all(event.wait(timeout) for event in self._synced.values())
+
+    def has_synced(self, read_method) -> bool:
+
+        return read_method in self._synced and self._synced[read_method].is_set()
+
+    def get(self, read_method, name):
+        """Returns the cached object or None"""
+        with self._lock:
+            return self._objects.get(read_method, {}).get(name)
+
+    def list(self, read_method) -> List:
+        """Returns the cached objects of a kind"""
+        with self._lock:
+            return list(self._objects.get(read_method, {}).values())
+
+    def resource_version(self, read_method):
+
+        return self._resource_versions.get(read_method)
+
+    def _list_kwargs(self, read_method) -> Dict:
+
+        if read_method == "read_namespace":
+            return {"field_selector": f"metadata.name={self.context.namespace}"}
+        return {"namespace": self.context.namespace}
+
+    def _relist(self, read_method, stopped: threading.Event):
+
+        response = self.list_methods[read_method](**self._list_kwargs(read_method))
+
+        with self._lock:
+            if stopped.is_set():
+                return
+            self._objects[read_method] = {
+                item.metadata.name: item for item in response.items
+            }
+            self._resource_versions[read_method] = response.metadata.resource_version
+        self._synced[read_method].set()
+
+    def _run(self, read_method, stopped: threading.Event):
+
+        while not stopped.is_set():
+            try:
+                if read_method not in self._resource_versions:
+                    self._relist(read_method, stopped)
+                    continue
+
+                object_watch = watch.Watch()
+                self._watches[read_method] = object_watch
+
+                for event in object_watch.stream(
+                    self.list_methods[read_method],
+                    resource_version=self._resource_versions[read_method],
+                    timeout_seconds=self.watch_timeout,
+                    **self._list_kwargs(read_method),
+                ):
+                    item = event["object"]
+                    with self._lock:
+                        if stopped.is_set():
+                            break
+                        if event["type"] == "DELETED":
+                            self._objects[read_method].pop(item.metadata.name, None)
+                        else:
+                            self._objects[read_method][item.metadata.name] = item
+                        self._resource_versions[read_method] = (
+                            item.metadata.resource_version
+                        )
+
+            except ApiException as exc:
+                if exc.status == HTTPStatus.GONE:
+                    # the resourceVersion is too old, list again
+                    self._resource_versions.pop(read_method, None)
+                    continue
+                logger.warning(f"informer for {read_method} failed: {exc.reason}")
+                self._resource_versions.pop(read_method, None)
+                stopped.wait(self.error_interval)
+            except Exception as exc:
+                logger.warning(f"informer for {read_method} failed: {exc}")
+                self._resource_versions.pop(read_method, None)
+                stopped.wait(self.error_interval)
+
+
+class LRUSet:
+    """Thread-safe set keeping the most recently used keys"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable):
+
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def discard(self, key: Hashable):
+
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[Hashable], bool]):
+        """Removes the keys matching predicate"""
+        with self._lock:
+            for key in [key for key in self._keys if predicate(key)]:
+                del self._keys[key]
@@ -0,0 +1,156 @@
+"""
+Derivation of the calrissian --max-cores/--max-ram from what the namespace
+can still run: the headroom of its resource quotas and the allocatable
+capacity of the nodes the tool pods can be scheduled on
+"""
+
+import math
+from decimal import Decimal
+from http import HTTPStatus
+from typing import Dict, Optional
+
+from kubernetes.client.rest import ApiException
+from kubernetes.utils import parse_quantity
+from loguru import logger
+
+from pycalrissian.context import CalrissianContext
+from pycalrissian.job import CalrissianJob
+
+# the quota resources limiting the CPU and the memory of the pods
+QUOTA_RESOURCES = {
+    "cpu": ["cpu", "requests.cpu", "limits.cpu"],
+    "memory": ["memory", "requests.memory", "limits.memory"],
+}
+
+
+def _min(*values: Optional[Decimal]) -> Optional[Decimal]:
+
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def get_quota_headroom(context: CalrissianContext) -> Dict[str, Optional[Decimal]]:
+    """Returns the CPU (cores) and memory (bytes) the resource quotas of the
+    namespace still allow, None for a resource without quota"""
+    headroom = {"cpu": None, "memory": None}
+
+    response = context.core_v1_api.list_namespaced_resource_quota(
+        namespace=context.namespace
+    )
+
+    for quota in response.items:
+        status = quota.status
+        hard = (status.hard if status is not None else None) or quota.spec.hard or {}
+        used = (status.used if status is not None else None) or {}
+        for resource, names in QUOTA_RESOURCES.items():
+            for name in names:
+                if name in hard:
+                    headroom[resource] = _min(
+                        headroom[resource],
+                        parse_quantity(hard[name]) - parse_quantity(used.get(name, 0)),
+                    )
+
+    return headroom
+
+
+def get_node_capacity(
+    context: CalrissianContext, node_selector: Dict = None
+) -> Dict[str, Optional[Decimal]]:
+    """Returns the allocatable CPU (cores) and memory (bytes) of the ready and
+    schedulable nodes matching the node selector, None if no node matches or
+    the nodes cannot be listed (listing nodes needs a cluster role)"""
+    label_selector = ",".join(
+        f"{key}={value}" for key, value in (node_selector or {}).items()
+    )
+    try:
+        response = context.core_v1_api.list_node(label_selector=label_selector)
+    except ApiException as e:
+        if e.status != HTTPStatus.FORBIDDEN:
+            raise e
+        logger.warning("not allowed to list the nodes, node capacity ignored")
+        return {"cpu": None, "memory": None}
+
+    capacity = {"cpu": Decimal(0), "memory": Decimal(0)}
+    nodes = 0
+    for node in response.items:
+        if node.spec is not None and node.spec.unschedulable:
+            continue
+        conditions = (node.status.conditions if node.status else None) or []
+        if not any(
+            condition.type == "Ready" and condition.status == "True"
+            for condition in conditions
+        ):
+            continue
+        allocatable = node.status.allocatable or {}
+        for resource in capacity:
+            capacity[resource] += parse_quantity(allocatable.get(resource, 0))
+        nodes += 1
+
+    if not nodes:
+        logger.warning(f"no ready node matches {label_selector or 'the cluster'}")
+        return {"cpu": None, "memory": None}
+
+    return capacity
+
+
+def get_available_capacity(
+    context: CalrissianContext, job: CalrissianJob
+) -> Dict[str, Optional[Decimal]]:
+    """Returns the CPU (cores) and memory (bytes) available to the tool pods of
+    a job: the smallest of the quota headroom, minus the calrissian pod, and of
+    the capacity of the nodes matching the job node selector"""
+    headroom = get_quota_headroom(context)
+    capacity = get_node_capacity(context, job.pod_node_selector)
+
+    # the calrissian pod counts in the quota, its init container runs before
+    # the calrissian container so the pod counts for the largest of the two
+    for resource in headroom:
+        if headroom[resource] is not None:
+            headroom[resource] -= max(
+                parse_quantity(resources.get(kind, {}).get(resource, 0))
+                for resources in [job.get_resources(), job.get_init_resources()]
+                for kind in ["requests", "limits"]
+            )
+
+    return {
+        resource: _min(headroom[resource], capacity[resource]) for resource in headroom
+    }
+
+
+def fit_job_to_capacity(
+    job: CalrissianJob, context: CalrissianContext, cap_only: bool = False
+) -> bool:
+    """Sets the job --max-cores/--max-ram to the capacity available
+
+    Args:
+        job (CalrissianJob): the job to size
+        context (CalrissianContext): the context the job is submitted to
+        cap_only (bool): only lower the job values, e.g. when they were sized
+            from the previous runs
+
+    Returns:
+        bool: False if neither a quota nor the nodes limit the job
+    """
+    available = get_available_capacity(context, job)
+
+    if available["cpu"] is None and available["memory"] is None:
+        logger.info(f"no capacity information for job {job.job_name}")
+        return False
+
+    if available["cpu"] is not None:
+        max_cores = max(1, math.floor(available["cpu"]))
+        if cap_only:
+            max_cores = min(max_cores, math.floor(parse_quantity(job.max_cores)))
+        job.max_cores = str(max_cores)
+
+    if available["memory"] is not None:
+        max_ram = max(1, math.floor(available["memory"] / 1000**2))
+        if cap_only:
+            max_ram = min(max_ram, math.floor(parse_quantity(job.max_ram) / 1000**2))
+        job.max_ram = f"{max_ram}M"
+
+    logger.info(
+        f"job {job.job_name} fitted to capacity: --max-cores {job.max_cores} "
+        f"--max-ram {job.max_ram}"
+    )
+    return True
@@ -0,0 +1,101 @@
+"""
+Process wide registry of kubernetes ApiClient objects, the contexts, executions
+and helper pods created with the same kubeconfig and proxy settings share one
+client and its urllib3 connection pool instead of re-parsing the kubeconfig
+and opening new TLS connections
+"""
+
+import os
+import socket
+import threading
+from typing import Dict, TextIO, Tuple
+
+from kubernetes import client, config
+from kubernetes.client import Configuration
+from urllib3.connection import HTTPConnection
+
+_api_clients: Dict[Tuple, client.ApiClient] = {}
+_api_clients_lock = threading.Lock()
+
+
+def _create_api_client(
+    proxy_url: str = None,
+    kubeconfig_file: TextIO = None,
+    pool_maxsize: int = None,
+    keep_alive: bool = True,
+) -> client.ApiClient:
+
+    if proxy_url:
+        api_config = Configuration(host=proxy_url)
+        api_config.proxy = proxy_url
+    else:
+        # if nothing is specified, kubernetes-python will use the file
+        # in ~/.kube/config
+        api_config = Configuration()
+        config.load_kube_config(
+            config_file=kubeconfig_file, client_configuration=api_config
+        )
+
+    if pool_maxsize is not None:
+        api_config.connection_pool_maxsize = pool_maxsize
+
+    api_client = client.ApiClient(api_config)
+
+    if keep_alive:
+        # keep the idle pooled connections alive at the TCP level
+        api_client.rest_client.pool_manager.connection_pool_kw["socket_options"] = (
+            HTTPConnection.default_socket_options
+            + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        )
+
+    return api_client
+
+
+def get_api_client(
+    kubeconfig_file: TextIO = None,
+    pool_maxsize: int = None,
+    keep_alive: bool = True,
+    stream: bool = False,
+    shared: bool = True,
+) -> client.ApiClient:
+    """Returns the ApiClient for the kubeconfig and proxy settings
+
+    The HTTP_PROXY and KUBECONFIG environment variables take precedence over
+    kubeconfig_file as in CalrissianContext.
+
+    Args:
+        kubeconfig_file (TextIO): path to the kubeconfig file
+        pool_maxsize (int): number of connections kept in the urllib3 pool
+        keep_alive (bool): enable TCP keep-alive on the pooled connections
+        stream (bool): return the client dedicated to exec/websocket calls,
+            kubernetes.stream swaps the request method of the client it uses
+            so it cannot be shared with the regular calls
+        shared (bool): if False, always create a new client
+
+    Returns:
+        client.ApiClient: the api client
+    """
+    proxy_url = os.getenv("HTTP_PROXY", None)
+    # this is needed because kubernetes-python does not consider
+    # the KUBECONFIG env variable
+    kubeconfig = os.getenv("KUBECONFIG", None) or kubeconfig_file
+
+    if not shared:
+        return _create_api_client(proxy_url, kubeconfig, pool_maxsize, keep_alive)
+
+    key = (proxy_url, kubeconfig, pool_maxsize, keep_alive, stream)
+
+    with _api_clients_lock:
+        if key not in _api_clients:
+            _api_clients[key] = _create_api_client(
+                proxy_url, kubeconfig, pool_maxsize, keep_alive
+            )
+        return _api_clients[key]
+
+
+def clear_api_clients():
+    """Drops the shared clients, e.g. after the kubeconfig credentials changed"""
+    with _api_clients_lock:
+        for api_client in _api_clients.values():
+            api_client.rest_client.pool_manager.clear()
+        _api_clients.clear()
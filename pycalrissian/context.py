@@ -1,17 +1,63 @@
 import base64
 import json
 import os
+import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 from http import HTTPStatus
-from typing import Dict, TextIO
+from typing import Dict, List, TextIO
 
-from kubernetes import client, config
-from kubernetes.client import Configuration
+from kubernetes import client, watch
 from kubernetes.client.models.v1_persistent_volume_claim import V1PersistentVolumeClaim
 from kubernetes.client.rest import ApiException
 from loguru import logger
 from packaging.version import Version
 
+from pycalrissian.api import ApiProxy
+from pycalrissian.cache import InformerCache, LRUSet
+from pycalrissian.clients import get_api_client
+from pycalrissian.instrumentation import Instrumentation, retry_attempt
+from pycalrissian.raw import RawWatch, call_raw, release
+from pycalrissian.throttling import CircuitBreaker, RetryPolicy, TokenBucket
+
+# runs the dispose(wait=False) calls, its threads are joined at exit
+_finaliser = ThreadPoolExecutor(thread_name_prefix="calrissian-dispose")
+
+# label of the immutable config maps named after their content, they are kept
+# when the namespace workloads are deleted
+CONTENT_ADDRESSED_LABEL = "pycalrissian/content-addressed"
+
+# (API server, namespace, name) of the immutable config maps known to exist
+known_config_maps = LRUSet(maxsize=4096)
+
+
+def dispose_many(contexts: List["CalrissianContext"], max_workers: int = 8) -> List:
+    """Disposes many contexts concurrently
+
+    Args:
+        contexts (List[CalrissianContext]): the contexts to dispose
+        max_workers (int): maximum number of namespaces disposed concurrently
+
+    Returns:
+        List: the namespace deletion responses, or the exceptions raised
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(context.dispose) for context in contexts]
+
+    return [
+        future.exception() if future.exception() else future.result()
+        for future in futures
+    ]
+
+
+def _get_uid(obj) -> str:
+    """Returns the uid of an object, a kubernetes model or parsed JSON"""
+    if isinstance(obj, dict):
+        return obj["metadata"].get("uid")
+    return obj.metadata.uid
+
 
 class CalrissianContext:
     """Creates a kubernetes namespace to run calrissian jobs"""
@@ -26,6 +72,18 @@ class CalrissianContext:
         kubeconfig_file: TextIO = None,
         labels: Dict = None,
         annotations: Dict = None,
+        use_cache: bool = False,
+        api_client: client.ApiClient = None,
+        pool_maxsize: int = None,
+        share_api_client: bool = True,
+        instrumentation: Instrumentation = None,
+        qps: float = 50,
+        burst: int = 100,
+        rate_limiter: TokenBucket = None,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        raw_json: bool = False,
+        helper_pod_idle_time: float = 300,
     ):
         """Creates a CalrissianContext object
 
@@ -35,6 +93,18 @@ class CalrissianContext:
             volume_size (str): size for the RWX volume (e.g. 10G)
             image_pull_secrets (dict): a dictionary with the image pull secrets
             kubeconfig_file (TextIO): path to the kubeconfig file to access the kubernetes cluster # noqa: E501
+            use_cache (bool): keep the namespace objects in an informer cache consulted before reading from the cluster # noqa: E501
+            api_client (client.ApiClient): the api client to use instead of the shared one # noqa: E501
+            pool_maxsize (int): number of connections kept in the api client pool
+            share_api_client (bool): share the api client with the contexts using the same kubeconfig # noqa: E501
+            instrumentation (Instrumentation): records the API calls made by the context, its executions and helper pods # noqa: E501
+            qps (float): maximum sustained rate of API calls, None to disable the rate limiting # noqa: E501
+            burst (int): maximum number of API calls sent at once
+            rate_limiter (TokenBucket): a rate limiter shared with other contexts, overrides qps and burst # noqa: E501
+            retry_policy (RetryPolicy): retries of the failed API calls, defaults to RetryPolicy() # noqa: E501
+            circuit_breaker (CircuitBreaker): suspends the API calls while the API server fails, defaults to CircuitBreaker() # noqa: E501
+            raw_json (bool): parse the responses of the status, listing and existence checks as JSON instead of kubernetes models # noqa: E501
+            helper_pod_idle_time (float): seconds without use before the helper pod shared by the volume copies is deleted # noqa: E501
 
         Returns:
             None: none
@@ -42,11 +112,48 @@ class CalrissianContext:
         """
         self.kubeconfig_file = kubeconfig_file
 
-        self.api_client = self._get_api_client(self.kubeconfig_file)
+        self.api_client = api_client or get_api_client(
+            self.kubeconfig_file, pool_maxsize=pool_maxsize, shared=share_api_client
+        )
+        self.stream_api_client = (
+            api_client
+            if api_client is not None
+            else get_api_client(
+                self.kubeconfig_file,
+                pool_maxsize=pool_maxsize,
+                stream=True,
+                shared=share_api_client,
+            )
+        )
         self.core_v1_api = self._get_core_v1_api()
+        self.stream_core_v1_api = client.CoreV1Api(api_client=self.stream_api_client)
         self.batch_v1_api = self._get_batch_v1_api()
         self.rbac_authorization_v1_api = self._get_rbac_authorization_v1_api()
 
+        self.instrumentation = instrumentation
+        self.rate_limiter = rate_limiter or (
+            TokenBucket(qps=qps, burst=burst) if qps else None
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        # all the calls go through the rate limiter, circuit breaker, retry
+        # policy and instrumentation
+        self.core_v1_api, self.batch_v1_api, self.rbac_authorization_v1_api = (
+            ApiProxy(
+                api,
+                instrumentation=self.instrumentation,
+                rate_limiter=self.rate_limiter,
+                retry_policy=self.retry_policy,
+                circuit_breaker=self.circuit_breaker,
+            )
+            for api in [
+                self.core_v1_api,
+                self.batch_v1_api,
+                self.rbac_authorization_v1_api,
+            ]
+        )
+
         self.namespace = namespace
         self.storage_class = storage_class
         self.volume_size = volume_size
@@ -61,20 +168,31 @@ class CalrissianContext:
         self.labels = labels
         self.annotations = annotations
 
-    def initialise(self):
+        self.raw_json = raw_json
+
+        # the helper pods shared by the volume copies, by volume and mount
+        self.helper_pod_idle_time = helper_pod_idle_time
+        self.helper_pods = {}
+        self.helper_pods_lock = threading.Lock()
+
+        self.cache = None
+        if use_cache:
+            self.cache = InformerCache(self)
+            self.cache.start()
+
+    def initialise(self, max_workers: int = 4) -> Dict:
         """Create the kubernetes resources to run a Calrissian job
 
-        Arg:
-            None
+        The namespace is created first, the other objects only depend on it
+        (or on each other, e.g. a role binding on its role) and are provisioned
+        concurrently.
+
+        Args:
+            max_workers (int): maximum number of objects provisioned concurrently
 
         Returns:
-            None
+            Dict: the provisioning time in seconds of each object
         """
-        # create namespace
-        if not self.is_namespace_created():
-            logger.info(f"create namespace {self.namespace}")
-            self.create_namespace(labels=self.labels, annotations=self.annotations)
-
         # create roles and role binding
         roles = {}
 
@@ -88,71 +206,170 @@ class CalrissianContext:
             "role_binding": "log-reader-default-binding",
         }
 
+        # each task is a callable and the list of tasks it depends on
+        tasks = {}
+
+        tasks["namespace"] = (self._initialise_namespace, [])
+
         for key, value in roles.items():
-            logger.info(f"create role {key}")
-            response = self.create_role(
-                name=key,
-                verbs=value["verbs"],
-                resources=["pods", "pods/log"],
-                api_groups=["*"],
+            tasks[f"role/{key}"] = (
+                partial(
+                    self.create_role,
+                    name=key,
+                    verbs=value["verbs"],
+                    resources=["pods", "pods/log"],
+                    api_groups=["*"],
+                ),
+                ["namespace"],
+            )
+            tasks[f"rolebinding/{value['role_binding']}"] = (
+                partial(self.create_role_binding, name=value["role_binding"], role=key),
+                [f"role/{key}"],
             )
-            # print(type(response))
-            # assert(isinstance(response, V1Role))
-            logger.info(f"create role binding for role {key}")
-            self.create_role_binding(name=value["role_binding"], role=key)
-            # assert(isinstance(response, V1RoleBinding))
 
         # create volumes
-        logger.info(
-            f"create persistent volume claim 'calrissian-wdir' of {self.volume_size} "
-            f"with storage class {self.storage_class}"
-        )
-        response = self.create_pvc(
-            name=self.calrissian_wdir,
-            size=self.volume_size,
-            storage_class=self.storage_class,
-            access_modes=["ReadWriteMany"],
-        )
-
-        assert isinstance(response, V1PersistentVolumeClaim)
+        tasks[f"pvc/{self.calrissian_wdir}"] = (self._initialise_pvc, ["namespace"])
 
         if self.image_pull_secrets:
+            secrets = []
             if (
                 "imagePullSecrets" in self.image_pull_secrets
                 and self.image_pull_secrets["imagePullSecrets"] is not None
                 and len(self.image_pull_secrets["imagePullSecrets"].keys()) > 0
             ):
-                logger.info(f"create secret {self.secret_name}")
-                self.create_image_pull_secret(self.secret_name)
+                tasks[f"secret/{self.secret_name}"] = (
+                    partial(self.create_image_pull_secret, self.secret_name),
+                    ["namespace"],
+                )
+                secrets.append(f"secret/{self.secret_name}")
             if (
                 "additionalImagePullSecrets" in self.image_pull_secrets
                 and self.image_pull_secrets["additionalImagePullSecrets"] is not None
             ):
-                logger.info(f"create secrets from existing ones")
-                self.create_additional_image_pull_secret(
-                    self.image_pull_secrets["additionalImagePullSecrets"]
+                tasks["secret/additional"] = (
+                    partial(
+                        self.create_additional_image_pull_secret,
+                        self.image_pull_secrets["additionalImagePullSecrets"],
+                    ),
+                    ["namespace"],
                 )
+                secrets.append("secret/additional")
 
-            logger.info("patch service account")
-            self.patch_service_account()
+            tasks["serviceaccount/default"] = (
+                self.patch_service_account,
+                ["namespace"] + secrets,
+            )
 
         if self.resource_quota:
-            logger.info("create resource quota")
-            self.create_resource_quota(name="calrissian-resource-quota")
+            tasks["resourcequota/calrissian-resource-quota"] = (
+                partial(self.create_resource_quota, name="calrissian-resource-quota"),
+                ["namespace"],
+            )
+
+        self.provisioning_report = self._provision(tasks, max_workers=max_workers)
+
+        return self.provisioning_report
+
+    def _initialise_namespace(self):
+
+        if not self.is_namespace_created():
+            logger.info(f"create namespace {self.namespace}")
+            self.create_namespace(labels=self.labels, annotations=self.annotations)
+
+    def _initialise_pvc(self):
+
+        logger.info(
+            f"create persistent volume claim '{self.calrissian_wdir}' of "
+            f"{self.volume_size} with storage class {self.storage_class}"
+        )
+        response = self.create_pvc(
+            name=self.calrissian_wdir,
+            size=self.volume_size,
+            storage_class=self.storage_class,
+            access_modes=["ReadWriteMany"],
+        )
+
+        assert isinstance(response, V1PersistentVolumeClaim)
+
+    @staticmethod
+    def _provision(tasks: Dict, max_workers: int = 4) -> Dict:
+        """Runs the tasks on a thread pool, each one as soon as its dependencies
+        are completed
+
+        Args:
+            tasks (Dict): task name to a (callable, list of dependencies) tuple
+            max_workers (int): maximum number of tasks running concurrently
+
+        Returns:
+            Dict: the elapsed time in seconds of each task
+        """
+
+        def timed(name, fun):
+            start = time.perf_counter()
+            logger.info(f"provisioning {name}")
+            fun()
+            elapsed = time.perf_counter() - start
+            logger.info(f"{name} provisioned in {elapsed:.2f}s")
+            return elapsed
+
+        report = {}
+        pending = dict(tasks)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name, (fun, dependencies) in list(pending.items()):
+                    if all(dependency in report for dependency in dependencies):
+                        running[executor.submit(timed, name, fun)] = name
+                        del pending[name]
 
-    def dispose(self):
+                if not running:
+                    raise ValueError(
+                        f"unresolvable dependencies for {', '.join(pending)}"
+                    )
 
-        response = self.core_v1_api.list_namespaced_pod(self.namespace)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report[running.pop(future)] = future.result()
 
-        for pod in response.items:
-            logger.info(f"delete pod {pod.metadata.name}")
-            self.delete_pod(pod.metadata.name)
+        return report
+
+    def dispose(self, wait: bool = True):
+        """Deletes the jobs, pods and config maps with collection deletes and
+        then the namespace
+
+        Args:
+            wait (bool): if False, returns immediately and the deletion
+                continues in the background
+
+        Returns:
+            the namespace deletion response or, if wait is False, a Future
+        """
+        if self.cache is not None:
+            self.cache.stop()
+
+        if not wait:
+            logger.info(f"dispose namespace {self.namespace} in the background")
+            return _finaliser.submit(self.dispose)
+
+        self.delete_workloads()
+
+        # the immutable config maps go with the namespace
+        namespace_key = (self.api_client.configuration.host, self.namespace)
+        known_config_maps.discard_if(lambda known_key: known_key[:2] == namespace_key)
 
         logger.info(f"dispose namespace {self.namespace}")
         try:
-            response = self.core_v1_api.delete_namespace(
-                name=self.namespace, pretty=True, grace_period_seconds=0
-            )
+            if self.raw_json:
+                response = call_raw(
+                    self.core_v1_api.delete_namespace,
+                    name=self.namespace,
+                    grace_period_seconds=0,
+                )
+            else:
+                response = self.core_v1_api.delete_namespace(
+                    name=self.namespace, pretty=True, grace_period_seconds=0
+                )
 
             # if not self.retry(self.dispose):
             #     raise ApiException()
@@ -166,6 +383,49 @@ class CalrissianContext:
             )
             raise e
 
+    def delete_workloads(self):
+        """Deletes the jobs, pods and config maps of the namespace, one request
+        per kind, the immutable content-addressed config maps are kept"""
+        logger.info(f"delete jobs, pods and config maps in {self.namespace}")
+        # the shared helper pods are deleted with the other pods
+        self.dismiss_helper_pods(delete=False)
+        # the deleted objects are returned, they are not deserialised in raw mode
+        kwargs = {"_preload_content": False} if self.raw_json else {}
+        try:
+            for response in [
+                self.batch_v1_api.delete_collection_namespaced_job(
+                    self.namespace, propagation_policy="Background", **kwargs
+                ),
+                self.core_v1_api.delete_collection_namespaced_pod(
+                    self.namespace, grace_period_seconds=0, **kwargs
+                ),
+                self.core_v1_api.delete_collection_namespaced_config_map(
+                    self.namespace,
+                    field_selector="metadata.name!=kube-root-ca.crt",
+                    label_selector=f"!{CONTENT_ADDRESSED_LABEL}",
+                    **kwargs,
+                ),
+            ]:
+                if self.raw_json:
+                    release(response)
+        except ApiException as e:
+            if e.status != HTTPStatus.NOT_FOUND:
+                logger.error(f"Exception when deleting the workloads: {e}\n")
+
+    def dismiss_helper_pods(self, delete: bool = True):
+        """Deletes the helper pods shared by the volume copies
+
+        Args:
+            delete (bool): if False, the pods are only forgotten, e.g. when
+                they are deleted with the namespace pods
+        """
+        with self.helper_pods_lock:
+            helper_pods = list(self.helper_pods.values())
+            self.helper_pods = {}
+
+        for helper_pod in helper_pods:
+            helper_pod.dismiss(delete=delete)
+
     def delete_pod(self, name):
 
         try:
@@ -177,29 +437,7 @@ class CalrissianContext:
     @staticmethod
     def _get_api_client(kubeconfig_file: TextIO = None):
 
-        proxy_url = os.getenv("HTTP_PROXY", None)
-        kubeconfig = os.getenv("KUBECONFIG", None)
-
-        if proxy_url:
-            api_config = Configuration(host=proxy_url)
-            api_config.proxy = proxy_url
-            api_client = client.ApiClient(api_config)
-
-        elif kubeconfig:
-            # this is needed because kubernetes-python does not consider
-            # the KUBECONFIG env variable
-            config.load_kube_config(config_file=kubeconfig)
-            api_client = client.ApiClient()
-        elif kubeconfig_file:
-            config.load_kube_config(config_file=kubeconfig)
-            api_client = client.ApiClient()
-        else:
-            # if nothing is specified, kubernetes-python will use the file
-            # in ~/.kube/config
-            config.load_kube_config()
-            api_client = client.ApiClient()
-
-        return api_client
+        return get_api_client(kubeconfig_file)
 
     def _get_core_v1_api(self) -> client.CoreV1Api:
 
@@ -213,7 +451,7 @@ class CalrissianContext:
 
         return client.RbacAuthorizationV1Api(self.api_client)
 
-    def is_object_created(self, read_method, **kwargs):
+    def _get_read_methods(self) -> Dict:
 
         read_methods = {}
 
@@ -241,6 +479,47 @@ class CalrissianContext:
             self.core_v1_api.read_namespaced_resource_quota
         )  # noqa: E501
 
+        return read_methods
+
+    def _get_list_methods(self) -> Dict:
+        """Returns the list (and watch) method of the kind of each read method"""
+
+        list_methods = {}
+
+        list_methods["read_namespace"] = self.core_v1_api.list_namespace
+        list_methods["read_namespaced_role"] = (
+            self.rbac_authorization_v1_api.list_namespaced_role
+        )
+        list_methods["read_namespaced_role_binding"] = (
+            self.rbac_authorization_v1_api.list_namespaced_role_binding
+        )
+        list_methods["read_namespaced_config_map"] = (
+            self.core_v1_api.list_namespaced_config_map
+        )
+        list_methods["read_namespaced_persistent_volume_claim"] = (
+            self.core_v1_api.list_namespaced_persistent_volume_claim
+        )
+        list_methods["read_namespaced_secret"] = self.core_v1_api.list_namespaced_secret
+        list_methods["read_namespaced_resource_quota"] = (
+            self.core_v1_api.list_namespaced_resource_quota
+        )
+
+        return list_methods
+
+    def is_object_created(self, read_method, **kwargs):
+
+        read_methods = self._get_read_methods()
+
+        if (
+            self.cache is not None
+            and self.cache.get(read_method, kwargs.get("name", self.namespace))
+            is not None
+        ):
+            return read_methods
+
+        # only the existence matters, the object is not deserialised in raw mode
+        raw_kwargs = {"_preload_content": False} if self.raw_json else {}
+
         try:
             if read_method in [
                 "read_namespaced_config_map",
@@ -250,9 +529,13 @@ class CalrissianContext:
                 "read_namespaced_secret",
                 "read_namespaced_resource_quota",
             ]:
-                read_methods[read_method](namespace=self.namespace, **kwargs)
+                response = read_methods[read_method](
+                    namespace=self.namespace, **kwargs, **raw_kwargs
+                )
             else:
-                read_methods[read_method](self.namespace)
+                response = read_methods[read_method](self.namespace, **raw_kwargs)
+            if self.raw_json:
+                release(response)
         except ApiException as exc:
             if exc.status == HTTPStatus.NOT_FOUND:
                 return None
@@ -260,6 +543,146 @@ class CalrissianContext:
                 raise exc
         return read_methods
 
+    def read_object(self, read_method, **kwargs):
+        """Reads an object, from the informer cache when it holds it
+
+        Args:
+            read_method (str): the read method of the object kind
+            name (str): the object name, defaults to the namespace name
+
+        Returns:
+            the kubernetes object
+        """
+        name = kwargs.get("name", self.namespace)
+
+        if self.cache is not None:
+            cached = self.cache.get(read_method, name)
+            if cached is not None:
+                return cached
+
+        if read_method == "read_namespace":
+            return self.core_v1_api.read_namespace(name=name)
+
+        return self._get_read_methods()[read_method](
+            name=name, namespace=self.namespace
+        )
+
+    def wait_for_object(
+        self, read_method, timeout: int = 60, uid: str = None, **kwargs
+    ) -> bool:
+        """Waits until an object exists
+
+        The object is first looked up with a list call, if it is not there yet
+        a watch is opened from the list resourceVersion until it shows up or the
+        deadline is reached. If watches are not available, it falls back to
+        retry() with an exponential backoff.
+
+        Args:
+            read_method (str): the read method of the object kind
+            timeout (int): deadline in seconds
+            uid (str): the uid of the object returned by its creation, an
+                object of the same name with another uid, e.g. a deleted one
+                still in the informer cache, is not counted
+            name (str): the object name, defaults to the namespace name
+
+        Returns:
+            bool: True if the object exists before the deadline
+        """
+        name = kwargs.get("name", self.namespace)
+
+        def is_current(obj) -> bool:
+            return uid is None or _get_uid(obj) == uid
+
+        if self.cache is not None:
+            cached = self.cache.get(read_method, name)
+            if cached is not None and is_current(cached):
+                return True
+
+        list_method = self._get_list_methods()[read_method]
+
+        list_kwargs = {
+            "field_selector": f"metadata.name={kwargs.get('name', self.namespace)}"
+        }
+        if read_method != "read_namespace":
+            list_kwargs["namespace"] = self.namespace
+
+        deadline = time.monotonic() + timeout
+
+        try:
+            while time.monotonic() < deadline:
+                if self.raw_json:
+                    response = call_raw(list_method, **list_kwargs)
+                    items = response["items"]
+                    resource_version = response["metadata"]["resourceVersion"]
+                else:
+                    response = list_method(**list_kwargs)
+                    items = response.items
+                    resource_version = response.metadata.resource_version
+                if any(is_current(item) for item in items):
+                    return True
+
+                remaining = max(1, int(deadline - time.monotonic()))
+                object_watch = RawWatch() if self.raw_json else watch.Watch()
+                try:
+                    for event in object_watch.stream(
+                        list_method,
+                        resource_version=resource_version,
+                        timeout_seconds=remaining,
+                        _request_timeout=remaining + 5,
+                        **list_kwargs,
+                    ):
+                        if event["type"] in ["ADDED", "MODIFIED"] and is_current(
+                            event["raw_object"]
+                        ):
+                            return True
+                except ApiException as exc:
+                    # the resourceVersion is too old, list again
+                    if exc.status != HTTPStatus.GONE:
+                        raise exc
+                finally:
+                    object_watch.stop()
+
+            return False
+
+        except ApiException as exc:
+            if exc.status not in [
+                HTTPStatus.FORBIDDEN,
+                HTTPStatus.METHOD_NOT_ALLOWED,
+            ]:
+                raise exc
+            logger.warning(
+                f"watch not available ({exc.status}), polling for {read_method}"
+            )
+
+        if uid is None:
+            is_created = partial(self.is_object_created, read_method, **kwargs)
+        else:
+            is_created = partial(self._is_object_read, read_method, is_current, name)
+
+        return bool(
+            self.retry(
+                is_created,
+                max_tries=sys.maxsize,
+                timeout=max(0, deadline - time.monotonic()),
+            )
+        )
+
+    def _is_object_read(self, read_method, is_current, name) -> bool:
+        """Reads an object from the API server, not from the informer cache,
+        and returns is_current(object), False if it does not exist"""
+        try:
+            if read_method == "read_namespace":
+                obj = self.core_v1_api.read_namespace(name=name)
+            else:
+                obj = self._get_read_methods()[read_method](
+                    name=name, namespace=self.namespace
+                )
+        except ApiException as exc:
+            if exc.status != HTTPStatus.NOT_FOUND:
+                raise exc
+            return False
+        return is_current(obj)
+
     def is_namespace_created(self, **kwargs):
 
         return self.is_object_created("read_namespace", **kwargs)
@@ -295,19 +718,41 @@ class CalrissianContext:
         return self.is_object_created("read_namespaced_secret", **kwargs)
 
     @staticmethod
-    def retry(fun, max_tries=10, interval=5, **kwargs):
-        for i in range(max_tries):
+    def retry(fun, max_tries=10, interval=0.5, max_interval=5, timeout=None, **kwargs):
+        """Calls fun until it returns a truthy value
+
+        The first call is immediate, the following ones are delayed with an
+        exponential backoff with full jitter capped to max_interval seconds or
+        by the Retry-After delay sent by the API server. The API errors that
+        RetryPolicy does not consider transient are raised.
+
+        Returns:
+            the value returned by fun or None if max_tries or timeout is reached
+        """
+        policy = RetryPolicy(
+            max_tries=max_tries, interval=interval, max_interval=max_interval
+        )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for attempt in range(max_tries):
+            if deadline is not None and attempt > 0 and time.monotonic() > deadline:
+                break
+            error = None
+            token = retry_attempt.set(attempt)
             try:
-                time.sleep(interval)
-                return fun(**kwargs)
+                response = fun(**kwargs)
+                if response:
+                    return response
             except ApiException as exc:
-                if exc.status.value < 500 and exc.status.value != 429:
-                    # Useless to retry against a 4xx/not-429
+                if not policy.is_retryable(exc):
                     raise exc
+                error = exc
             except Exception:
-                continue
-        if i == max_tries:
-            raise ApiException()
+                pass
+            finally:
+                retry_attempt.reset(token)
+            if attempt < max_tries - 1:
+                time.sleep(policy.get_delay(attempt, error))
+        return None
 
     def create_namespace(
         self, labels: dict = None, annotations: dict = None
@@ -315,7 +760,7 @@ class CalrissianContext:
 
         if self.is_namespace_created():
             logger.info(f"namespace {self.namespace} exists, skipping creation")
-            return self.core_v1_api.read_namespace(name=self.namespace)
+            return self.read_object("read_namespace")
 
         logger.info(f"creating namespace {self.namespace}")
         try:
@@ -328,7 +773,7 @@ class CalrissianContext:
                 body=body, async_req=False
             )  # noqa: E501
 
-            if not self.retry(self.is_namespace_created):
+            if not self.wait_for_object("read_namespace"):
                 raise ApiException(http_resp=response)
             logger.info(f"namespace {self.namespace} created")
             return response
@@ -346,9 +791,7 @@ class CalrissianContext:
 
         if self.is_role_created(name=name):
 
-            return self.rbac_authorization_v1_api.read_namespaced_role(
-                name=name, namespace=self.namespace
-            )
+            return self.read_object("read_namespaced_role", name=name)
 
         metadata = client.V1ObjectMeta(name=name, namespace=self.namespace)
 
@@ -367,7 +810,7 @@ class CalrissianContext:
                 )
             )
 
-            if not self.retry(self.is_role_created, name=name):
+            if not self.wait_for_object("read_namespaced_role", name=name):
                 raise ApiException(http_resp=response)
             logger.info(f"role {name} created")
             return response
@@ -383,9 +826,7 @@ class CalrissianContext:
 
         if self.is_role_binding_created(name=name):
 
-            return self.rbac_authorization_v1_api.read_namespaced_role_binding(
-                name=name, namespace=self.namespace
-            )
+            return self.read_object("read_namespaced_role_binding", name=name)
 
         metadata = client.V1ObjectMeta(name=name, namespace=self.namespace)
 
@@ -416,7 +857,7 @@ class CalrissianContext:
                 self.namespace, body, pretty=True
             )
 
-            if not self.retry(self.is_role_binding_created, name=name):
+            if not self.wait_for_object("read_namespaced_role_binding", name=name):
                 raise ApiException(http_resp=response)
             logger.info(f"role binding {name} created")
             return response
@@ -431,9 +872,7 @@ class CalrissianContext:
 
         if self.is_resource_quota_created(name=name):
 
-            return self.core_v1_api.read_namespaced_resource_quota(
-                name=name, namespace=self.namespace
-            )
+            return self.read_object("read_namespaced_resource_quota", name=name)
 
         # hard = {
         #     "requests.cpu": "1",
@@ -459,7 +898,7 @@ class CalrissianContext:
                 self.namespace, body, pretty=True
             )
 
-            if not self.retry(self.is_resource_quota_created, name=name):
+            if not self.wait_for_object("read_namespaced_resource_quota", name=name):
                 raise ApiException(http_resp=response)
             logger.info(f"resource quota {name} created")
             return response
@@ -480,8 +919,8 @@ class CalrissianContext:
 
         if self.is_pvc_created(name=name):
 
-            return self.core_v1_api.read_namespaced_persistent_volume_claim(
-                name=name, namespace=self.namespace
+            return self.read_object(
+                "read_namespaced_persistent_volume_claim", name=name
             )
 
         metadata = client.V1ObjectMeta(name=name, namespace=self.namespace)
@@ -502,7 +941,9 @@ class CalrissianContext:
                 self.namespace, body, pretty=True
             )
 
-            if not self.retry(self.is_pvc_created, name=name):
+            if not self.wait_for_object(
+                "read_namespaced_persistent_volume_claim", name=name
+            ):
                 raise ApiException(http_resp=response)
             logger.info(f"pvc {name} created")
             return response
@@ -516,17 +957,24 @@ class CalrissianContext:
     def create_configmap(
         self,
         name,
-        key,
-        content,
+        key=None,
+        content=None,
         annotations: Dict = {},
         labels: Dict = {},
+        data: Dict = None,
+        binary_data: Dict = None,
     ):
 
         if self.is_config_map_created(name=name):
 
-            self.core_v1_api.delete_namespaced_config_map(
-                namespace=self.namespace, name=name
-            )  # noqa: E501
+            try:
+                self.core_v1_api.delete_namespaced_config_map(
+                    namespace=self.namespace, name=name
+                )  # noqa: E501
+            except ApiException as e:
+                # the cache may still hold a config map deleted in the meantime
+                if e.status != HTTPStatus.NOT_FOUND:
+                    raise e
 
         metadata = client.V1ObjectMeta(
             annotations=annotations,
@@ -536,13 +984,14 @@ class CalrissianContext:
             namespace=self.namespace,
         )
 
-        data = {}
-        data[key] = content
+        if data is None:
+            data = {key: content}
 
         config_map = client.V1ConfigMap(
             api_version="v1",
             kind="ConfigMap",
             data=data,
+            binary_data=binary_data or None,
             metadata=metadata,
         )
 
@@ -553,7 +1002,10 @@ class CalrissianContext:
                 pretty=True,
             )
 
-            if not self.retry(self.is_config_map_created, name=name):
+            # a deleted config map of the same name may still be cached
+            if not self.wait_for_object(
+                "read_namespaced_config_map", name=name, uid=response.metadata.uid
+            ):
                 raise ApiException(http_resp=response)
             logger.info(f"config map {name} created")
             return response
@@ -562,13 +1014,63 @@ class CalrissianContext:
             logger.info(f"config map {name} not created in the time interval assigned")
             raise e
 
+    def create_immutable_configmap(
+        self,
+        name,
+        key=None,
+        content=None,
+        annotations: Dict = {},
+        labels: Dict = {},
+        data: Dict = None,
+        binary_data: Dict = None,
+    ):
+        """Creates an immutable config map unless it is known to exist
+
+        The name must identify the content (e.g. contain its hash): an existing
+        config map with the same name is reused as is and the names already
+        created in the namespace are remembered in-process.
+        """
+        known_key = (self.api_client.configuration.host, self.namespace, name)
+
+        if known_key in known_config_maps:
+            logger.info(f"config map {name} exists, skipping creation")
+            return
+
+        config_map = client.V1ConfigMap(
+            api_version="v1",
+            kind="ConfigMap",
+            data=data if data is not None else {key: content},
+            binary_data=binary_data or None,
+            immutable=True,
+            metadata=client.V1ObjectMeta(
+                annotations=annotations,
+                labels={**labels, CONTENT_ADDRESSED_LABEL: "true"},
+                name=name,
+                namespace=self.namespace,
+            ),
+        )
+
+        try:
+            response = self.core_v1_api.create_namespaced_config_map(
+                namespace=self.namespace, body=config_map
+            )
+            logger.info(f"config map {name} created")
+        except ApiException as e:
+            if e.status != HTTPStatus.CONFLICT:
+                logger.error(f"config map {name} not created: {e}\n")
+                raise e
+            logger.info(f"config map {name} exists, skipping creation")
+            response = None
+
+        known_config_maps.add(known_key)
+
+        return response
+
     def _create_image_pull_secret(self, name, content):
 
         if self.is_image_pull_secret_created(name=name):
 
-            return self.core_v1_api.read_namespaced_secret(
-                namespace=self.namespace, name=name
-            )  # noqa: E501
+            return self.read_object("read_namespaced_secret", name=name)
 
         metadata = {"name": name, "namespace": self.namespace}
 
@@ -587,7 +1089,7 @@ class CalrissianContext:
                 pretty=True,
             )
 
-            if not self.retry(self.is_image_pull_secret_created, name=name):
+            if not self.wait_for_object("read_namespaced_secret", name=name):
                 raise ApiException(http_resp=response)
             logger.info(f"image pull secret {name} created")
             return response
@@ -1,15 +1,26 @@
 import json
+import math
 import os
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from enum import Enum
+from http import HTTPStatus
 from typing import Dict, List, Optional
 
+from kubernetes.client.models.v1_job import V1Job
+from kubernetes.client.models.v1_job_status import V1JobStatus
 from kubernetes.client.models.v1_pod import V1Pod
 from kubernetes.client.rest import ApiException
 from loguru import logger
+from urllib3.exceptions import HTTPError
 
+from pycalrissian.capacity import fit_job_to_capacity
 from pycalrissian.context import CalrissianContext
 from pycalrissian.job import CalrissianJob, ContainerNames
+from pycalrissian.raw import RawWatch, call_raw, loads
+from pycalrissian.sizing import SizingAdvisor
 from pycalrissian.utils import copy_from_volume
 
 
@@ -20,45 +31,238 @@ class JobStatus(Enum):
     KILLED = "killed"
 
 
+def get_job_status(status: V1JobStatus) -> Optional[JobStatus]:
+    """Returns the JobStatus of a kubernetes job status"""
+    if status.active is None and status.start_time is None:
+        return JobStatus.ACTIVE
+    if status.active:
+        return JobStatus.ACTIVE
+    if status.succeeded:
+        return JobStatus.SUCCEEDED
+    if status.failed:
+        return JobStatus.FAILED
+    return None
+
+
+def get_raw_job_status(status: Dict) -> Optional[JobStatus]:
+    """Returns the JobStatus of a kubernetes job status as returned by the API"""
+    if status.get("active") is None and status.get("startTime") is None:
+        return JobStatus.ACTIVE
+    if status.get("active"):
+        return JobStatus.ACTIVE
+    if status.get("succeeded"):
+        return JobStatus.SUCCEEDED
+    if status.get("failed"):
+        return JobStatus.FAILED
+    return None
+
+
+def is_pod_waiting(pod: Dict) -> bool:
+    """Returns True if a container of a pod, as returned by the API (JSON),
+    waits with ImagePullBackOff"""
+    return any(
+        ((con_status.get("state") or {}).get("waiting") or {}).get("reason")
+        in ["ImagePullBackOff"]
+        for con_status in (pod.get("status") or {}).get("containerStatuses") or []
+    )
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+
+    if value is None:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class ExecutionRecord:
+    """Compact state of an execution, the fields of its job status that are
+    used, kept instead of the kubernetes job"""
+
+    __slots__ = (
+        "name",
+        "namespace",
+        "phase",
+        "finished",
+        "start_time",
+        "completion_time",
+        "exit_reason",
+        "output_location",
+        "resource_version",
+    )
+
+    def __init__(self, name: str, namespace: str, output_location: str = None):
+        self.name = name
+        self.namespace = namespace
+        self.phase: Optional[JobStatus] = None
+        # the job has its Complete or Failed condition, its status is final
+        self.finished = False
+        self.start_time: Optional[datetime] = None
+        self.completion_time: Optional[datetime] = None
+        # the reason of the Failed condition, e.g. BackoffLimitExceeded
+        self.exit_reason: Optional[str] = None
+        # the path of the output on the calrissian volume
+        self.output_location = output_location
+        self.resource_version: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ExecutionRecord({self.namespace}/{self.name}, "
+            f"{self.phase.value if self.phase else None})"
+        )
+
+    def update(self, job: Dict) -> bool:
+        """Updates the record from a job as returned by the API (JSON)
+
+        Returns:
+            bool: True if the status changed
+        """
+        status = job.get("status") or {}
+        conditions = status.get("conditions") or []
+
+        finished, exit_reason = False, None
+        for condition in conditions:
+            if condition.get("status") != "True":
+                continue
+            if condition["type"] in ["Complete", "Failed"]:
+                finished = True
+            if condition["type"] == "Failed":
+                exit_reason = condition.get("reason")
+
+        completion_time = status.get("completionTime")
+        if completion_time is None and conditions:
+            completion_time = conditions[0].get("lastTransitionTime")
+
+        previous = (
+            self.phase,
+            self.finished,
+            self.start_time,
+            self.completion_time,
+            self.exit_reason,
+        )
+
+        self.phase = get_raw_job_status(status)
+        self.finished = finished
+        self.start_time = _parse_time(status.get("startTime"))
+        self.completion_time = _parse_time(completion_time)
+        self.exit_reason = exit_reason
+        self.resource_version = job["metadata"].get("resourceVersion")
+
+        return previous != (
+            self.phase,
+            self.finished,
+            self.start_time,
+            self.completion_time,
+            self.exit_reason,
+        )
+
+
+def submit_many(executions: List["CalrissianExecution"], max_workers: int = 8) -> List:
+    """Submits many executions concurrently
+
+    Args:
+        executions (List[CalrissianExecution]): the executions to submit
+        max_workers (int): maximum number of jobs submitted concurrently
+
+    Returns:
+        List: None for the submitted executions, or the exceptions raised
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(execution.submit) for execution in executions]
+
+    return [future.exception() for future in futures]
+
+
 class CalrissianExecution:
-    def __init__(self, job: CalrissianJob, runtime_context: CalrissianContext) -> None:
+    def __init__(
+        self,
+        job: CalrissianJob,
+        runtime_context: CalrissianContext,
+        sizing_advisor: SizingAdvisor = None,
+    ) -> None:
         self.job = job
         self.runtime_context = runtime_context
-        self.namespaced_job = None
+        # sizes the job from the previous runs and records this one
+        self.sizing_advisor = sizing_advisor
         self.killed = False
+        # the last job status read or watched, set on submission
+        self.record: Optional[ExecutionRecord] = None
+
+    @property
+    def namespaced_job(self) -> Optional[V1Job]:
+        """The kubernetes job, read on each access
+
+        Deprecated, the job status is kept in record.
+        """
+        logger.warning(
+            "CalrissianExecution.namespaced_job is deprecated, use "
+            "CalrissianExecution.record"
+        )
+        if self.record is None:
+            return None
+        return self.runtime_context.batch_v1_api.read_namespaced_job(
+            name=self.namespaced_job_name,
+            namespace=self.runtime_context.namespace,
+        )
 
     def submit(self):
-        """Submits the job to the cluster"""
+        """Creates the job config maps and submits the job to the cluster"""
+        sized = self.sizing_advisor is not None and self.sizing_advisor.apply(self.job)
+        if self.job.fit_to_capacity:
+            fit_job_to_capacity(self.job, self.runtime_context, cap_only=sized)
+
+        self.job.create_config_maps()
+
         logger.info(f"submit job {self.job.job_name}")
-        response = self.runtime_context.batch_v1_api.create_namespaced_job(
-            self.runtime_context.namespace, self.job.to_k8s_job()
-        )
+        # set before the creation, the job may be watched as soon as it exists
         self.namespaced_job_name = self.job.job_name
-        self.namespaced_job = response
+        self.record = ExecutionRecord(
+            name=self.job.job_name,
+            namespace=self.runtime_context.namespace,
+            output_location=os.path.join(self.job.calrissian_job_path, "output.json"),
+        )
+        try:
+            response = self.runtime_context.batch_v1_api.create_namespaced_job(
+                self.runtime_context.namespace,
+                self.job.to_manifest(),
+                _preload_content=False,
+            )
+        except ApiException as e:
+            self.record = None
+            raise e
+        if self.record.resource_version is None:
+            self.record.update(loads(response.data))
         logger.info(f"job {self.job.job_name} submitted")
 
     def get_status(self):
-        """Returns the job status"""
+        """Returns the job status, read from the cluster until the job finishes"""
         if self.killed:
             return JobStatus.KILLED
+        if not self.is_finished():
+            self._read_status()
+        return self.record.phase
+
+    def _read_status(self) -> bool:
+        """Reads the job status, as JSON without the kubernetes models, and
+        returns True if it changed"""
         try:
-            response = self.runtime_context.batch_v1_api.read_namespaced_job_status(
+            job = call_raw(
+                self.runtime_context.batch_v1_api.read_namespaced_job_status,
                 name=self.namespaced_job_name,
                 namespace=self.runtime_context.namespace,
-                pretty=True,
             )
-            if response.status.active is None and response.status.start_time is None:
-                return JobStatus.ACTIVE
-            if response.status.active:
-                return JobStatus.ACTIVE
-            if response.status.succeeded:
-                return JobStatus.SUCCEEDED
-            if response.status.failed:
-                return JobStatus.FAILED
-            return None
         except ApiException as e:
             logger.error(f"Exception when calling get status: {e}\n")
             raise e
+        return self._update_status(job)
+
+    def _update_status(self, job: Dict) -> bool:
+
+        return self.record.update(job)
+
+    def is_finished(self) -> bool:
+        """Returns True once the job has its Complete or Failed condition, its
+        status no longer changes"""
+        return self.record is not None and self.record.finished
 
     def is_complete(self) -> bool:
         """Returns True if the job execution is completed (success or failed)"""
@@ -79,21 +283,26 @@ class CalrissianExecution:
     def get_output(self) -> Dict:
         """Returns the job output"""
         if self.is_succeeded:
-            filename = self.get_file_from_volume(["output.json"])[0]
-            with open(filename, "r") as staged_file:
-                return json.load(staged_file)
+            with tempfile.TemporaryDirectory() as staging_path:
+                filename = self.get_file_from_volume(["output.json"], staging_path)[0]
+                with open(filename, "r") as staged_file:
+                    return json.load(staged_file)
 
     def get_usage_report(self) -> Dict:
         """Returns the job usage report"""
         if self.is_complete:
             try:
-                filename = self.get_file_from_volume(["report.json"])[0]
-                with open(filename, "r") as staged_file:
-                    return json.load(staged_file)
+                with tempfile.TemporaryDirectory() as staging_path:
+                    filename = self.get_file_from_volume(["report.json"], staging_path)[
+                        0
+                    ]
+                    with open(filename, "r") as staged_file:
+                        return json.load(staged_file)
             except json.decoder.JSONDecodeError:
                 return {}
 
-    def get_file_from_volume(self, filenames):
+    def get_file_from_volume(self, filenames, destination_path="."):
+        """Copies files of the job working directory to destination_path"""
 
         volume = {
             "name": self.job.volume_calrissian_wdir,
@@ -106,13 +315,12 @@ class CalrissianExecution:
             "mountPath": self.job.calrissian_base_path,
         }
 
-        destination_path = "."
         copy_from_volume(
             context=self.runtime_context,
             volume=volume,
             volume_mount=volume_mount,
             source_paths=[
-                os.path.join(self.job.calrissian_base_path, filename)
+                os.path.join(self.job.calrissian_job_path, filename)
                 for filename in filenames
             ],
             destination_path=destination_path,
@@ -131,10 +339,7 @@ class CalrissianExecution:
         usage_report = self.get_usage_report()
         if "children" in usage_report.keys():
             self.get_file_from_volume(
-                [
-                    os.path.join(self.job.calrissian_base_path, tool["name"] + ".log")
-                    for tool in usage_report["children"]
-                ]
+                [tool["name"] + ".log" for tool in usage_report["children"]]
             )
 
             return [
@@ -147,12 +352,21 @@ class CalrissianExecution:
         try:
 
             pod_label_selector = f"job-name={self.job.job_name}"
-            pods_list = self.runtime_context.core_v1_api.list_namespaced_pod(
-                namespace=self.runtime_context.namespace,
-                label_selector=pod_label_selector,
-                timeout_seconds=10,
-            )
-            pod_name = pods_list.items[0].metadata.name
+            if self.runtime_context.raw_json:
+                pods_list = call_raw(
+                    self.runtime_context.core_v1_api.list_namespaced_pod,
+                    namespace=self.runtime_context.namespace,
+                    label_selector=pod_label_selector,
+                    timeout_seconds=10,
+                )
+                pod_name = pods_list["items"][0]["metadata"]["name"]
+            else:
+                pods_list = self.runtime_context.core_v1_api.list_namespaced_pod(
+                    namespace=self.runtime_context.namespace,
+                    label_selector=pod_label_selector,
+                    timeout_seconds=10,
+                )
+                pod_name = pods_list.items[0].metadata.name
 
             return self.runtime_context.core_v1_api.read_namespaced_pod_log(
                 name=pod_name,
@@ -168,84 +382,148 @@ class CalrissianExecution:
 
     def get_start_time(self):
         """Returns the start time"""
-        try:
-            response = self.runtime_context.batch_v1_api.read_namespaced_job_status(
-                name=self.namespaced_job_name,
-                namespace=self.runtime_context.namespace,
-                pretty=True,
-            )
-            if response.status.start_time is not None:
-                return response.status.start_time
-            return None
-        except ApiException as e:
-            logger.error(f"Exception when calling get status: {e}\n")
-            raise e
+        if self.record.start_time is None:
+            self._read_status()
+        return self.record.start_time
 
     def get_completion_time(self):
         """Returns either the completion time or the last transition time"""
-        try:
-            response = self.runtime_context.batch_v1_api.read_namespaced_job_status(
-                name=self.namespaced_job_name,
-                namespace=self.runtime_context.namespace,
-                pretty=True,
-            )
-            if response.status.completion_time is not None:
-                return response.status.completion_time
-            if response.status.conditions is not None:
-                return response.status.conditions[0].last_transition_time
-            return None
-        except ApiException as e:
-            logger.error(f"Exception when calling get status: {e}\n")
-            raise e
+        if not self.is_finished():
+            self._read_status()
+        return self.record.completion_time
 
     def monitor(
-        self, interval: int = 5, grace_period=120, wall_time: Optional[int] = None
+        self,
+        interval: int = 5,
+        grace_period=120,
+        wall_time: Optional[int] = None,
+        max_interval: int = 60,
+        watch_timeout: int = 300,
     ) -> None:
+        """Waits for the job to finish
+
+        The job status is updated from a watch on the job and, if the watch
+        fails or is closed early, by polling it every interval seconds, up to
+        max_interval seconds while it does not change. The job is killed after
+        wall_time seconds or if its pods wait with ImagePullBackOff, checked
+        every grace_period seconds.
+        """
+        if not self.is_active():
+            logger.warning("job is not submitted")
+            return
 
-        if self.is_active():
-            iterations = 0
+        start = time.monotonic()
+        next_check = start + grace_period
+        delay = interval
+        watch_failures = 0
 
-            while self.is_active():
+        while not self.is_finished() and not self.killed:
 
-                logger.info(f"job {self.job.job_name} is active")
-                time.sleep(interval)
-                iterations = iterations + 1
+            now = time.monotonic()
+            if wall_time is not None and now - start > wall_time:
+                logger.warning("reached wall time for execution, killing job")
+                self._kill()
+                return
 
-                if wall_time is not None and iterations > int(wall_time / interval):
+            if now >= next_check:
+                next_check = now + grace_period
+                if self.get_waiting_pods():
                     logger.warning(
-                        "reached wall time for execution, killing job"  # noqa: E501
+                        "found pods in waiting status with reason ImagePullBackOff, killing job"  # noqa: E501
                     )
+                    self._kill()
+                    return
+
+            timeout = next_check - now
+            if wall_time is not None:
+                timeout = min(timeout, start + wall_time - now)
+
+            if watch_failures < 3:
+                watch_window = min(timeout, watch_timeout)
+                try:
+                    self._watch_status(timeout=watch_window)
+                    watch_failures = 0
+                    if (
+                        self.is_finished()
+                        or self.killed
+                        or time.monotonic() - now >= watch_window
+                    ):
+                        continue
+                    # closed by the server before its timeout, the status is
+                    # read after a pause rather than reconnecting at once
+                except ApiException as e:
+                    if e.status == HTTPStatus.GONE:
+                        # the resource version is too old, read it again
+                        self._read_status()
+                        continue
+                    watch_failures += 1
+                    logger.warning(f"watch on job {self.job.job_name} failed: {e}")
+                except (HTTPError, OSError) as e:
+                    watch_failures += 1
+                    logger.warning(f"watch on job {self.job.job_name} failed: {e}")
+
+            # polling, slower while the status does not change
+            time.sleep(max(0, min(delay, timeout)))
+            if self._read_status():
+                delay = interval
+            else:
+                delay = min(delay * 2, max_interval)
+
+        self._finish()
+
+    def _finish(self):
+        """Logs the outcome of the job and records the usage of a success"""
+        if self.is_complete():
+            logger.info("execution is complete")
+        if self.is_succeeded():
+            logger.info("the outcome is: success!")
+            if self.sizing_advisor is not None:
+                self.sizing_advisor.record(self.job, self.get_usage_report())
+
+    def _watch_status(self, timeout: float):
+        """Updates the job status from a watch until the job finishes or the
+        timeout expires"""
+        job_watch = RawWatch()
+        try:
+            for event in job_watch.stream(
+                self.runtime_context.batch_v1_api.list_namespaced_job,
+                namespace=self.runtime_context.namespace,
+                field_selector=f"metadata.name={self.namespaced_job_name}",
+                resource_version=self.record.resource_version,
+                timeout_seconds=max(1, math.ceil(timeout)),
+            ):
+                if event["type"] == "DELETED":
+                    logger.warning(f"job {self.job.job_name} was deleted")
                     self.killed = True
-                    self.runtime_context.batch_v1_api.delete_namespaced_job(
-                        namespace=self.runtime_context.namespace,
-                        name=self.namespaced_job_name,
-                        timeout=wall_time,
-                    )
                     return
+                self._update_status(event["raw_object"])
+                logger.info(
+                    f"job {self.job.job_name} is "
+                    f"{getattr(self.record.phase, 'value', None)}"
+                )
+                if self.is_finished():
+                    return
+        finally:
+            job_watch.stop()
 
-                if iterations > int(grace_period / interval):
-                    waiting_pods = self.get_waiting_pods()
-                    if waiting_pods:
-                        logger.warning(
-                            "found pods in waiting status with reason ImagePullBackOff, killing job"  # noqa: E501
-                        )
-                        self.killed = True
-                        self.runtime_context.batch_v1_api.delete_namespaced_job(
-                            namespace=self.runtime_context.namespace,
-                            name=self.namespaced_job_name,
-                            timeout=wall_time,
-                        )
-                        return
-
-            if self.is_complete():
-                logger.info("execution is complete")
-            if self.is_succeeded():
-                logger.info("the outcome is: success!")
-
-        else:
-            logger.warning("job is not submitted")
+    def _kill(self):
+
+        self.killed = True
+        self.runtime_context.batch_v1_api.delete_namespaced_job(
+            namespace=self.runtime_context.namespace,
+            name=self.namespaced_job_name,
+            propagation_policy="Background",
+        )
 
     def get_waiting_pods(self) -> List[V1Pod]:
+        """Returns the pods of the namespace waiting with ImagePullBackOff, as
+        dictionaries in raw JSON mode"""
+        if self.runtime_context.raw_json:
+            response = call_raw(
+                self.runtime_context.core_v1_api.list_namespaced_pod,
+                self.runtime_context.namespace,
+            )
+            return [pod for pod in response["items"] if is_pod_waiting(pod)]
 
         pods_waiting = []
 
@@ -0,0 +1,1195 @@
+"""
+In-memory fake of the kubernetes API server for tests and benchmarks
+
+FakeApiClient answers the REST calls of the kubernetes client models (CoreV1,
+BatchV1, RbacAuthorizationV1) from an in-memory store, so the generated API
+methods, the (de)serialisation, watches and exec streams run unchanged:
+
+    cluster = FakeKubernetes(job_duration=0.5)
+    context = cluster.context(namespace="my-namespace")
+    context.initialise()
+
+Jobs go through simulated Pending, Running and Succeeded/Failed phases, write
+the calrissian output, usage report and stderr to the fake volume and return a
+log. A latency can be added to every request.
+
+Pods are admitted against the compute resource quotas of their namespace: a
+container without the requests or limits of a quota resource is rejected. A
+job whose pod is rejected fails at once with the FailedCreate reason instead
+of retrying.
+"""
+
+import base64
+import gzip
+import heapq
+import io
+import itertools
+import json
+import re
+import shlex
+import tarfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from functools import partial
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import yaml
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from pycalrissian.context import CalrissianContext
+
+# matches /api/v1/... and /apis/<group>/<version>/...
+_PATH = re.compile(
+    r"^/(?:api/v1|apis/[^/]+/[^/]+)"
+    r"(?:/namespaces/(?P<namespace>[^/]+))?"
+    r"/(?P<plural>[^/]+)(?:/(?P<name>[^/]+))?(?:/(?P<subresource>[^/]+))?$"
+)
+
+_KINDS = {
+    "namespaces": "Namespace",
+    "configmaps": "ConfigMap",
+    "secrets": "Secret",
+    "persistentvolumeclaims": "PersistentVolumeClaim",
+    "resourcequotas": "ResourceQuota",
+    "serviceaccounts": "ServiceAccount",
+    "pods": "Pod",
+    "nodes": "Node",
+    "jobs": "Job",
+    "roles": "Role",
+    "rolebindings": "RoleBinding",
+}
+
+_WITH_STATUS = [
+    "namespaces",
+    "persistentvolumeclaims",
+    "resourcequotas",
+    "pods",
+    "nodes",
+    "jobs",
+]
+
+
+def _now() -> str:
+
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _format_indexes(indexes) -> str:
+    """Formats completion indexes as in an Indexed Job status, e.g. "1,3-5" for
+    {1, 3, 4, 5}"""
+    intervals = []
+    for index in sorted(indexes):
+        if intervals and intervals[-1][1] == index - 1:
+            intervals[-1][1] = index
+        else:
+            intervals.append([index, index])
+    return ",".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in intervals
+    )
+
+
+def _merge(target: Dict, patch: Dict) -> Dict:
+    """JSON merge patch, lists are replaced"""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def _matches(obj: Dict, field_selector: str, label_selector: str) -> bool:
+
+    for requirement in filter(None, (field_selector or "").split(",")):
+        key, operator, value = re.match(r"(.+?)(!=|==|=)(.*)", requirement).groups()
+        actual = obj
+        for part in key.split("."):
+            actual = actual.get(part, {}) if isinstance(actual, dict) else {}
+        if (actual == value) != (operator != "!="):
+            return False
+
+    labels = obj["metadata"].get("labels") or {}
+    for requirement in filter(None, (label_selector or "").split(",")):
+        match = re.match(r"(.+?)(!=|==|=)(.*)", requirement)
+        if match is None:
+            if requirement.startswith("!"):
+                if requirement[1:] in labels:
+                    return False
+            elif requirement not in labels:
+                return False
+            continue
+        key, operator, value = match.groups()
+        if (labels.get(key) == value) != (operator != "!="):
+            return False
+
+    return True
+
+
+class FakeResponse:
+    """Stands for the urllib3 response returned by RESTClientObject"""
+
+    def __init__(
+        self, status: int = 200, data=b"", chunks=None, ws_client=None, headers=None
+    ):
+        self.status = status
+        self.reason = HTTPStatus(status).phrase
+        self.data = data
+        self._chunks = chunks
+        self.ws_client = ws_client
+        self.headers = {"content-type": "application/json", **(headers or {})}
+
+    def getheaders(self):
+        return self.headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def stream(self, amt=None, decode_content=False):
+        if self._chunks is None:
+            yield self.data
+        else:
+            yield from self._chunks
+
+    def read(self):
+        return self.data
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeWSClient:
+    """Stands for kubernetes.stream.ws_client.WSClient of an exec call"""
+
+    def __init__(self, stdout: str = "", stderr: str = "", on_stdin=None):
+        self._stdout = stdout
+        self._stderr = stderr
+        self._stdin = []
+        self._on_stdin = on_stdin
+        self._open = True
+        # the commands writing to stderr fail
+        self.returncode = 1 if stderr else 0
+
+    def is_open(self):
+        return self._open
+
+    def update(self, timeout=0):
+        if not self._stdout and not self._stderr and self._on_stdin is None:
+            self._open = False
+
+    def peek_stdout(self, timeout=0):
+        return bool(self._stdout)
+
+    def read_stdout(self, timeout=None):
+        data, self._stdout = self._stdout, ""
+        return data
+
+    def peek_stderr(self, timeout=0):
+        return bool(self._stderr)
+
+    def read_stderr(self, timeout=None):
+        data, self._stderr = self._stderr, ""
+        return data
+
+    def read_all(self):
+        return self.read_stdout() + self.read_stderr()
+
+    def write_stdin(self, data):
+        self._stdin.append(data)
+
+    def run_forever(self, timeout=None):
+        self.close()
+
+    def close(self, **kwargs):
+        if self._open and self._on_stdin is not None:
+            self._on_stdin("".join(self._stdin))
+        self._open = False
+
+
+class _Scheduler:
+    """Runs the simulated transitions on a single thread"""
+
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay: float, callback: Callable, *args):
+
+        with self._condition:
+            heapq.heappush(
+                self._queue,
+                (time.monotonic() + delay, next(self._counter), callback, args),
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="fake-kubernetes", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = (
+                        self._queue[0][0] - time.monotonic() if self._queue else None
+                    )
+                    self._condition.wait(timeout)
+                _, _, callback, args = heapq.heappop(self._queue)
+            callback(*args)
+
+
+class FakeApiClient(client.ApiClient):
+    """ApiClient answering the requests from the FakeKubernetes store"""
+
+    def __init__(self, cluster: "FakeKubernetes"):
+        # a distinct host per cluster, some state is keyed by API server
+        host = f"http://fake-kubernetes-{uuid.uuid4().hex[:8]}"
+        super().__init__(client.Configuration(host=host))
+        self.cluster = cluster
+
+    @property
+    def request(self):
+        return self._fake_request
+
+    @request.setter
+    def request(self, value):
+        # kubernetes.stream swaps the request method for a websocket one,
+        # exec calls are recognised by their path instead
+        pass
+
+    def _fake_request(
+        self,
+        method,
+        url,
+        query_params=None,
+        headers=None,
+        post_params=None,
+        body=None,
+        _preload_content=True,
+        _request_timeout=None,
+    ):
+        query = {}
+        for key, value in query_params or []:
+            # repeated parameters, e.g. the exec command, become lists
+            query[key] = [*query[key], value] if key in query else value
+            if key == "command" and not isinstance(query[key], list):
+                query[key] = [value]
+
+        response = self.cluster.handle(method, urlparse(url).path, query, body)
+
+        if response.status >= 400:
+            raise ApiException(http_resp=response)
+
+        if response.ws_client is not None and not _preload_content:
+            return response.ws_client
+
+        if _preload_content and isinstance(response.data, bytes):
+            response.data = response.data.decode("utf-8")
+
+        return response
+
+
+class FakeKubernetes:
+    """In-memory kubernetes API server"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        pod_startup: float = 0.05,
+        job_duration: float = 0.1,
+        job_succeeds: Callable[[Dict], bool] = None,
+        index_succeeds: Callable[[Dict, int], bool] = None,
+        outputs: Callable[[Optional[Dict]], Dict] = None,
+        log: str = "calrissian fake execution log\n",
+        failing_images: List[str] = None,
+        nodes: List[Dict] = None,
+        fault: Callable[[str, str], Optional[int]] = None,
+        retry_after: float = None,
+        event_history: int = 10000,
+    ):
+        """Creates a FakeKubernetes object
+
+        Args:
+            latency (float): seconds added to every request
+            pod_startup (float): seconds a pod stays Pending
+            job_duration (float): seconds a job pod stays Running
+            job_succeeds (Callable): called with the job manifest, returns False
+                to make the job fail, jobs succeed by default
+            index_succeeds (Callable): called with the manifest of an Indexed
+                Job and a completion index, returns False to make the index
+                fail halfway through the job, defaults to job_succeeds
+            outputs (Callable): called with the job params, returns the content
+                of output.json
+            log (str): log of the job pods
+            failing_images (List[str]): images stuck in ImagePullBackOff
+            nodes (List[Dict]): node manifests returned by list_node
+            fault (Callable): called with the method and path of each request,
+                returns an HTTP status code to fail the request with or None
+            retry_after (float): Retry-After header sent with the 429 and 503
+            event_history (int): number of events kept to resume watches
+
+        Returns:
+            None: none
+        """
+        self.latency = latency
+        self.pod_startup = pod_startup
+        self.job_duration = job_duration
+        self.job_succeeds = job_succeeds or (lambda job: True)
+        self.index_succeeds = index_succeeds or (
+            lambda job, index: self.job_succeeds(job)
+        )
+        self.outputs = outputs or (lambda params: {})
+        self.log = log
+        self.failing_images = failing_images or []
+        self.fault = fault
+        self.retry_after = retry_after
+
+        self.api_client = FakeApiClient(self)
+
+        # (plural, namespace) -> name -> object
+        self._objects: Dict = {}
+        # (namespace, claim) -> path -> content
+        self.volumes: Dict = {}
+        self._resource_version = itertools.count(1)
+        self._events = deque(maxlen=event_history)
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._scheduler = _Scheduler()
+
+        # (method, plural, subresource) -> count
+        self.requests = Counter()
+
+        for node in nodes or []:
+            self.create("nodes", None, node)
+
+    def context(
+        self,
+        namespace: str,
+        storage_class: str = "standard",
+        volume_size: str = "1G",
+        **kwargs,
+    ) -> CalrissianContext:
+        """Creates a CalrissianContext using this fake cluster"""
+        return CalrissianContext(
+            namespace=namespace,
+            storage_class=storage_class,
+            volume_size=volume_size,
+            api_client=self.api_client,
+            **kwargs,
+        )
+
+    # store
+
+    def get(self, plural, namespace, name) -> Optional[Dict]:
+
+        with self._lock:
+            return self._objects.get((plural, namespace), {}).get(name)
+
+    def list(self, plural, namespace=None) -> List[Dict]:
+
+        with self._lock:
+            if namespace is not None:
+                return list(self._objects.get((plural, namespace), {}).values())
+            return [
+                obj
+                for (kind, _), objects in self._objects.items()
+                if kind == plural
+                for obj in objects.values()
+            ]
+
+    def _record(self, event_type, plural, namespace, obj):
+
+        resource_version = str(next(self._resource_version))
+        obj["metadata"]["resourceVersion"] = resource_version
+        self._events.append(
+            (int(resource_version), event_type, plural, namespace, json.dumps(obj))
+        )
+        self._changed.notify_all()
+
+    def create(self, plural, namespace, body: Dict) -> Dict:
+
+        obj = json.loads(json.dumps(body))
+        metadata = obj.setdefault("metadata", {})
+        if not metadata.get("name") and metadata.get("generateName"):
+            metadata["name"] = metadata["generateName"] + uuid.uuid4().hex[:5]
+        metadata["namespace"] = namespace
+        metadata["uid"] = str(uuid.uuid4())
+        metadata["creationTimestamp"] = _now()
+        obj.setdefault("kind", _KINDS.get(plural))
+        if plural in _WITH_STATUS:
+            obj.setdefault("status", {})
+        if plural in ["namespaces", "nodes"]:
+            metadata.pop("namespace")
+
+        with self._lock:
+            objects = self._objects.setdefault((plural, namespace), {})
+            if metadata["name"] in objects:
+                return None
+            objects[metadata["name"]] = obj
+            self._record("ADDED", plural, namespace, obj)
+
+        return obj
+
+    def update(self, plural, namespace, name, patch: Dict) -> Optional[Dict]:
+
+        with self._lock:
+            obj = self.get(plural, namespace, name)
+            if obj is None:
+                return None
+            _merge(obj, json.loads(json.dumps(patch)))
+            self._record("MODIFIED", plural, namespace, obj)
+            return obj
+
+    def delete(self, plural, namespace, name) -> Optional[Dict]:
+
+        with self._lock:
+            obj = self._objects.get((plural, namespace), {}).pop(name, None)
+            if obj is None:
+                return None
+            self._record("DELETED", plural, namespace, obj)
+
+            if plural == "namespaces":
+                for kind, object_namespace in list(self._objects):
+                    if object_namespace == name:
+                        for child in list(self._objects[(kind, name)]):
+                            self.delete(kind, name, child)
+                for key in [key for key in self.volumes if key[0] == name]:
+                    del self.volumes[key]
+            elif plural == "jobs":
+                for pod in self.list("pods", namespace):
+                    labels = pod["metadata"].get("labels") or {}
+                    if labels.get("job-name") == name:
+                        self.delete("pods", namespace, pod["metadata"]["name"])
+
+            return obj
+
+    # REST
+
+    def handle(self, method, path, query: Dict, body) -> FakeResponse:
+        """Answers a REST request"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        match = _PATH.match(path)
+        if match is None:
+            return self._status(HTTPStatus.NOT_FOUND, f"unknown path {path}")
+
+        namespace, plural, name, subresource = match.group(
+            "namespace", "plural", "name", "subresource"
+        )
+        self.requests[(method, plural, subresource)] += 1
+
+        status = self.fault(method, path) if self.fault is not None else None
+        if status:
+            response = self._status(HTTPStatus(status), "injected fault")
+            if self.retry_after is not None and status in [429, 503]:
+                response.headers["retry-after"] = str(self.retry_after)
+            return response
+
+        if namespace is not None and plural != "namespaces":
+            if self.get("namespaces", None, namespace) is None and method == "POST":
+                return self._status(
+                    HTTPStatus.NOT_FOUND, f'namespaces "{namespace}" not found'
+                )
+
+        if name is None:
+            if method == "GET" and query.get("watch") in [True, "true", "True"]:
+                return self._watch(plural, namespace, query)
+            if method == "GET":
+                return self._list(plural, namespace, query)
+            if method == "POST":
+                return self._create(plural, namespace, body)
+            if method == "DELETE":
+                return self._delete_collection(plural, namespace, query)
+
+        elif subresource == "log":
+            return self._pod_log(namespace, name)
+
+        elif subresource == "exec":
+            return self._exec(namespace, name, query)
+
+        elif method == "GET":
+            obj = self.get(plural, namespace, name)
+            if obj is None:
+                return self._not_found(plural, name)
+            return FakeResponse(data=json.dumps(obj).encode())
+
+        elif method in ["PATCH", "PUT"]:
+            obj = self.update(plural, namespace, name, body)
+            if obj is None:
+                return self._not_found(plural, name)
+            return FakeResponse(data=json.dumps(obj).encode())
+
+        elif method == "DELETE":
+            obj = self.delete(plural, namespace, name)
+            if obj is None:
+                return self._not_found(plural, name)
+            return FakeResponse(data=json.dumps(obj).encode())
+
+        return self._status(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} {path}")
+
+    @staticmethod
+    def _status(status: HTTPStatus, message: str) -> FakeResponse:
+
+        return FakeResponse(
+            status=status.value,
+            data=json.dumps(
+                {
+                    "kind": "Status",
+                    "apiVersion": "v1",
+                    "status": "Failure",
+                    "message": message,
+                    "reason": status.phrase.replace(" ", ""),
+                    "code": status.value,
+                }
+            ).encode(),
+        )
+
+    def _not_found(self, plural, name) -> FakeResponse:
+
+        return self._status(HTTPStatus.NOT_FOUND, f'{plural} "{name}" not found')
+
+    def _list(self, plural, namespace, query) -> FakeResponse:
+
+        with self._lock:
+            items = [
+                obj
+                for obj in self.list(plural, namespace)
+                if _matches(obj, query.get("fieldSelector"), query.get("labelSelector"))
+            ]
+            data = json.dumps(
+                {
+                    "apiVersion": "v1",
+                    "kind": f"{_KINDS.get(plural, '')}List",
+                    "metadata": {"resourceVersion": str(self._last_resource_version())},
+                    "items": items,
+                }
+            ).encode()
+        return FakeResponse(data=data)
+
+    def _last_resource_version(self) -> int:
+
+        return self._events[-1][0] if self._events else 0
+
+    def _watch(self, plural, namespace, query) -> FakeResponse:
+
+        timeout = float(query.get("timeoutSeconds") or 300)
+        resource_version = int(
+            query.get("resourceVersion") or self._last_resource_version()
+        )
+
+        def events():
+            deadline = time.monotonic() + timeout
+            last = resource_version
+            with self._lock:
+                if self._events and last < self._events[0][0] - 1:
+                    gone = json.loads(self._status(HTTPStatus.GONE, "too old").data)
+                    yield json.dumps({"type": "ERROR", "object": gone}) + "\n"
+                    return
+            while True:
+                with self._lock:
+                    pending = [
+                        event
+                        for event in self._events
+                        if event[0] > last
+                        and event[2] == plural
+                        and (namespace is None or event[3] == namespace)
+                    ]
+                    if not pending:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return
+                        self._changed.wait(remaining)
+                        continue
+                for version, event_type, _, _, data in pending:
+                    last = version
+                    obj = json.loads(data)
+                    if _matches(
+                        obj, query.get("fieldSelector"), query.get("labelSelector")
+                    ):
+                        yield json.dumps({"type": event_type, "object": obj}) + "\n"
+
+        return FakeResponse(chunks=events())
+
+    def _get_quota_violations(self, namespace, pod_spec: Dict) -> List[str]:
+        """Returns the requests and limits the containers of a pod miss under
+        the compute resource quotas of the namespace"""
+        required = set()
+        for quota in self.list("resourcequotas", namespace):
+            for key in (quota.get("spec") or {}).get("hard") or {}:
+                kind, _, resource = key.rpartition(".")
+                if resource in ["cpu", "memory"]:
+                    required.add((kind or "requests", resource))
+
+        violations = []
+        for container in (pod_spec.get("initContainers") or []) + pod_spec.get(
+            "containers", []
+        ):
+            resources = container.get("resources") or {}
+            for kind, resource in sorted(required):
+                # the requests default to the limits
+                kinds = [kind, "limits"] if kind == "requests" else [kind]
+                if not any(resource in (resources.get(k) or {}) for k in kinds):
+                    violations.append(f"{kind}.{resource} for {container['name']}")
+
+        return violations
+
+    def _create(self, plural, namespace, body) -> FakeResponse:
+
+        if plural == "pods":
+            violations = self._get_quota_violations(namespace, body["spec"])
+            if violations:
+                return self._status(
+                    HTTPStatus.FORBIDDEN,
+                    f'pods "{body["metadata"]["name"]}" is forbidden: failed quota: '
+                    f"must specify {', '.join(violations)}",
+                )
+
+        obj = self.create(plural, namespace, body)
+        if obj is None:
+            return self._status(
+                HTTPStatus.CONFLICT,
+                f'{plural} "{body["metadata"]["name"]}" already exists',
+            )
+
+        if plural == "namespaces":
+            name = obj["metadata"]["name"]
+            self.create("serviceaccounts", name, {"metadata": {"name": "default"}})
+            self.create(
+                "configmaps",
+                name,
+                {"metadata": {"name": "kube-root-ca.crt"}, "data": {"ca.crt": ""}},
+            )
+            self.update("namespaces", None, name, {"status": {"phase": "Active"}})
+        elif plural == "persistentvolumeclaims":
+            self.update(
+                plural,
+                namespace,
+                obj["metadata"]["name"],
+                {"status": {"phase": "Bound"}},
+            )
+        elif plural == "resourcequotas":
+            self.update(
+                plural,
+                namespace,
+                obj["metadata"]["name"],
+                {
+                    "status": {
+                        "hard": obj["spec"].get("hard", {}),
+                        "used": {key: "0" for key in obj["spec"].get("hard", {})},
+                    }
+                },
+            )
+        elif plural == "pods":
+            self._start_pod(namespace, obj)
+        elif plural == "jobs":
+            self._start_job(namespace, obj)
+
+        return FakeResponse(status=201, data=json.dumps(obj).encode())
+
+    def _delete_collection(self, plural, namespace, query) -> FakeResponse:
+
+        for obj in self.list(plural, namespace):
+            if _matches(obj, query.get("fieldSelector"), query.get("labelSelector")):
+                self.delete(plural, namespace, obj["metadata"]["name"])
+
+        return FakeResponse(
+            data=json.dumps(
+                {"kind": "Status", "apiVersion": "v1", "status": "Success"}
+            ).encode()
+        )
+
+    # pods and jobs
+
+    def _start_pod(self, namespace, pod):
+
+        name = pod["metadata"]["name"]
+        images = [container["image"] for container in pod["spec"]["containers"]]
+
+        self.update("pods", namespace, name, {"status": {"phase": "Pending"}})
+
+        if any(image in self.failing_images for image in images):
+            self._scheduler.schedule(
+                self.pod_startup,
+                self.update,
+                "pods",
+                namespace,
+                name,
+                {
+                    "status": {
+                        "containerStatuses": [
+                            {
+                                "name": container["name"],
+                                "image": container["image"],
+                                "imageID": "",
+                                "ready": False,
+                                "restartCount": 0,
+                                "state": {
+                                    "waiting": {
+                                        "reason": "ImagePullBackOff",
+                                        "message": "Back-off pulling image",
+                                    }
+                                },
+                            }
+                            for container in pod["spec"]["containers"]
+                        ]
+                    }
+                },
+            )
+            return
+
+        self._run_init_containers(namespace, pod)
+
+        self._scheduler.schedule(
+            self.pod_startup,
+            self.update,
+            "pods",
+            namespace,
+            name,
+            {"status": {"phase": "Running", "startTime": _now()}},
+        )
+
+    def _run_init_containers(self, namespace, pod):
+        """Runs the python3 -c init containers as the calrissian-wdir one:
+        the (source, destination) argument pairs are gunzipped"""
+        for container in pod["spec"].get("initContainers") or []:
+            if (container.get("command") or [])[:2] != ["python3", "-c"]:
+                continue
+            args = container.get("args") or []
+            for source, destination in zip(args[1::2], args[2::2]):
+                content = self.read_pod_file(namespace, pod, source)
+                if content is not None:
+                    self.write_pod_file(
+                        namespace, pod, destination, gzip.decompress(content)
+                    )
+
+    def _start_job(self, namespace, job):
+
+        name = job["metadata"]["name"]
+        spec = job["spec"]
+        indexed = spec.get("completionMode") == "Indexed"
+        completions = spec.get("completions") or 1
+
+        pods = []
+        for index in range(completions):
+            template = json.loads(json.dumps(spec["template"]))
+            metadata = template.setdefault("metadata", {})
+            metadata["name"] = f"{name}-{index}-{uuid.uuid4().hex[:5]}"
+            metadata.setdefault("labels", {}).update(
+                {"job-name": name, "controller-uid": job["metadata"]["uid"]}
+            )
+            if indexed:
+                metadata.setdefault("annotations", {})[
+                    "batch.kubernetes.io/job-completion-index"
+                ] = str(index)
+                for container in template["spec"]["containers"]:
+                    container["args"] = [
+                        arg.replace("$(JOB_COMPLETION_INDEX)", str(index))
+                        for arg in container.get("args") or []
+                    ]
+            response = self._create("pods", namespace, template)
+            if response.status == HTTPStatus.FORBIDDEN:
+                self.update(
+                    "jobs",
+                    namespace,
+                    name,
+                    {
+                        "status": {
+                            "failed": 1,
+                            "startTime": _now(),
+                            "conditions": [
+                                {
+                                    "type": "Failed",
+                                    "status": "True",
+                                    "reason": "FailedCreate",
+                                    "message": json.loads(response.data)["message"],
+                                    "lastTransitionTime": _now(),
+                                }
+                            ],
+                        }
+                    },
+                )
+                return
+            pods.append(metadata["name"])
+
+        images = [
+            container["image"] for container in spec["template"]["spec"]["containers"]
+        ]
+        if any(image in self.failing_images for image in images):
+            return
+
+        self._scheduler.schedule(
+            self.pod_startup,
+            self.update,
+            "jobs",
+            namespace,
+            name,
+            {"status": {"active": completions, "startTime": _now()}},
+        )
+        if indexed:
+            self._scheduler.schedule(
+                self.pod_startup + self.job_duration / 2,
+                self._fail_indexes,
+                namespace,
+                name,
+                pods,
+            )
+        self._scheduler.schedule(
+            self.pod_startup + self.job_duration,
+            self._complete_job,
+            namespace,
+            name,
+            pods,
+        )
+
+    def _fail_indexes(self, namespace, name, pods):
+        """Fails the pods of the failing indexes of an Indexed Job, the job
+        fails once its backoff limit is exceeded"""
+        job = self.get("jobs", namespace, name)
+        if job is None:
+            return
+
+        spec = job["spec"]
+        per_index = spec.get("backoffLimitPerIndex")
+        backoff_limit = spec.get("backoffLimit") or 0
+
+        failed_indexes = set()
+        failed = 0
+        for index, pod_name in enumerate(pods):
+            if self.index_succeeds(job, index):
+                continue
+            failed_indexes.add(index)
+            # the pod is retried until the backoff limit is exceeded
+            failed += (per_index if per_index is not None else backoff_limit) + 1
+            self.update("pods", namespace, pod_name, {"status": {"phase": "Failed"}})
+        if not failed_indexes:
+            return
+
+        status = {"failed": failed}
+        if per_index is not None:
+            status["failedIndexes"] = _format_indexes(failed_indexes)
+        if per_index is None or failed > backoff_limit:
+            # the job fails as a whole, the other pods are terminated
+            for pod_name in pods:
+                self.update(
+                    "pods", namespace, pod_name, {"status": {"phase": "Failed"}}
+                )
+            status["active"] = None
+            status["conditions"] = [
+                {
+                    "type": "Failed",
+                    "status": "True",
+                    "reason": "BackoffLimitExceeded",
+                    "lastTransitionTime": _now(),
+                }
+            ]
+        else:
+            status["active"] = len(pods) - len(failed_indexes) or None
+
+        self.update("jobs", namespace, name, {"status": status})
+
+    def _complete_job(self, namespace, name, pods):
+
+        job = self.get("jobs", namespace, name)
+        if job is None:
+            return
+
+        status = job.get("status") or {}
+        if any(
+            condition["type"] == "Failed" and condition["status"] == "True"
+            for condition in status.get("conditions") or []
+        ):
+            return
+
+        indexed = job["spec"].get("completionMode") == "Indexed"
+        # the failing indexes of an Indexed Job already failed halfway through
+        succeeded = indexed or self.job_succeeds(job)
+
+        failed_indexes = set()
+        completed_indexes = set()
+        for index, pod_name in enumerate(pods):
+            pod = self.get("pods", namespace, pod_name)
+            if pod is None:
+                continue
+            if indexed and pod["status"].get("phase") == "Failed":
+                failed_indexes.add(index)
+                continue
+            if succeeded:
+                self._run_calrissian(namespace, pod)
+                completed_indexes.add(index)
+            self.update(
+                "pods",
+                namespace,
+                pod_name,
+                {
+                    "status": {
+                        "phase": "Succeeded" if index in completed_indexes else "Failed"
+                    }
+                },
+            )
+        succeeded = succeeded and not failed_indexes
+
+        status = {
+            "active": None,
+            "conditions": [
+                {
+                    "type": "Complete" if succeeded else "Failed",
+                    "status": "True",
+                    "lastTransitionTime": _now(),
+                    **(
+                        {}
+                        if succeeded
+                        else {
+                            "reason": (
+                                "FailedIndexes"
+                                if failed_indexes
+                                else "BackoffLimitExceeded"
+                            )
+                        }
+                    ),
+                }
+            ],
+        }
+        if completed_indexes:
+            status["succeeded"] = len(completed_indexes)
+            if indexed:
+                status["completedIndexes"] = _format_indexes(completed_indexes)
+        if succeeded:
+            status["completionTime"] = _now()
+        elif not failed_indexes:
+            status["failed"] = (job["spec"].get("backoffLimit") or 0) + 1
+
+        self.update("jobs", namespace, name, {"status": status})
+
+    def _run_calrissian(self, namespace, pod):
+        """Writes the files calrissian writes on the volume"""
+        container = pod["spec"]["containers"][0]
+        args = container.get("args") or []
+
+        def option(name):
+            return args[args.index(name) + 1] if name in args else None
+
+        params = None
+        try:
+            content = self.read_pod_file(namespace, pod, args[-1])
+            params = yaml.safe_load(content) if content is not None else None
+        except Exception:
+            params = None
+
+        output = self.outputs(params)
+
+        report = {
+            "cpus": 1,
+            "ram_megabytes": 256,
+            "start_time": pod["status"].get("startTime"),
+            "finish_time": _now(),
+            "elapsed_seconds": self.job_duration,
+            "elapsed_hours": self.job_duration / 3600,
+            "total_cpu_hours": self.job_duration / 3600,
+            "total_ram_megabyte_hours": 256 * self.job_duration / 3600,
+            "total_tasks": 1,
+            "max_parallel_cpus": 1,
+            "max_parallel_ram_megabytes": 256,
+            "max_parallel_tasks": 1,
+            "children": [
+                {
+                    "name": "tool",
+                    "cpus": 1,
+                    "ram_megabytes": 256,
+                    "exit_code": 0,
+                    "elapsed_seconds": self.job_duration,
+                }
+            ],
+        }
+
+        files = {
+            option("--stdout"): json.dumps(output),
+            option("--stderr"): "",
+            option("--usage-report"): json.dumps(report),
+        }
+        if option("--tool-logs-basepath"):
+            files[f"{option('--tool-logs-basepath').rstrip('/')}/tool.log"] = "tool\n"
+
+        for path, content in files.items():
+            if path is not None:
+                self.write_pod_file(namespace, pod, path, content.encode())
+
+    def _pod_log(self, namespace, name) -> FakeResponse:
+
+        if self.get("pods", namespace, name) is None:
+            return self._not_found("pods", name)
+        return FakeResponse(data=self.log.encode())
+
+    # volumes
+
+    def _resolve(self, namespace, pod, path):
+        """Returns the volume and the path in it for a path in a pod"""
+        container = pod["spec"]["containers"][0]
+        volumes = {volume["name"]: volume for volume in pod["spec"].get("volumes", [])}
+
+        for mount in sorted(
+            container.get("volumeMounts") or [],
+            key=lambda mount: len(mount["mountPath"]),
+            reverse=True,
+        ):
+            mount_path = mount["mountPath"].rstrip("/")
+            if path == mount_path or path.startswith(mount_path + "/"):
+                relative_path = path.replace(mount_path, "", 1).lstrip("/")
+                return volumes.get(mount["name"]), relative_path
+
+        return None, path
+
+    def read_pod_file(self, namespace, pod, path) -> Optional[bytes]:
+        """Reads a file as seen by the first container of a pod"""
+        volume, relative_path = self._resolve(namespace, pod, path)
+        if volume is None:
+            return None
+
+        if "persistentVolumeClaim" in volume:
+            claim = volume["persistentVolumeClaim"]["claimName"]
+            return self.volumes.get((namespace, claim), {}).get(relative_path)
+
+        sources = []
+        if "configMap" in volume:
+            sources.append(volume["configMap"])
+        if "projected" in volume:
+            sources.extend(
+                source["configMap"]
+                for source in volume["projected"]["sources"]
+                if "configMap" in source
+            )
+
+        for source in sources:
+            config_map = self.get("configmaps", namespace, source["name"])
+            if config_map is None:
+                continue
+            keys = {
+                item["path"]: item["key"] for item in source.get("items") or []
+            } or {key: key for key in config_map.get("data", {})}
+            key = keys.get(relative_path)
+            if key in (config_map.get("data") or {}):
+                return config_map["data"][key].encode()
+            if key in (config_map.get("binaryData") or {}):
+                return base64.b64decode(config_map["binaryData"][key])
+
+        return None
+
+    def write_pod_file(self, namespace, pod, path, content: bytes):
+        """Writes a file as seen by the first container of a pod"""
+        volume, relative_path = self._resolve(namespace, pod, path)
+        if volume is not None and "persistentVolumeClaim" in volume:
+            claim = volume["persistentVolumeClaim"]["claimName"]
+            with self._lock:
+                self.volumes.setdefault((namespace, claim), {})[relative_path] = content
+
+    def _extract(self, namespace, pod, data: str):
+
+        with tarfile.open(fileobj=io.BytesIO(data.encode("utf-8"))) as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    self.write_pod_file(
+                        namespace,
+                        pod,
+                        "/" + member.name.lstrip("/"),
+                        tar.extractfile(member).read(),
+                    )
+
+    def _exec(self, namespace, name, query) -> FakeResponse:
+
+        pod = self.get("pods", namespace, name)
+        if pod is None:
+            return self._not_found("pods", name)
+
+        command = list(query.get("command") or ["true"])
+        if command[:2] == ["/bin/sh", "-c"] or command[:2] == ["sh", "-c"]:
+            command = shlex.split(command[2])
+
+        stdout, stderr, on_stdin = "", "", None
+
+        if command[0] == "cat":
+            for path in command[1:]:
+                content = self.read_pod_file(namespace, pod, path)
+                if content is None:
+                    stderr += f"cat: can't open '{path}': No such file or directory\n"
+                else:
+                    stdout += content.decode()
+
+        elif command[0] == "tar" and command[1].startswith("c"):
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as tar:
+                for path in command[3:]:
+                    content = self.read_pod_file(namespace, pod, path)
+                    if content is None:
+                        continue
+                    info = tarfile.TarInfo(name=path.lstrip("/"))
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+            stdout = buffer.getvalue().decode("utf-8")
+
+        elif command[0] == "tar" and command[1].startswith("x"):
+            on_stdin = partial(self._extract, namespace, pod)
+
+        elif command[0] in ["find", "rm"]:
+            paths = [arg for arg in command[1:] if arg.startswith("/")]
+            for path in paths:
+                volume, relative_path = self._resolve(namespace, pod, path.rstrip("*"))
+                if volume is None or "persistentVolumeClaim" not in volume:
+                    continue
+                claim = volume["persistentVolumeClaim"]["claimName"]
+                files = self.volumes.get((namespace, claim), {})
+                prefix = relative_path.rstrip("/")
+                for key in list(files):
+                    if not prefix or key == prefix or key.startswith(prefix + "/"):
+                        del files[key]
+
+        elif command[0] == "ls":
+            for path in command[1:]:
+                volume, relative_path = self._resolve(namespace, pod, path)
+                if volume is not None and "persistentVolumeClaim" in volume:
+                    claim = volume["persistentVolumeClaim"]["claimName"]
+                    prefix = relative_path.rstrip("/")
+                    stdout += "".join(
+                        f"{key}\n"
+                        for key in sorted(self.volumes.get((namespace, claim), {}))
+                        if not prefix or key.startswith(prefix + "/")
+                    )
+
+        elif command[:2] == ["head", "-c"] and command[3:6] == ["|", "base64", "-d"]:
+            # head -c <length> | base64 -d > path, as HelperPod.write_to_volume
+            length, path = int(command[2]), command[7]
+
+            def on_stdin(data):
+                content = base64.b64decode(data[:length])
+                self.write_pod_file(namespace, pod, path, content)
+
+        elif command[:3] == ["wc", "-c", "<"]:
+            content = self.read_pod_file(namespace, pod, command[3])
+            if content is None:
+                stderr = f"sh: can't open {command[3]}: no such file\n"
+            else:
+                stdout = f"{len(content)}\n"
+
+        elif command[0] == "echo":
+            stdout = " ".join(command[1:]) + "\n"
+
+        elif command[0] not in ["true", "mkdir", "date"]:
+            stderr = f"{command[0]}: not found\n"
+
+        return FakeResponse(
+            data=(stdout + stderr).encode(),
+            ws_client=FakeWSClient(stdout, stderr, on_stdin),
+        )
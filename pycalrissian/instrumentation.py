@@ -0,0 +1,251 @@
+"""
+Per API call instrumentation, the calls made through the kubernetes API objects
+of a CalrissianContext are recorded with their verb, kind, latency, status code
+and retry count and aggregated in latency histograms exported as Prometheus
+text or, with a tracer, as OpenTelemetry spans
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:  # pragma: no cover
+    Status = None
+
+# attempt number of the enclosing retry loop, read when a call is recorded
+retry_attempt: ContextVar[int] = ContextVar("retry_attempt", default=0)
+
+# the Prometheus client default buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_VERBS = [
+    ("delete_collection_", "deletecollection"),
+    ("connect_", "connect"),
+    ("create_", "create"),
+    ("delete_", "delete"),
+    ("list_", "list"),
+    ("patch_", "patch"),
+    ("read_", "get"),
+    ("replace_", "update"),
+]
+
+_SUBRESOURCES = ["status", "log", "exec", "scale", "eviction"]
+
+
+@lru_cache(maxsize=None)
+def parse_method(method_name: str) -> Tuple[str, str, str]:
+    """Returns the verb, kind and subresource of an API method
+
+    e.g. read_namespaced_job_status is ("get", "Job", "status")
+    """
+    for prefix, verb in _VERBS:
+        if method_name.startswith(prefix):
+            resource = method_name[len(prefix) :]  # noqa: E203
+            break
+    else:
+        return method_name, "", ""
+
+    resource = resource.replace("namespaced_", "", 1)
+    resource = resource.replace("_for_all_namespaces", "")
+
+    subresource = ""
+    for candidate in _SUBRESOURCES:
+        if resource.endswith(f"_{candidate}"):
+            resource = resource[: -len(candidate) - 1]
+            subresource = candidate
+            break
+
+    kind = "".join(part.capitalize() for part in resource.split("_"))
+
+    return verb, kind, subresource
+
+
+class _Histogram:
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Instrumentation:
+    """Records the kubernetes API calls"""
+
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS, tracer=None):
+        """Creates an Instrumentation object
+
+        Args:
+            buckets (List[float]): upper bounds in seconds of the latency buckets
+            tracer (opentelemetry.trace.Tracer): if set, each call is also
+                exported as a span
+
+        Returns:
+            None: none
+        """
+        self.buckets = sorted(buckets)
+        self.tracer = tracer
+
+        self._lock = threading.Lock()
+        # (verb, kind, subresource, code) -> histogram
+        self._histograms: Dict[Tuple, _Histogram] = {}
+        # (verb, kind, subresource) -> retries
+        self._retries: Dict[Tuple, int] = {}
+
+    def record(
+        self,
+        verb: str,
+        kind: str,
+        latency: float,
+        status: Optional[int],
+        attempt: int = 0,
+        subresource: str = "",
+        start_time: float = None,
+    ):
+        """Records an API call
+
+        Args:
+            verb (str): the kubernetes verb (get, list, watch, create, ...)
+            kind (str): the resource kind (e.g. ConfigMap)
+            latency (float): duration of the call in seconds
+            status (int): the HTTP status code, 0 if no response was received,
+                None if the response does not give it
+            attempt (int): number of previous attempts of the same operation,
+                the call counts as one retry if it is not the first
+            subresource (str): the subresource (e.g. status, log)
+            start_time (float): the start of the call as returned by time.time()
+
+        Returns:
+            None
+        """
+        key = (verb, kind, subresource, status)
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if latency <= bound:
+                    histogram.counts[index] += 1
+                    break
+            histogram.sum += latency
+            histogram.count += 1
+            if attempt:
+                self._retries[key[:3]] = self._retries.get(key[:3], 0) + 1
+
+        if self.tracer is not None:
+            self._export_span(
+                verb, kind, subresource, status, attempt, latency, start_time
+            )
+
+    def _export_span(
+        self, verb, kind, subresource, status, attempt, latency, start_time
+    ):
+
+        if start_time is None:
+            start_time = time.time() - latency
+        start_time_ns = int(start_time * 1e9)
+
+        attributes = {
+            "k8s.verb": verb,
+            "k8s.kind": kind,
+            "k8s.subresource": subresource,
+            "retry.attempt": attempt,
+        }
+        if status is not None:
+            attributes["http.status_code"] = status
+
+        span = self.tracer.start_span(
+            f"{verb} {kind}/{subresource}" if subresource else f"{verb} {kind}",
+            start_time=start_time_ns,
+            attributes=attributes,
+        )
+        if Status is not None and status is not None and (status == 0 or status >= 400):
+            span.set_status(Status(StatusCode.ERROR))
+        span.end(end_time=start_time_ns + int(latency * 1e9))
+
+    def get_histograms(self) -> Dict:
+        """Returns the latency histograms keyed by (verb, kind, subresource, code),
+        each with its cumulative bucket counts, sum and count"""
+        with self._lock:
+            histograms = {}
+            for key, histogram in self._histograms.items():
+                cumulative, total = [], 0
+                for count in histogram.counts:
+                    total += count
+                    cumulative.append(total)
+                histograms[key] = {
+                    "buckets": dict(zip(self.buckets, cumulative)),
+                    "sum": histogram.sum,
+                    "count": histogram.count,
+                }
+            return histograms
+
+    def get_retries(self) -> Dict:
+        """Returns the number of retries keyed by (verb, kind, subresource)"""
+        with self._lock:
+            return dict(self._retries)
+
+    def get_request_count(self) -> int:
+        """Returns the total number of recorded calls"""
+        with self._lock:
+            return sum(histogram.count for histogram in self._histograms.values())
+
+    def reset(self):
+
+        with self._lock:
+            self._histograms.clear()
+            self._retries.clear()
+
+    def to_prometheus(self, prefix: str = "pycalrissian_api") -> str:
+        """Returns the histograms in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_request_duration_seconds Kubernetes API call latency.",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+
+        for (verb, kind, subresource, code), histogram in sorted(
+            self.get_histograms().items(),
+            key=lambda item: (*item[0][:3], -1 if item[0][3] is None else item[0][3]),
+        ):
+            labels = f'verb="{verb}",kind="{kind}",subresource="{subresource}"'
+            # no code label when the status is unknown
+            if code is not None:
+                labels += f',code="{code}"'
+            for bound, count in histogram["buckets"].items():
+                lines.append(
+                    f"{prefix}_request_duration_seconds_bucket"
+                    f'{{{labels},le="{bound}"}} {count}'
+                )
+            lines.append(
+                f"{prefix}_request_duration_seconds_bucket"
+                f'{{{labels},le="+Inf"}} {histogram["count"]}'
+            )
+            lines.append(
+                f"{prefix}_request_duration_seconds_sum{{{labels}}} "
+                f'{histogram["sum"]}'
+            )
+            lines.append(
+                f"{prefix}_request_duration_seconds_count{{{labels}}} "
+                f'{histogram["count"]}'
+            )
+
+        lines.extend(
+            [
+                f"# HELP {prefix}_request_retries_total Kubernetes API call retries.",
+                f"# TYPE {prefix}_request_retries_total counter",
+            ]
+        )
+        for (verb, kind, subresource), retries in sorted(self.get_retries().items()):
+            lines.append(
+                f"{prefix}_request_retries_total"
+                f'{{verb="{verb}",kind="{kind}",subresource="{subresource}"}} '
+                f"{retries}"
+            )
+
+        return "\n".join(lines) + "\n"
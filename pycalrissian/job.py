@@ -1,13 +1,16 @@
+import base64
+import gzip
+import hashlib
 import json
 import os
 import uuid
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 from typing import Dict, List
 
 import yaml
 from kubernetes import client
-from kubernetes.client.models.v1_container import V1Container
 from kubernetes.client.models.v1_exec_action import V1ExecAction
 from kubernetes.client.models.v1_lifecycle import V1Lifecycle
 from kubernetes.client.models.v1_lifecycle_handler import V1LifecycleHandler
@@ -15,10 +18,79 @@ from kubernetes.client.models.v1_resource_requirements import V1ResourceRequirem
 from loguru import logger
 
 from pycalrissian.context import CalrissianContext
+from pycalrissian.utils import get_helper_pod
+
+# creates the directory given as first argument and decompresses the gzipped
+# files given as (source, destination) pairs, runs in the calrissian image
+DECOMPRESS_SCRIPT = """
+import gzip, os, shutil, sys
+os.makedirs(sys.argv[1], exist_ok=True)
+for source, destination in zip(sys.argv[2::2], sys.argv[3::2]):
+    with gzip.open(source) as compressed, open(destination, "wb") as plain:
+        shutil.copyfileobj(compressed, plain)
+"""
+
+
+_DECOMPRESS_COMMAND = ["python3", "-c", DECOMPRESS_SCRIPT]
+
+# the parts of the manifest common to all the jobs, shared by their manifests
+_CALRISSIAN_COMMAND = ["calrissian"]
+_CALRISSIAN_LIFECYCLE = {
+    "preStop": {"exec": {"command": ["/bin/sh", "-c", "sleep 30"]}}
+}
+_CALRISSIAN_RESOURCES = {
+    "limits": {"cpu": "2000m", "memory": "2G"},
+    "requests": {"cpu": "1000m", "memory": "1G"},
+}
+# the init container only creates directories and decompresses documents, its
+# requests and limits are needed under a compute resource quota
+_WORKING_DIRECTORY_RESOURCES = {
+    "limits": {"cpu": "100m", "memory": "128Mi"},
+    "requests": {"cpu": "100m", "memory": "128Mi"},
+}
+_POD_NAME_ENV_VAR = {
+    "name": "CALRISSIAN_POD_NAME",
+    "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}},
+}
+_KEEP_PODS_ENV_VAR = {"name": "CALRISSIAN_DELETE_PODS", "value": "false"}
+_POD_TEMPLATE_METADATA = {
+    "labels": {"pod_name": "calrissian_pod"},
+    "name": "calrissian_pod",
+}
+
+# the libyaml bindings are much faster than the pure python emitter
+YamlDumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+
+class ManifestDumper(YamlDumper):
+    """Dumps the manifests, the objects they share are written in full instead
+    of YAML anchors and aliases"""
+
+    def ignore_aliases(self, data):
+        return True
+
+    # only called by the pure python emitter
+    def increase_indent(self, flow=False, *args, **kwargs):
+        return super().increase_indent(flow=flow, indentless=False)
+
+
+class _Manifest:
+    """Wraps a manifest as an API response for ApiClient.deserialize"""
+
+    def __init__(self, manifest: Dict):
+        self.data = json.dumps(manifest)
+
+
+@lru_cache(maxsize=None)
+def get_model_client() -> client.ApiClient:
+    """Returns the ApiClient deserializing the manifests into models, it does
+    not connect to a cluster"""
+    return client.ApiClient()
 
 
 class ContainerNames(Enum):
     CALRISSIAN = "calrissian"
+    WORKING_DIRECTORY = "calrissian-wdir"
 
 
 # SIDECAR_USAGE = "sidecar-container-usage"
@@ -45,6 +117,12 @@ class CalrissianJob:
         keep_pods: bool = False,
         backoff_limit: int = 2,
         tool_logs: bool = False,
+        bundle_config_maps: bool = False,
+        compression_threshold: int = 256 * 1024,
+        staging_threshold: int = 768 * 1024,
+        labels: Dict = None,
+        resources: Dict = None,
+        fit_to_capacity: bool = False,
     ):
 
         self.cwl = cwl
@@ -64,6 +142,28 @@ class CalrissianJob:
         self.backoff_limit = backoff_limit
         self.volume_calrissian_wdir = "volume-calrissian-wdir"
         self.tool_logs = tool_logs
+        # opt-in: a single config map mounted as a projected volume holds all
+        # the documents, instead of one config map and volume per document
+        self.bundle_config_maps = bundle_config_maps
+        # mount path of the documents in bundled mode
+        self.inputs_path = "/calrissian-inputs"
+        # documents larger than compression_threshold bytes are gzipped in the
+        # config map binaryData and, if still larger than staging_threshold
+        # bytes, staged on the calrissian-wdir volume (config maps are
+        # limited to 1MiB)
+        self.compression_threshold = compression_threshold
+        self.staging_threshold = staging_threshold
+        # added to the job and pod labels
+        self.labels = labels or {}
+        # requests and limits of the calrissian container
+        self.resources = resources
+        # derive max_cores and max_ram from the quota headroom and the node
+        # capacity when the job is submitted
+        self.fit_to_capacity = fit_to_capacity
+        self._cwl_content = None
+        self._documents = None
+        self._manifest = None
+        self._k8s_job = None
 
         if self.security_context is None:
             logger.info(
@@ -78,48 +178,200 @@ class CalrissianJob:
             )
         )
         logger.info(f"job name: {self.job_name}")
-        logger.info("create CWL config map")
-        self._create_cwl_cm()
-        logger.info("create processing parameters config map")
-        self._create_params_cm()
+
+        self.calrissian_base_path = "/calrissian"
+        # the job files are written in its own directory of the calrissian-wdir
+        # volume so that several jobs can run in the same namespace
+        self.calrissian_job_path = os.path.join(
+            self.calrissian_base_path, self.job_name
+        )
+        # the compressed and staged documents are written there
+        self.calrissian_inputs_path = os.path.join(self.calrissian_job_path, "inputs")
+
+    def get_config_map_name(self, key: str) -> str:
+        """Returns the name of a config map of the job, prefixed by the job name"""
+        return f"{self.job_name}-{key}"
+
+    def get_cwl_config_map_name(self) -> str:
+        """Returns the name of the CWL config map, derived from the hash of the
+        CWL document so that the jobs running the same workflow share it"""
+        return f"cwl-workflow-{self.get_workflow_hash()[:20]}"
+
+    def get_workflow_hash(self) -> str:
+        """Returns the SHA-256 hash of the CWL document"""
+        return hashlib.sha256(self._get_cwl_content().encode("utf-8")).hexdigest()
+
+    def _get_cwl_content(self) -> str:
+
+        if self._cwl_content is None:
+            self._cwl_content = yaml.dump(self.cwl, Dumper=YamlDumper)
+        return self._cwl_content
+
+    def _get_documents(self) -> List[Dict]:
+        """Returns the documents mounted in the calrissian container with their
+        config map key, file name, config map, mount path and encoding"""
+        if self._documents is None:
+            self._documents = self._encode_documents(self._list_documents())
+        return self._documents
+
+    def _list_documents(self) -> List[Dict]:
+
+        documents = [
+            {
+                "key": "cwl-workflow",
+                "file": "workflow.cwl",
+                "mount_path": "/workflow-input",
+                "content": self._get_cwl_content(),
+                "config_map": self.get_cwl_config_map_name(),
+                "immutable": True,
+            },
+            {
+                "key": "params",
+                "file": "params.yml",
+                "mount_path": "/workflow-params",
+                "content": yaml.dump(self.params, Dumper=YamlDumper),
+            },
+        ]
 
         if self.pod_env_vars:
-            logger.info("create pod environment variables config map")
-            self._create_pod_env_vars_cm()
+            documents.append(
+                {
+                    "key": "pod-env-vars",
+                    "file": "pod_env_vars.json",
+                    "mount_path": "/pod-env-vars",
+                    "content": json.dumps(self.pod_env_vars),
+                }
+            )
 
         if self.pod_node_selector:
-            logger.info("create Pod node selector config map")
-            self._create_pod_node_selector_cm()
-
-        self.calrissian_base_path = "/calrissian"
+            documents.append(
+                {
+                    "key": "pod-node-selector",
+                    "file": "pod_nodeselectors.yml",
+                    "mount_path": "/pod-node-selector",
+                    "content": json.dumps(self.pod_node_selector),
+                }
+            )
 
-    def _create_cwl_cm(self):
-        """Create configMap with CWL"""
-        self.runtime_context.create_configmap(
-            name="cwl-workflow", key="cwl-workflow", content=yaml.dump(self.cwl)
-        )
+        for document in documents:
+            document.setdefault("immutable", False)
+            if self.bundle_config_maps:
+                # a single projected volume holds all the documents
+                document["mount_path"] = self.inputs_path
+                document.setdefault("config_map", self.get_config_map_name("inputs"))
+            else:
+                document.setdefault(
+                    "config_map", self.get_config_map_name(document["key"])
+                )
 
-    def _create_params_cm(self):
-        """Create configMap with params"""
-        self.runtime_context.create_configmap(
-            name="params", key="params", content=yaml.dump(self.params)
-        )
+        return documents
+
+    def _encode_documents(self, documents: List[Dict]) -> List[Dict]:
+
+        for document in documents:
+            document["encoding"] = None
+            content = document["content"].encode("utf-8")
+            if len(content) <= self.compression_threshold:
+                continue
+
+            # mtime=0 keeps the compressed content, and the hash of the
+            # content-addressed config maps, reproducible
+            compressed = gzip.compress(content, mtime=0)
+            if len(compressed) > self.staging_threshold:
+                logger.info(f"{document['key']} is staged on the volume")
+                document["encoding"] = "staged"
+                document["compressed_content"] = compressed
+            else:
+                logger.info(f"{document['key']} is compressed")
+                document["encoding"] = "gzip"
+                document["binary_content"] = base64.b64encode(compressed).decode()
+
+        return documents
+
+    def _get_document_path(self, key: str) -> str:
+        """Returns the path of a document in the calrissian container"""
+        for document in self._get_documents():
+            if document["key"] == key:
+                if document["encoding"] is None:
+                    return os.path.join(document["mount_path"], document["file"])
+                return os.path.join(self.calrissian_inputs_path, document["file"])
+
+    def get_staged_documents(self) -> List[Dict]:
+        """Returns the documents too large for a config map"""
+        return [
+            document
+            for document in self._get_documents()
+            if document["encoding"] == "staged"
+        ]
 
-    def _create_pod_env_vars_cm(self):
-        """Create configMap with pod environment variables"""
-        self.runtime_context.create_configmap(
-            name="pod-env-vars",
-            key="pod-env-vars",
-            content=json.dumps(self.pod_env_vars),
-        )
+    def _get_staged_path(self, document: Dict) -> str:
+        """Returns the path on the volume of a staged document, gzipped and
+        decompressed by the init container"""
+        return os.path.join(self.calrissian_inputs_path, f"{document['file']}.gz")
+
+    def stage_documents(self):
+        """Writes the gzipped documents too large for a config map on the volume
+
+        Raises:
+            RuntimeError: if a document is not written
+        """
+        staged_documents = self.get_staged_documents()
+        if not staged_documents:
+            return
+
+        with get_helper_pod(
+            context=self.runtime_context,
+            volume={
+                "name": self.volume_calrissian_wdir,
+                "persistentVolumeClaim": {
+                    "claimName": self.runtime_context.calrissian_wdir
+                },
+            },
+            volume_mount={
+                "name": self.volume_calrissian_wdir,
+                "mountPath": self.calrissian_base_path,
+            },
+        ) as helper_pod:
+            for document in staged_documents:
+                helper_pod.write_to_volume(
+                    document["compressed_content"], self._get_staged_path(document)
+                )
 
-    def _create_pod_node_selector_cm(self):
-        """Create configMap with pod node selector"""
-        self.runtime_context.create_configmap(
-            name="pod-node-selector",
-            key="pod-node-selector",
-            content=json.dumps(self.pod_node_selector),
-        )
+    def get_config_maps(self) -> List[Dict]:
+        """Returns the name, data and immutability of the config maps of the job"""
+        config_maps = {}
+
+        for document in self._get_documents():
+            if document["encoding"] == "staged":
+                continue
+            config_map = config_maps.setdefault(
+                document["config_map"],
+                {
+                    "name": document["config_map"],
+                    "data": {},
+                    "binary_data": {},
+                    "immutable": document["immutable"],
+                },
+            )
+            if document["encoding"] == "gzip":
+                config_map["binary_data"][document["key"]] = document["binary_content"]
+            else:
+                config_map["data"][document["key"]] = document["content"]
+
+        return list(config_maps.values())
+
+    def create_config_maps(self):
+        """Create the configMaps with the CWL, the params, the pod environment
+        variables and the pod node selector, the documents too large for a
+        config map are staged on the volume"""
+        self.stage_documents()
+
+        for config_map in self.get_config_maps():
+            logger.info(f"create {config_map['name']} config map")
+            if config_map.pop("immutable"):
+                self.runtime_context.create_immutable_configmap(**config_map)
+            else:
+                self.runtime_context.create_configmap(**config_map)
 
     def to_dict(self):
         """Serialize to a dictionary"""
@@ -127,143 +379,187 @@ class CalrissianJob:
 
     def to_yaml(self, file_path):
         """Serialize to YAML file"""
-
-        class Dumper(yaml.Dumper):
-            def increase_indent(self, flow=False, *args, **kwargs):
-                return super().increase_indent(flow=flow, indentless=False)
-
         with open(file_path, "w", encoding="utf-8") as outfile:
             yaml.dump(
-                self.runtime_context.api_client.sanitize_for_serialization(
-                    self.to_k8s_job()
-                ),
+                self.to_manifest(),
                 outfile,
-                Dumper=Dumper,
+                Dumper=ManifestDumper,
                 default_flow_style=False,
             )
         logger.info(f"job {self.job_name} serialized to {file_path}")
 
-    def to_k8s_job(self):
+    def to_manifest(self) -> Dict:
+        """Returns the kubernetes Job manifest as plain dictionaries, as sent
+        to the API server
+
+        The manifest is memoised until a job attribute changes, it shares
+        its static parts with the other jobs' manifests and must not be
+        modified.
+        """
+        if self._manifest is None:
+            self._manifest = self._build_manifest()
+        return self._manifest
+
+    def to_k8s_job(self) -> client.V1Job:
         """Cast to kubernetes Job"""
+        if self._k8s_job is None:
+            self._k8s_job = get_model_client().deserialize(
+                _Manifest(self.to_manifest()), "V1Job"
+            )
+        return self._k8s_job
 
-        # the CWL workflow
-        workflow_volume = client.V1Volume(
-            name="volume-cwl-workflow",
-            config_map=client.V1ConfigMapVolumeSource(
-                name="cwl-workflow",
-                optional=False,
-                items=[
-                    client.V1KeyToPath(
-                        key="cwl-workflow", path="workflow.cwl", mode=0o644
-                    )
-                ],
-                default_mode=0o644,
-            ),
-        )
-        workflow_volume_mount = client.V1VolumeMount(
-            mount_path="/workflow-input",
-            name="volume-cwl-workflow",
-        )
+    def invalidate(self, cwl: bool = True):
+        """Drops the memoised documents and manifest
 
-        # the parameters
-        params_volume = client.V1Volume(
-            name="volume-params",
-            config_map=client.V1ConfigMapVolumeSource(
-                name="params",
-                optional=False,
-                items=[client.V1KeyToPath(key="params", path="params.yml", mode=0o644)],
-                default_mode=0o644,
-            ),
-        )
-        params_volume_mount = client.V1VolumeMount(
-            mount_path="/workflow-params",
-            name="volume-params",
-        )
+        Setting a job attribute invalidates them, this is needed after
+        modifying an attribute in place (e.g. job.params["key"] = value).
+        """
+        self.__dict__.update(_documents=None, _manifest=None, _k8s_job=None)
+        if cwl:
+            self.__dict__["_cwl_content"] = None
+
+    def __setattr__(self, name, value):
+
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self.invalidate(cwl=name == "cwl")
+
+    def _build_manifest(self) -> Dict:
+
+        # the CWL workflow, the parameters, the pod environment variables and
+        # the pod node selector from the config maps
+        volumes, volume_mounts = self._get_document_volumes()
 
         # the RWX volume for Calrissian from volume claim
-        calrissian_wdir_volume = client.V1Volume(
-            name=self.volume_calrissian_wdir,
-            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
-                claim_name=self.runtime_context.calrissian_wdir,
-                read_only=False,
-            ),
+        volumes.append(
+            {
+                "name": self.volume_calrissian_wdir,
+                "persistentVolumeClaim": {
+                    "claimName": self.runtime_context.calrissian_wdir,
+                    "readOnly": False,
+                },
+            }
         )
-        calrissian_wdir_volume_mount = client.V1VolumeMount(
-            mount_path=self.calrissian_base_path,
-            name=self.volume_calrissian_wdir,
-            read_only=False,
+        volume_mounts.append(
+            {
+                "mountPath": self.calrissian_base_path,
+                "name": self.volume_calrissian_wdir,
+                "readOnly": False,
+            }
         )
 
-        volumes = [workflow_volume, params_volume, calrissian_wdir_volume]
-        volume_mounts = [
-            workflow_volume_mount,
-            params_volume_mount,
-            calrissian_wdir_volume_mount,
-        ]
-
-        if self.pod_env_vars:
-            pod_env_vars_volume = client.V1Volume(
-                name="volume-pod-env-vars",
-                config_map=client.V1ConfigMapVolumeSource(
-                    name="pod-env-vars",
-                    optional=False,
-                    items=[
-                        client.V1KeyToPath(
-                            key="pod-env-vars", path="pod_env_vars.json", mode=0o644
-                        )
-                    ],
-                    default_mode=0o644,
-                ),
-            )
-            pod_env_vars_volume_mount = client.V1VolumeMount(
-                mount_path="/pod-env-vars",
-                name="volume-pod-env-vars",
-            )
-
-            volumes.append(pod_env_vars_volume)
+        return {
+            "apiVersion": "batch/v1",
+            "kind": "Job",
+            "metadata": {
+                "labels": {"job_name": self.job_name, **self.labels},
+                "name": self.job_name,
+                "namespace": self.runtime_context.namespace,
+            },
+            "spec": {
+                "backoffLimit": self.backoff_limit,
+                "template": {
+                    "metadata": (
+                        {
+                            "labels": {
+                                **_POD_TEMPLATE_METADATA["labels"],
+                                **self.labels,
+                            },
+                            "name": _POD_TEMPLATE_METADATA["name"],
+                        }
+                        if self.labels
+                        else _POD_TEMPLATE_METADATA
+                    ),
+                    "spec": {
+                        "containers": [
+                            self._get_calrissian_container(volume_mounts=volume_mounts)
+                        ],
+                        "initContainers": [
+                            self._get_working_directory_container(
+                                volume_mounts=volume_mounts
+                            )
+                        ],
+                        "restartPolicy": "Never",
+                        "securityContext": {
+                            "fsGroup": self.security_context["fsGroup"],
+                            "runAsGroup": self.security_context["runAsGroup"],
+                            "runAsUser": self.security_context["runAsUser"],
+                        },
+                        "terminationGracePeriodSeconds": 120,
+                        "volumes": volumes,
+                    },
+                },
+            },
+        }
 
-            volume_mounts.append(pod_env_vars_volume_mount)
+    @staticmethod
+    def _get_mounted_file(document: Dict) -> str:
+
+        if document["encoding"] == "gzip":
+            return f"{document['file']}.gz"
+        return document["file"]
+
+    def _get_document_volumes(self):
+        """Returns the volumes and volume mounts of the job documents, a
+        projected volume in bundled mode and one volume per config map otherwise"""
+        documents = [
+            document
+            for document in self._get_documents()
+            if document["encoding"] != "staged"
+        ]
 
-        if self.pod_node_selector:
-            pod_node_selector_volume = client.V1Volume(
-                name="volume-pod-node-selector",
-                config_map=client.V1ConfigMapVolumeSource(
-                    name="pod-node-selector",
-                    optional=False,
-                    items=[
-                        client.V1KeyToPath(
-                            key="pod-node-selector",
-                            path="pod_nodeselectors.yml",
-                            mode=0o644,
-                        )
+        if not documents:
+            return [], []
+
+        if self.bundle_config_maps:
+            sources = {}
+            for document in documents:
+                sources.setdefault(document["config_map"], []).append(
+                    {
+                        "key": document["key"],
+                        "mode": 0o644,
+                        "path": self._get_mounted_file(document),
+                    }
+                )
+            volume = {
+                "name": "volume-job-inputs",
+                "projected": {
+                    "defaultMode": 0o644,
+                    "sources": [
+                        {"configMap": {"items": items, "name": name, "optional": False}}
+                        for name, items in sources.items()
                     ],
-                    default_mode=0o644,
-                ),
+                },
+            }
+            volume_mount = {"mountPath": self.inputs_path, "name": "volume-job-inputs"}
+            return [volume], [volume_mount]
+
+        volumes, volume_mounts = [], []
+        for document in documents:
+            volumes.append(
+                {
+                    "configMap": {
+                        "defaultMode": 0o644,
+                        "items": [
+                            {
+                                "key": document["key"],
+                                "mode": 0o644,
+                                "path": self._get_mounted_file(document),
+                            }
+                        ],
+                        "name": document["config_map"],
+                        "optional": False,
+                    },
+                    "name": f"volume-{document['key']}",
+                }
             )
-            pod_node_selector_volume_mount = client.V1VolumeMount(
-                mount_path="/pod-node-selector",
-                name="volume-pod-node-selector",
+            volume_mounts.append(
+                {
+                    "mountPath": document["mount_path"],
+                    "name": f"volume-{document['key']}",
+                }
             )
-
-            volumes.append(pod_node_selector_volume)
-
-            volume_mounts.append(pod_node_selector_volume_mount)
-
-        pod_spec = self.create_pod_template(
-            name="calrissian_pod",
-            containers=[
-                self._get_calrissian_container(volume_mounts=volume_mounts),
-            ],
-            volumes=volumes,
-            security_context=self.security_context,
-        )
-
-        return self.create_job(
-            name=self.job_name,
-            pod_template=pod_spec,
-            namespace=self.runtime_context.namespace,
-            backoff_limit=self.backoff_limit,
-        )
+        return volumes, volume_mounts
 
     @staticmethod
     def create_container(
@@ -293,13 +589,19 @@ class CalrissianJob:
 
     @staticmethod
     def create_pod_template(
-        name, containers, volumes, security_context, node_selector=None
+        name,
+        containers,
+        volumes,
+        security_context,
+        node_selector=None,
+        init_containers=None,
     ):
         """Creates the pod template with the three containers"""
 
         pod_template = client.V1PodTemplateSpec(
             spec=client.V1PodSpec(
                 restart_policy="Never",
+                init_containers=init_containers,
                 containers=containers,
                 volumes=volumes,
                 node_selector=node_selector,
@@ -337,36 +639,29 @@ class CalrissianJob:
 
         args = []
 
-        args.extend(
-            ["--stdout", os.path.join(self.calrissian_base_path, "output.json")]
-        )
+        args.extend(["--stdout", os.path.join(self.calrissian_job_path, "output.json")])
 
-        args.extend(["--stderr", os.path.join(self.calrissian_base_path, "stderr.log")])
+        args.extend(["--stderr", os.path.join(self.calrissian_job_path, "stderr.log")])
 
         args.extend(
-            ["--usage-report", os.path.join(self.calrissian_base_path, "report.json")]
+            ["--usage-report", os.path.join(self.calrissian_job_path, "report.json")]
         )
 
         args.extend(
             ["--max-ram", f"{self.max_ram}", "--max-cores", f"{self.max_cores}"]
         )
 
-        args.extend(["--tmp-outdir-prefix", f"{self.calrissian_base_path}/"])
+        args.extend(["--tmp-outdir-prefix", f"{self.calrissian_job_path}/"])
 
-        args.extend(["--outdir", f"{self.calrissian_base_path}/"])
+        args.extend(["--outdir", f"{self.calrissian_job_path}/"])
 
         if self.pod_node_selector:
             args.extend(
-                [
-                    "--pod-nodeselectors",
-                    os.path.join("/pod-node-selector", "pod_nodeselectors.yml"),
-                ]
+                ["--pod-nodeselectors", self._get_document_path("pod-node-selector")]
             )
 
         if self.pod_env_vars:
-            args.extend(
-                ["--pod-env-vars", os.path.join("/pod-env-vars", "pod_env_vars.json")]
-            )
+            args.extend(["--pod-env-vars", self._get_document_path("pod-env-vars")])
 
         if self.debug:
             args.append("--debug")
@@ -375,60 +670,80 @@ class CalrissianJob:
             args.append("--no-read-only")
 
         if self.tool_logs:
-            args.extend(["--tool-logs-basepath", self.calrissian_base_path])
+            args.extend(["--tool-logs-basepath", self.calrissian_job_path])
 
         args.extend(["--enable-ext"])
 
+        workflow_path = self._get_document_path("cwl-workflow")
         if self.cwl_entry_point is not None:
-            args.extend(
-                [
-                    f"/workflow-input/workflow.cwl#{self.cwl_entry_point}",
-                    "/workflow-params/params.yml",
-                ]
-            )
-        else:
-            args.extend(["/workflow-input/workflow.cwl", "/workflow-params/params.yml"])
+            workflow_path = f"{workflow_path}#{self.cwl_entry_point}"
+
+        args.extend([workflow_path, self._get_document_path("params")])
 
         return args
 
-    def _get_calrissian_container(self, volume_mounts: List) -> V1Container:
+    def _get_working_directory_container(self, volume_mounts: List) -> Dict:
+        """Creates the init container creating the job working directory and
+        decompressing the gzipped and staged documents"""
+        args = [self.calrissian_inputs_path]
+        for document in self._get_documents():
+            if document["encoding"] == "gzip":
+                source = os.path.join(
+                    document["mount_path"], self._get_mounted_file(document)
+                )
+            elif document["encoding"] == "staged":
+                source = self._get_staged_path(document)
+            else:
+                continue
+            args.extend([source, self._get_document_path(document["key"])])
+
+        return {
+            "args": args,
+            "command": _DECOMPRESS_COMMAND,
+            "image": self._get_calrissian_image(),
+            "name": ContainerNames.WORKING_DIRECTORY.value,
+            "resources": _WORKING_DIRECTORY_RESOURCES,
+            "volumeMounts": volume_mounts,
+        }
+
+    def get_resources(self) -> Dict:
+        """Returns the requests and limits of the calrissian container"""
+        return self.resources or _CALRISSIAN_RESOURCES
+
+    @staticmethod
+    def get_init_resources() -> Dict:
+        """Returns the requests and limits of the working directory init container"""
+        return _WORKING_DIRECTORY_RESOURCES
+
+    @staticmethod
+    def _get_calrissian_image() -> str:
+
+        return os.getenv("CALRISSIAN_IMAGE", default="terradue/calrissian:0.12.0")
+
+    def _get_calrissian_container(self, volume_mounts: List) -> Dict:
         """Creates the Calrissian container definition"""
         # set the env var using the metadata
-        env_vars = []
-        calrissian_pod_name_env_var = client.V1EnvVar(
-            name="CALRISSIAN_POD_NAME",
-            value_from=client.V1EnvVarSource(
-                field_ref=client.V1ObjectFieldSelector(field_path="metadata.name")
-            ),
-        )
-
-        env_vars.append(calrissian_pod_name_env_var)
+        env_vars = [_POD_NAME_ENV_VAR]
 
         if self.keep_pods:
-            calrissian_delete_pod_env_var = client.V1EnvVar(
-                name="CALRISSIAN_DELETE_PODS",
-                value="false",
-            )
-
-            env_vars.append(calrissian_delete_pod_env_var)
+            env_vars.append(_KEEP_PODS_ENV_VAR)
             logger.info("pods created by calrissian will not be deleted")
 
-        calrissian_image = os.getenv(
-            "CALRISSIAN_IMAGE", default="terradue/calrissian:0.12.0"
-        )
+        calrissian_image = self._get_calrissian_image()
 
         logger.info(f"using Calrissian image: {calrissian_image}")
 
-        container = self.create_container(
-            name=ContainerNames.CALRISSIAN.value,
-            image=calrissian_image,
-            command=["calrissian"],
-            args=self._get_calrissian_args(),
-            env=env_vars,
-            volume_mounts=volume_mounts,
-        )
-
-        return container
+        return {
+            "args": self._get_calrissian_args(),
+            "command": _CALRISSIAN_COMMAND,
+            "env": env_vars,
+            "image": calrissian_image,
+            "imagePullPolicy": "Always",
+            "lifecycle": _CALRISSIAN_LIFECYCLE,
+            "name": ContainerNames.CALRISSIAN.value,
+            "resources": self.get_resources(),
+            "volumeMounts": volume_mounts,
+        }
 
     @staticmethod
     def shorten_namespace(value: str) -> str:
@@ -0,0 +1,342 @@
+"""
+Supervision of many executions from shared watches: one watch on the jobs and
+one on the pods per namespace, or for the whole cluster, instead of a
+monitor() loop per execution
+"""
+
+import queue
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from pycalrissian.context import CalrissianContext
+from pycalrissian.execution import CalrissianExecution, is_pod_waiting, submit_many
+from pycalrissian.raw import RawWatch, call_raw
+
+# label of the jobs (and their pods) followed by a manager
+MANAGER_LABEL = "pycalrissian/manager"
+
+# the list (and watch) method of the kinds watched, namespaced or for all the
+# namespaces
+_LIST_METHODS = {
+    ("jobs", False): lambda context: context.batch_v1_api.list_namespaced_job,
+    ("jobs", True): lambda context: context.batch_v1_api.list_job_for_all_namespaces,
+    ("pods", False): lambda context: context.core_v1_api.list_namespaced_pod,
+    ("pods", True): lambda context: context.core_v1_api.list_pod_for_all_namespaces,
+}
+
+
+class ExecutionManager:
+    """Follows the registered executions with a watch on the jobs and one on
+    the pods per namespace (or for the cluster), the API load does not grow
+    with the number of executions"""
+
+    def __init__(
+        self,
+        all_namespaces: bool = False,
+        interval: float = 5,
+        grace_period: float = 120,
+        wall_time: Optional[float] = None,
+        watch_timeout: int = 300,
+        error_interval: float = 5,
+    ):
+        """Creates an ExecutionManager object
+
+        Args:
+            all_namespaces (bool): one pair of watches for the cluster instead
+                of one per namespace, needs a cluster role to list and watch
+                the jobs and pods
+            interval (float): seconds between two checks of the grace period
+                and wall time
+            grace_period (float): seconds after the job start before killing
+                it if a pod waits with ImagePullBackOff
+            wall_time (float): seconds after the job start before killing it
+            watch_timeout (int): server side timeout of each watch in seconds
+            error_interval (float): delay in seconds before re-listing after
+                an error
+
+        Returns:
+            None: none
+        """
+        self.all_namespaces = all_namespaces
+        self.interval = interval
+        self.grace_period = grace_period
+        self.wall_time = wall_time
+        self.watch_timeout = watch_timeout
+        self.error_interval = error_interval
+
+        # the value of the manager label
+        self.id = uuid.uuid4().hex[:12]
+
+        self._lock = threading.Lock()
+        # (namespace, job name) -> execution
+        self._executions: Dict[Tuple[str, str], CalrissianExecution] = {}
+        self._pending = set()
+        self._completed = queue.Queue()
+        # (namespace, job name) -> time the job was first seen
+        self._started: Dict[Tuple[str, str], float] = {}
+        # (namespace, pod name) -> job name of the pods waiting with
+        # ImagePullBackOff, None for the tool pods
+        self._waiting: Dict[Tuple[str, str], Optional[str]] = {}
+
+        self._stopped = threading.Event()
+        self._watched = set()
+        self._watches: List[watch.Watch] = []
+        self._threads: List[threading.Thread] = []
+
+    def register(self, execution: CalrissianExecution) -> CalrissianExecution:
+        """Labels the job of an execution, before its submission, and follows it"""
+        if execution.record is not None:
+            raise ValueError(f"job {execution.job.job_name} is already submitted")
+
+        execution.job.labels = {**execution.job.labels, MANAGER_LABEL: self.id}
+
+        namespace = execution.runtime_context.namespace
+        with self._lock:
+            key = (namespace, execution.job.job_name)
+            self._executions[key] = execution
+            self._pending.add(key)
+
+        self._start(execution.runtime_context)
+
+        return execution
+
+    def submit(self, executions: List[CalrissianExecution], max_workers: int = 8):
+        """Registers and submits executions concurrently
+
+        Returns:
+            List: None for the submitted executions, or the exceptions raised
+        """
+        for execution in executions:
+            self.register(execution)
+
+        errors = submit_many(executions, max_workers=max_workers)
+
+        for execution, error in zip(executions, errors):
+            if error is not None:
+                logger.error(f"job {execution.job.job_name} not submitted: {error}")
+                with self._lock:
+                    key = (execution.runtime_context.namespace, execution.job.job_name)
+                    self._executions.pop(key, None)
+                    self._pending.discard(key)
+
+        return errors
+
+    def as_completed(self, timeout: float = None) -> Iterator[CalrissianExecution]:
+        """Yields the executions as they complete, until all the registered
+        executions are complete
+
+        Raises:
+            TimeoutError: if they are not complete after timeout seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                if not self._pending and self._completed.empty():
+                    return
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("executions not completed in time")
+
+            try:
+                execution = self._completed.get(timeout=remaining)
+            except queue.Empty:
+                continue
+
+            execution._finish()
+            yield execution
+
+    def wait_all(self, timeout: float = None) -> List[CalrissianExecution]:
+        """Waits for all the registered executions and returns them in their
+        completion order"""
+        return list(self.as_completed(timeout=timeout))
+
+    def stop(self):
+        """Stops the watches, the executions are no longer followed"""
+        with self._lock:
+            self._stopped.set()
+            self._threads = []
+            self._watched = set()
+        for object_watch in list(self._watches):
+            object_watch.stop()
+
+    def _start(self, context: CalrissianContext):
+        """Starts the watches of the context namespace, and the supervision,
+        if not started yet"""
+        namespace = None if self.all_namespaces else context.namespace
+
+        with self._lock:
+            if namespace in self._watched:
+                return
+            first = not self._watched
+            self._watched.add(namespace)
+            if self._stopped.is_set():
+                # restarted: the threads of the stopped watches may still
+                # be streaming, they keep the set event and drop their events
+                self._stopped = threading.Event()
+            stopped = self._stopped
+
+        targets = [
+            (self._run, ("jobs", context, namespace, stopped), f"jobs-{namespace}"),
+            (self._run, ("pods", context, namespace, stopped), f"pods-{namespace}"),
+        ]
+        if first:
+            targets.append((self._supervise, (stopped,), "supervisor"))
+
+        for target, args, name in targets:
+            thread = threading.Thread(
+                target=target,
+                args=args,
+                name=f"manager-{self.id}-{name}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _list_kwargs(self, kind: str, namespace: Optional[str]) -> Dict:
+
+        kwargs = {}
+        if namespace is not None:
+            kwargs["namespace"] = namespace
+        # the tool pods are created by calrissian without the manager label,
+        # they are only seen by a namespaced watch
+        if kind == "jobs" or namespace is None:
+            kwargs["label_selector"] = f"{MANAGER_LABEL}={self.id}"
+        return kwargs
+
+    def _run(
+        self,
+        kind: str,
+        context: CalrissianContext,
+        namespace: Optional[str],
+        stopped: threading.Event,
+    ):
+
+        list_method = _LIST_METHODS[(kind, namespace is None)](context)
+        dispatch = self._dispatch_job if kind == "jobs" else self._dispatch_pod
+        kwargs = self._list_kwargs(kind, namespace)
+        resource_version = None
+
+        while not stopped.is_set():
+            try:
+                if resource_version is None:
+                    response = call_raw(list_method, **kwargs)
+                    for item in response["items"]:
+                        dispatch("ADDED", item)
+                    resource_version = response["metadata"]["resourceVersion"]
+
+                object_watch = RawWatch()
+                self._watches.append(object_watch)
+                try:
+                    for event in object_watch.stream(
+                        list_method,
+                        resource_version=resource_version,
+                        timeout_seconds=self.watch_timeout,
+                        **kwargs,
+                    ):
+                        if stopped.is_set():
+                            break
+                        dispatch(event["type"], event["object"])
+                        resource_version = object_watch.resource_version
+                finally:
+                    self._watches.remove(object_watch)
+
+            except ApiException as exc:
+                resource_version = None
+                if exc.status == HTTPStatus.GONE:
+                    # the resourceVersion is too old, list again
+                    continue
+                logger.warning(f"watch on {kind} failed: {exc.reason}")
+                stopped.wait(self.error_interval)
+            except Exception as exc:
+                resource_version = None
+                logger.warning(f"watch on {kind} failed: {exc}")
+                stopped.wait(self.error_interval)
+
+    def _dispatch_job(self, event_type: str, job: Dict):
+
+        key = (job["metadata"]["namespace"], job["metadata"]["name"])
+        with self._lock:
+            execution = self._executions.get(key)
+            if execution is None or key not in self._pending:
+                return
+            self._started.setdefault(key, time.monotonic())
+
+        if event_type == "DELETED":
+            logger.warning(f"job {key[1]} was deleted")
+            execution.killed = True
+        else:
+            execution._update_status(job)
+
+        if execution.killed or execution.is_finished():
+            self._complete(key)
+
+    def _dispatch_pod(self, event_type: str, pod: Dict):
+
+        key = (pod["metadata"]["namespace"], pod["metadata"]["name"])
+        with self._lock:
+            if event_type != "DELETED" and is_pod_waiting(pod):
+                self._waiting[key] = (pod["metadata"].get("labels") or {}).get(
+                    "job-name"
+                )
+            else:
+                self._waiting.pop(key, None)
+
+    def _complete(self, key: Tuple[str, str]):
+
+        with self._lock:
+            if key not in self._pending:
+                return
+            self._pending.discard(key)
+            self._started.pop(key, None)
+            self._completed.put(self._executions.pop(key))
+
+    def _is_waiting(self, key: Tuple[str, str]) -> bool:
+        """Returns True if a pod of the job waits with ImagePullBackOff, the
+        tool pods count for all the jobs of their namespace"""
+        namespace, job_name = key
+        with self._lock:
+            return any(
+                pod_namespace == namespace and pod_job_name in [job_name, None]
+                for (pod_namespace, _), pod_job_name in self._waiting.items()
+            )
+
+    def _supervise(self, stopped: threading.Event):
+        """Kills the jobs past their wall time or grace period"""
+        while not stopped.wait(self.interval):
+
+            now = time.monotonic()
+            with self._lock:
+                started = list(self._started.items())
+
+            for key, start in started:
+                if self.wall_time is not None and now - start > self.wall_time:
+                    logger.warning(
+                        f"reached wall time for execution, killing job {key[1]}"
+                    )
+                elif now - start > self.grace_period and self._is_waiting(key):
+                    logger.warning(
+                        "found pods in waiting status with reason ImagePullBackOff, "
+                        f"killing job {key[1]}"
+                    )
+                else:
+                    continue
+
+                with self._lock:
+                    execution = self._executions.get(key)
+                if execution is None:
+                    continue
+                try:
+                    execution._kill()
+                except ApiException as exc:
+                    logger.error(f"job {key[1]} not killed: {exc.reason}")
+                    continue
+                self._complete(key)
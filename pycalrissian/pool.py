@@ -0,0 +1,328 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List
+
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from pycalrissian.context import CalrissianContext, dispose_many
+from pycalrissian.utils import HelperPod
+
+
+class NamespacePool:
+    """Keeps a pool of initialised namespaces leased to the callers and recycled
+    after use"""
+
+    def __init__(
+        self,
+        namespace_prefix: str,
+        storage_class: str,
+        volume_size: str,
+        size: int = 2,
+        max_idle_time: int = 3600,
+        refill_workers: int = 2,
+        maintenance_interval: int = 30,
+        helper_pod_timeout: int = 300,
+        **context_kwargs,
+    ):
+        """Creates a NamespacePool object
+
+        Args:
+            namespace_prefix (str): prefix of the namespaces names
+            storage_class (str): name of the storage class for the RWX persistent volume claim    # noqa: E501
+            volume_size (str): size for the RWX volume (e.g. 10G)
+            size (int): number of initialised namespaces kept idle
+            max_idle_time (int): seconds after which an idle namespace is disposed and replaced # noqa: E501
+            refill_workers (int): number of namespaces initialised concurrently
+            maintenance_interval (int): seconds between two refills of the pool
+            helper_pod_timeout (int): seconds to wait for the pod cleaning the working directory to start # noqa: E501
+            context_kwargs: other CalrissianContext arguments (e.g. resource_quota, image_pull_secrets) # noqa: E501
+
+        Returns:
+            None: none
+        """
+        self.namespace_prefix = namespace_prefix
+        self.storage_class = storage_class
+        self.volume_size = volume_size
+        self.size = size
+        self.max_idle_time = max_idle_time
+        self.refill_workers = refill_workers
+        self.maintenance_interval = maintenance_interval
+        self.helper_pod_timeout = helper_pod_timeout
+        self.context_kwargs = context_kwargs
+
+        # idle contexts with the time they became idle
+        self._idle = deque()
+        self._leased = set()
+        self._provisioning = 0
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=refill_workers)
+        self._maintenance = None
+
+        self.hits = 0
+        self.misses = 0
+        self.lease_wait_times: List[float] = []
+
+    def start(self, wait: bool = False, timeout: float = None):
+        """Fills the pool and starts the maintenance thread
+
+        Args:
+            wait (bool): block until the pool is full
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            None
+        """
+        self._check_open()
+        self.refill()
+        self._maintenance = threading.Thread(
+            target=self._maintain, name="namespace-pool-maintenance", daemon=True
+        )
+        self._maintenance.start()
+
+        if wait:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._idle) >= self.size, timeout=timeout
+                )
+
+    def lease(self, timeout: float = None) -> CalrissianContext:
+        """Leases an initialised context
+
+        Args:
+            timeout (float): maximum time to wait for a context in seconds
+
+        Returns:
+            CalrissianContext: an initialised context
+
+        Raises:
+            RuntimeError: if the pool is closed
+            TimeoutError: if no context is available in time
+        """
+        self._check_open()
+        start = time.perf_counter()
+
+        with self._condition:
+            if self._idle:
+                self.hits += 1
+            else:
+                self.misses += 1
+                logger.info("no idle namespace in the pool, waiting for one")
+                self.refill(minimum=1)
+                if not self._condition.wait_for(
+                    lambda: self._idle or self._closed.is_set(), timeout=timeout
+                ):
+                    raise TimeoutError("no namespace available in the pool")
+                # closed while waiting
+                self._check_open()
+
+            context, _ = self._idle.popleft()
+            self._leased.add(context.namespace)
+
+        self.lease_wait_times.append(time.perf_counter() - start)
+        logger.info(f"namespace {context.namespace} leased")
+
+        # the leased context is returned even if the pool was closed meanwhile
+        if not self._closed.is_set():
+            self.refill()
+
+        return context
+
+    def release(self, context: CalrissianContext):
+        """Gives back a leased context, its pods, jobs, config maps and working
+        directory are deleted before it goes back to the pool
+
+        Args:
+            context (CalrissianContext): the leased context
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self._leased.discard(context.namespace)
+
+        if self._closed.is_set():
+            context.dispose()
+            return
+        try:
+            self._executor.submit(self._recycle, context)
+        except RuntimeError:
+            # the pool was closed meanwhile
+            context.dispose()
+
+    @contextmanager
+    def leased(self, timeout: float = None):
+        """Leases a context for the duration of a with block"""
+        context = self.lease(timeout=timeout)
+        try:
+            yield context
+        finally:
+            self.release(context)
+
+    def refill(self, minimum: int = 0):
+        """Provisions new namespaces until the pool size is reached
+
+        Args:
+            minimum (int): number of namespaces to provision if the pool is full
+
+        Returns:
+            None
+
+        Raises:
+            RuntimeError: if the pool is closed
+        """
+        self._check_open()
+
+        with self._condition:
+            missing = max(self.size, minimum) - len(self._idle) - self._provisioning
+            missing = max(0, missing)
+            self._provisioning += missing
+
+        for submitted in range(missing):
+            try:
+                self._executor.submit(self._provision)
+            except RuntimeError:
+                # closed meanwhile, the remaining namespaces are not provisioned
+                with self._condition:
+                    self._provisioning -= missing - submitted
+                raise
+
+    def close(self):
+        """Disposes the idle namespaces, leased ones are left to their callers"""
+        with self._condition:
+            self._closed.set()
+            # the callers waiting in lease() give up
+            self._condition.notify_all()
+        self._executor.shutdown(wait=True)
+
+        with self._condition:
+            idle = [context for context, _ in self._idle]
+            self._idle.clear()
+
+        for context, response in zip(idle, dispose_many(idle)):
+            if isinstance(response, ApiException):
+                logger.error(f"namespace {context.namespace} not disposed: {response}")
+
+    def get_metrics(self) -> Dict:
+        """Returns the pool hit/miss counters and lease wait times"""
+        leases = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / leases if leases else None,
+            "lease_wait_time_avg": (
+                sum(self.lease_wait_times) / len(self.lease_wait_times)
+                if self.lease_wait_times
+                else None
+            ),
+            "lease_wait_time_max": max(self.lease_wait_times, default=None),
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "provisioning": self._provisioning,
+        }
+
+    def _check_open(self):
+
+        if self._closed.is_set():
+            raise RuntimeError("the namespace pool is closed")
+
+    def _new_context(self) -> CalrissianContext:
+
+        return CalrissianContext(
+            namespace=f"{self.namespace_prefix}-{uuid.uuid4().hex[:8]}",
+            storage_class=self.storage_class,
+            volume_size=self.volume_size,
+            **self.context_kwargs,
+        )
+
+    def _provision(self):
+
+        context = None
+        try:
+            context = self._new_context()
+            context.initialise()
+            # mounting the volume once binds the claim
+            self._clean_working_directory(context)
+            self._add_idle(context)
+        except Exception as e:
+            logger.error(f"namespace provisioning failed: {e}")
+            if context is not None:
+                context.dispose()
+        finally:
+            with self._condition:
+                self._provisioning -= 1
+
+    def _recycle(self, context: CalrissianContext):
+
+        try:
+            logger.info(f"recycle namespace {context.namespace}")
+            context.delete_workloads()
+            self._clean_working_directory(context)
+            self._add_idle(context)
+        except Exception as e:
+            logger.error(f"namespace {context.namespace} not recycled, disposing: {e}")
+            context.dispose()
+
+    def _clean_working_directory(self, context: CalrissianContext):
+
+        mount_path = "/calrissian"
+        helper_pod = HelperPod(
+            context=context,
+            volume={
+                "name": "volume-calrissian-wdir",
+                "persistentVolumeClaim": {"claimName": context.calrissian_wdir},
+            },
+            volume_mount={"name": "volume-calrissian-wdir", "mountPath": mount_path},
+            timeout=self.helper_pod_timeout,
+        )
+        try:
+            helper_pod.exec(
+                ["find", mount_path, "-mindepth", "1", "-delete"],
+            )
+        finally:
+            helper_pod.dismiss()
+
+    def _add_idle(self, context: CalrissianContext):
+
+        with self._condition:
+            if self._closed.is_set():
+                idle = False
+            else:
+                self._idle.append((context, time.monotonic()))
+                self._condition.notify()
+                idle = True
+
+        if not idle:
+            context.dispose()
+        else:
+            logger.info(f"namespace {context.namespace} ready in the pool")
+
+    def _maintain(self):
+
+        while not self._closed.wait(self.maintenance_interval):
+            expired = []
+            with self._condition:
+                if self._closed.is_set():
+                    break
+                now = time.monotonic()
+                while self._idle and now - self._idle[0][1] > self.max_idle_time:
+                    expired.append(self._idle.popleft()[0])
+
+            for context in expired:
+                logger.info(f"namespace {context.namespace} idle for too long")
+                try:
+                    self._executor.submit(context.dispose)
+                except RuntimeError:
+                    # the pool was closed meanwhile, close() does not know it
+                    context.dispose()
+
+            try:
+                self.refill()
+            except RuntimeError:
+                # the pool was closed meanwhile
+                break
@@ -0,0 +1,48 @@
+"""
+Calls of the kubernetes API returning the objects as parsed JSON (dictionaries
+with the API field names) instead of the OpenAPI models, the responses are
+parsed with orjson when it is installed
+"""
+
+import json
+from typing import Dict
+
+from kubernetes import watch
+
+try:
+    from orjson import loads
+except ImportError:  # pragma: no cover
+    loads = json.loads
+
+
+def call_raw(method, *args, **kwargs) -> Dict:
+    """Calls an API method and returns the parsed JSON response
+
+    Args:
+        method: the API method, e.g. core_v1_api.list_namespaced_pod
+        args: the method arguments
+        kwargs: the method keyword arguments
+
+    Returns:
+        Dict: the response object
+    """
+    return loads(method(*args, _preload_content=False, **kwargs).data)
+
+
+def release(response):
+    """Reads and discards the response of a call made with
+    _preload_content=False, its connection goes back to the pool"""
+    response.data
+
+
+class RawWatch(watch.Watch):
+    """Watch whose events hold the objects as parsed JSON, the object and
+    raw_object of an event are the same dictionary"""
+
+    def unmarshal_event(self, data, return_type):
+
+        event = loads(data)
+        event["raw_object"] = event["object"]
+        if event["type"] != "ERROR":
+            self.resource_version = event["object"]["metadata"].get("resourceVersion")
+        return event
@@ -0,0 +1,259 @@
+"""
+Data-parallel execution of a CWL workflow scattering over an array input: the
+array is split in shards, each shard runs as its own calrissian job and the
+shards outputs are merged into one CWL output object
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from pycalrissian.array import CalrissianJobArray
+from pycalrissian.context import CalrissianContext
+
+
+def _get_id(value: str) -> str:
+    """Returns the short id of a CWL identifier, e.g. #main/input is input"""
+    return value.lstrip("#").split("/")[-1]
+
+
+def _as_list(value, shorthand: str = "type") -> List[Dict]:
+    """Returns the items of a CWL map or list field, a map value that is not
+    a dictionary is the shorthand field (e.g. the type of an input)"""
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return [
+            {"id": name, **(item if isinstance(item, dict) else {shorthand: item})}
+            for name, item in value.items()
+        ]
+    return list(value)
+
+
+def _get_workflow(cwl: Dict, cwl_entry_point: str = None) -> Optional[Dict]:
+
+    for process in cwl.get("$graph", [cwl]):
+        if process.get("class") != "Workflow":
+            continue
+        if cwl_entry_point is None or _get_id(process.get("id", "")) == _get_id(
+            cwl_entry_point
+        ):
+            return process
+    return None
+
+
+def _get_scatters(cwl: Dict, cwl_entry_point: str = None) -> List[Tuple[str, List]]:
+    """Returns the scatter method and the scattered workflow inputs of the
+    workflow steps"""
+    workflow = _get_workflow(cwl, cwl_entry_point)
+    if workflow is None:
+        return []
+
+    workflow_inputs = [_get_id(item["id"]) for item in _as_list(workflow.get("inputs"))]
+
+    scatters = []
+    for step in _as_list(workflow.get("steps")):
+        scatter = step.get("scatter") or []
+        if isinstance(scatter, str):
+            scatter = [scatter]
+        scatter = [_get_id(name) for name in scatter]
+
+        inputs = []
+        for step_input in _as_list(step.get("in"), shorthand="source"):
+            if _get_id(step_input["id"]) not in scatter:
+                continue
+            sources = step_input.get("source")
+            if isinstance(sources, str):
+                sources = [sources]
+            for source in sources or []:
+                source = _get_id(source)
+                if source in workflow_inputs and source not in inputs:
+                    inputs.append(source)
+
+        if inputs:
+            scatters.append((step.get("scatterMethod", "dotproduct"), inputs))
+
+    return scatters
+
+
+def get_scatter_inputs(cwl: Dict, cwl_entry_point: str = None) -> List[str]:
+    """Returns the inputs of the workflow that its steps scatter over
+
+    Args:
+        cwl (Dict): the CWL document
+        cwl_entry_point (str): the id of the workflow in a $graph document
+
+    Returns:
+        List[str]: the workflow input ids
+    """
+    scatter_inputs = []
+    for _, inputs in _get_scatters(cwl, cwl_entry_point):
+        scatter_inputs.extend(name for name in inputs if name not in scatter_inputs)
+
+    return scatter_inputs
+
+
+def get_dotproduct_inputs(
+    cwl: Dict, scatter_input: str, cwl_entry_point: str = None
+) -> List[str]:
+    """Returns the scatter input and the inputs a dotproduct scatter pairs it
+    with, element by element: they must be split with the same slices
+
+    Args:
+        cwl (Dict): the CWL document
+        scatter_input (str): the workflow input id
+        cwl_entry_point (str): the id of the workflow in a $graph document
+
+    Returns:
+        List[str]: the workflow input ids, scatter_input first
+    """
+    dotproduct_inputs = [scatter_input]
+    for method, inputs in _get_scatters(cwl, cwl_entry_point):
+        if method == "dotproduct" and scatter_input in inputs:
+            dotproduct_inputs.extend(
+                name for name in inputs if name not in dotproduct_inputs
+            )
+
+    return dotproduct_inputs
+
+
+def shard_params(
+    params: Dict, scatter_input: Union[str, List[str]], shards: int
+) -> List[Dict]:
+    """Splits the array input of the parameters in contiguous shards
+
+    Args:
+        params (Dict): the workflow parameters
+        scatter_input (Union[str, List[str]]): the array input to split, or the
+            array inputs of a dotproduct scatter, split with the same slices
+        shards (int): the number of shards, fewer if the array is shorter
+
+    Returns:
+        List[Dict]: the parameters of each shard
+    """
+    if shards <= 0:
+        raise ValueError(f"the number of shards must be positive, got {shards}")
+
+    scatter_inputs = (
+        [scatter_input] if isinstance(scatter_input, str) else scatter_input
+    )
+    for name in scatter_inputs:
+        if not isinstance(params[name], list):
+            raise ValueError(f"the input {name} is not an array")
+
+    length = len(params[scatter_inputs[0]])
+    if any(len(params[name]) != length for name in scatter_inputs):
+        raise ValueError(
+            f"the dotproduct inputs {', '.join(scatter_inputs)} differ in length"
+        )
+
+    size, remainder = divmod(length, shards)
+
+    sharded_params, start = [], 0
+    for shard in range(shards):
+        end = start + size + (1 if shard < remainder else 0)
+        if end > start:
+            sharded_params.append(
+                {**params, **{name: params[name][start:end] for name in scatter_inputs}}
+            )
+        start = end
+
+    return sharded_params
+
+
+def merge_outputs(outputs: List[Dict]) -> Dict:
+    """Merges the CWL output objects of the shards, in the shards order
+
+    The array outputs are concatenated, the outputs equal in all the shards
+    are kept once and the other outputs are the list of the shards values.
+    """
+    merged = {}
+
+    keys = []
+    for output in outputs:
+        keys.extend(key for key in output if key not in keys)
+
+    for key in keys:
+        values = [output[key] for output in outputs if key in output]
+        if all(isinstance(value, list) for value in values):
+            merged[key] = [item for value in values for item in value]
+        elif all(value == values[0] for value in values):
+            merged[key] = values[0]
+        else:
+            logger.warning(f"output {key} differs between the shards")
+            merged[key] = values
+
+    return merged
+
+
+class ShardedCalrissianJob(CalrissianJobArray):
+    """Runs a workflow scattering over an array input as several jobs, each
+    processing a shard of the array"""
+
+    def __init__(
+        self,
+        cwl: Dict,
+        params: Dict,
+        runtime_context: CalrissianContext,
+        shards: int,
+        scatter_input: str = None,
+        parallelism: int = None,
+        indexed: bool = True,
+        **job_kwargs,
+    ):
+        """Creates a ShardedCalrissianJob object
+
+        Args:
+            cwl (Dict): the CWL document
+            params (Dict): the workflow parameters
+            runtime_context (CalrissianContext): the initialised context
+            shards (int): the number of jobs
+            scatter_input (str): the array input to split, by default the
+                largest array input the workflow scatters over. The inputs a
+                dotproduct scatter pairs with it are split alongside
+            parallelism (int): maximum number of shards running at the same
+                time, all of them by default
+            indexed (bool): submit an Indexed Job instead of a batch of jobs
+            job_kwargs: other CalrissianJob arguments (e.g. max_cores)
+
+        Returns:
+            None: none
+        """
+        if scatter_input is None:
+            candidates = [
+                name
+                for name in get_scatter_inputs(cwl, job_kwargs.get("cwl_entry_point"))
+                if isinstance(params.get(name), list)
+            ]
+            if not candidates:
+                raise ValueError("the workflow does not scatter over an array input")
+            scatter_input = max(candidates, key=lambda name: len(params[name]))
+            logger.info(f"sharding the {scatter_input} input")
+
+        self.scatter_input = scatter_input
+        self.scatter_inputs = get_dotproduct_inputs(
+            cwl, scatter_input, job_kwargs.get("cwl_entry_point")
+        )
+        self.shards = shards
+        self.sharded_params = shard_params(params, self.scatter_inputs, shards)
+
+        super().__init__(
+            cwl=cwl,
+            params=self.sharded_params,
+            runtime_context=runtime_context,
+            parallelism=parallelism or shards,
+            indexed=indexed,
+            **job_kwargs,
+        )
+
+    def get_merged_output(self) -> Optional[Dict]:
+        """Returns the merged output of the shards, None if a shard failed"""
+        outputs = self.get_outputs()
+
+        # the size of a batch is unknown until all its jobs are submitted
+        missing = len(self.sharded_params) - len(outputs)
+        if missing:
+            logger.error(f"{missing} shard(s) of {self.name} did not succeed")
+            return None
+
+        return merge_outputs([outputs[index] for index in sorted(outputs)])
@@ -0,0 +1,173 @@
+"""
+Sizing of the calrissian jobs from the usage reports of the previous runs of
+the same workflow: the --max-cores/--max-ram of calrissian are the peak
+parallel usage of the tool pods plus some headroom and the calrissian
+container requests and limits grow with the number of tool pods it
+orchestrates
+"""
+
+import json
+import math
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from pycalrissian.job import CalrissianJob
+
+# the usage report fields kept in the history
+REPORT_FIELDS = [
+    "max_parallel_cpus",
+    "max_parallel_ram_megabytes",
+    "max_parallel_tasks",
+    "total_tasks",
+    "elapsed_seconds",
+]
+
+
+class SizingAdvisor:
+    """Keeps the usage reports of the runs by workflow and sizes the next runs"""
+
+    def __init__(
+        self,
+        history_path: str = None,
+        window: int = 10,
+        headroom: float = 1.25,
+        min_cores: int = 1,
+        min_ram_megabytes: int = 1024,
+        max_cores: int = None,
+        max_ram_megabytes: int = None,
+        base_cores: float = 0.25,
+        base_ram_megabytes: int = 512,
+        task_cores: float = 0.05,
+        task_ram_megabytes: int = 32,
+    ):
+        """Creates a SizingAdvisor object
+
+        Args:
+            history_path (str): JSON file persisting the history, in memory
+                only if not set
+            window (int): number of reports kept per workflow
+            headroom (float): factor applied to the peak usage
+            min_cores (int): minimum --max-cores
+            min_ram_megabytes (int): minimum --max-ram in megabytes
+            max_cores (int): maximum --max-cores, e.g. the largest node
+            max_ram_megabytes (int): maximum --max-ram in megabytes
+            base_cores (float): calrissian container CPU request without tools
+            base_ram_megabytes (int): calrissian container memory request
+                without tools
+            task_cores (float): CPU request added per parallel tool pod
+            task_ram_megabytes (int): memory request added per parallel tool pod
+
+        Returns:
+            None: none
+        """
+        self.history_path = history_path
+        self.window = window
+        self.headroom = headroom
+        self.min_cores = min_cores
+        self.min_ram_megabytes = min_ram_megabytes
+        self.max_cores = max_cores
+        self.max_ram_megabytes = max_ram_megabytes
+        self.base_cores = base_cores
+        self.base_ram_megabytes = base_ram_megabytes
+        self.task_cores = task_cores
+        self.task_ram_megabytes = task_ram_megabytes
+
+        self._lock = threading.Lock()
+        # workflow key -> usage reports, oldest first
+        self._history: Dict[str, List[Dict]] = {}
+
+        if history_path is not None and os.path.exists(history_path):
+            with open(history_path, "r") as stream:
+                self._history = json.load(stream)
+
+    @staticmethod
+    def get_key(job: CalrissianJob) -> str:
+        """Returns the history key of a job: its workflow hash and entry point"""
+        if job.cwl_entry_point is None:
+            return job.get_workflow_hash()
+        return f"{job.get_workflow_hash()}#{job.cwl_entry_point}"
+
+    def get_history(self, job: CalrissianJob) -> List[Dict]:
+        """Returns the usage reports recorded for the workflow of a job"""
+        with self._lock:
+            return list(self._history.get(self.get_key(job), []))
+
+    def record(self, job: CalrissianJob, usage_report: Dict):
+        """Adds the usage report of a run of a job to the history"""
+        if not usage_report or "max_parallel_cpus" not in usage_report:
+            logger.warning(f"no usage to record for job {job.job_name}")
+            return
+
+        with self._lock:
+            reports = self._history.setdefault(self.get_key(job), [])
+            reports.append({field: usage_report.get(field) for field in REPORT_FIELDS})
+            del reports[: -self.window]
+            if self.history_path is not None:
+                self._save()
+
+    def _save(self):
+
+        directory = os.path.dirname(os.path.abspath(self.history_path))
+        handle, path = tempfile.mkstemp(dir=directory, suffix=".json")
+        with os.fdopen(handle, "w") as stream:
+            json.dump(self._history, stream)
+        os.replace(path, self.history_path)
+
+    def advise(self, job: CalrissianJob) -> Optional[Dict]:
+        """Returns the max_cores, max_ram and resources for the next run of a job,
+        None if its workflow has no history"""
+        reports = self.get_history(job)
+        if not reports:
+            return None
+
+        peak_cores = max(report["max_parallel_cpus"] or 0 for report in reports)
+        peak_ram = max(report["max_parallel_ram_megabytes"] or 0 for report in reports)
+        peak_tasks = max(report.get("max_parallel_tasks") or 1 for report in reports)
+
+        max_cores = max(self.min_cores, math.ceil(peak_cores * self.headroom))
+        if self.max_cores is not None:
+            max_cores = min(max_cores, self.max_cores)
+        max_ram = max(self.min_ram_megabytes, math.ceil(peak_ram * self.headroom))
+        if self.max_ram_megabytes is not None:
+            max_ram = min(max_ram, self.max_ram_megabytes)
+
+        request_cores = self.base_cores + self.task_cores * peak_tasks
+        request_ram = self.base_ram_megabytes + self.task_ram_megabytes * peak_tasks
+
+        return {
+            "max_cores": str(max_cores),
+            "max_ram": f"{max_ram}M",
+            "resources": {
+                "limits": {
+                    "cpu": f"{math.ceil(2000 * request_cores)}m",
+                    "memory": f"{math.ceil(2 * request_ram)}M",
+                },
+                "requests": {
+                    "cpu": f"{math.ceil(1000 * request_cores)}m",
+                    "memory": f"{math.ceil(request_ram)}M",
+                },
+            },
+        }
+
+    def apply(self, job: CalrissianJob) -> bool:
+        """Sizes a job from the history of its workflow
+
+        Returns:
+            bool: False if the workflow has no history and the job is unchanged
+        """
+        advice = self.advise(job)
+        if advice is None:
+            return False
+
+        logger.info(
+            f"job {job.job_name} sized from history: --max-cores "
+            f"{advice['max_cores']} --max-ram {advice['max_ram']}"
+        )
+        job.max_cores = advice["max_cores"]
+        job.max_ram = advice["max_ram"]
+        job.resources = advice["resources"]
+        return True
@@ -0,0 +1,246 @@
+"""
+Client-side throttling of the kubernetes API calls: a token bucket limiting
+the request rate, a retry policy with exponential backoff, jitter and
+Retry-After handling and a circuit breaker failing fast while the API server
+is unavailable
+"""
+
+import random
+import threading
+import time
+from http import HTTPStatus
+from typing import Optional
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+# verbs whose requests can be sent again without side effects
+IDEMPOTENT_VERBS = ["get", "list", "watch", "delete", "deletecollection", "update"]
+
+
+class CircuitOpenError(ApiException):
+    """Raised instead of calling the API server while the circuit is open"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(
+            status=HTTPStatus.SERVICE_UNAVAILABLE.value,
+            reason=f"circuit open, API calls suspended for {retry_in:.1f}s",
+        )
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Token bucket rate limiter, can be shared by several contexts"""
+
+    def __init__(self, qps: float, burst: int):
+        """Creates a TokenBucket object
+
+        Args:
+            qps (float): sustained number of requests per second
+            burst (int): maximum number of requests sent at once
+
+        Returns:
+            None: none
+        """
+        self.qps = qps
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Takes a token, waiting for one if the bucket is empty
+
+        Args:
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            bool: False if no token was available before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.qps
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.qps
+
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class RetryPolicy:
+    """Decides which failed calls are retried and how long to wait"""
+
+    def __init__(
+        self,
+        max_tries: int = 5,
+        interval: float = 0.5,
+        max_interval: float = 30,
+        retry_statuses=(0, 429, 500, 502, 503, 504),
+        respect_retry_after: bool = True,
+    ):
+        """Creates a RetryPolicy object
+
+        Args:
+            max_tries (int): maximum number of attempts of a call
+            interval (float): base delay in seconds of the exponential backoff
+            max_interval (float): maximum delay in seconds between two attempts
+            retry_statuses (tuple): HTTP status codes retried, 0 stands for
+                a call that got no response
+            respect_retry_after (bool): wait for the delay of the Retry-After
+                header when the API server sends one
+
+        Returns:
+            None: none
+        """
+        self.max_tries = max_tries
+        self.interval = interval
+        self.max_interval = max_interval
+        self.retry_statuses = retry_statuses
+        self.respect_retry_after = respect_retry_after
+
+    def is_retryable(self, exc: Exception, verb: str = None) -> bool:
+        """Returns True if the call failing with exc can be sent again
+
+        A create or patch is only retried when the API server rejected it
+        before processing it (429), the other verbs are idempotent.
+        """
+        status = get_status(exc)
+
+        if status is None or status not in self.retry_statuses:
+            return False
+
+        if verb is not None and verb not in IDEMPOTENT_VERBS:
+            return status == HTTPStatus.TOO_MANY_REQUESTS
+
+        return True
+
+    def get_delay(self, attempt: int, exc: Exception = None) -> float:
+        """Returns the delay in seconds before the next attempt
+
+        Exponential backoff with full jitter, or the Retry-After delay
+        """
+        if self.respect_retry_after and exc is not None:
+            retry_after = get_retry_after(exc)
+            if retry_after is not None:
+                return min(self.max_interval, retry_after)
+        if isinstance(exc, CircuitOpenError):
+            return min(self.max_interval, exc.retry_in)
+
+        return random.uniform(0, min(self.max_interval, self.interval * 2**attempt))
+
+
+def get_status(exc: Exception) -> Optional[int]:
+    """Returns the HTTP status of a failed call, 0 if the API server could not
+    be reached and None for the errors unrelated to the API server"""
+    if isinstance(exc, ApiException):
+        return exc.status or 0
+    if isinstance(exc, (HTTPError, OSError)):
+        return 0
+    return None
+
+
+def get_retry_after(exc: Exception):
+    """Returns the Retry-After delay in seconds of an ApiException or None"""
+    headers = getattr(exc, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Stops calling the API server after consecutive failures
+
+    After failure_threshold consecutive failures (no response or 5xx) the
+    circuit opens and the calls fail with CircuitOpenError for reset_timeout
+    seconds, then a single trial call is let through: the circuit closes if
+    it succeeds and opens again otherwise.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """Creates a CircuitBreaker object
+
+        Args:
+            failure_threshold (int): consecutive failures opening the circuit
+            reset_timeout (float): seconds the circuit stays open
+
+        Returns:
+            None: none
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not be sent"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+            retry_in = max(
+                0.0, self.reset_timeout - (time.monotonic() - self._opened_at)
+            )
+        raise CircuitOpenError(retry_in)
+
+    def record_success(self):
+
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self, exc: Exception):
+        """Counts the failures of the API server, client errors are ignored"""
+        status = get_status(exc)
+        if status is None:
+            with self._lock:
+                self._trial = False
+            return
+        if status and status < 500:
+            self.record_success()
+            return
+
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
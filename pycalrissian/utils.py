@@ -3,19 +3,33 @@ The functions currently only support the copying of file
 from pod and into the pod. Support for copying the entire directory is
 yet to be added
 """
+
+import atexit
+import base64
+import json
 import os
+import shlex
 import subprocess
 import sys
 import tarfile
+import threading
 import time
 import uuid
+from contextlib import contextmanager
+from http import HTTPStatus
 from pathlib import Path
 from tempfile import TemporaryFile
-from typing import Dict
+from typing import Dict, List
 
 from kubernetes.client.rest import ApiException
 from kubernetes.stream import stream
+from loguru import logger
+
 from pycalrissian.context import CalrissianContext
+from pycalrissian.raw import call_raw
+
+# the shared helper pods alive, deleted at exit
+_shared_helper_pods = set()
 
 
 class HelperPod:
@@ -24,10 +38,13 @@ class HelperPod:
         context: CalrissianContext,
         volume: Dict,
         volume_mount: Dict,
+        timeout: float = None,
     ):
         self.context = context
         self.volume = volume
         self.volume_mount = volume_mount
+        # seconds to wait for the pod to leave Pending, forever if None
+        self.timeout = timeout
         self.container_name = "container-kube-cp"
         self.pod_name = f"kube-cp-{self._get_uid()}"
 
@@ -55,10 +72,14 @@ class HelperPod:
                         ],
                         "volumeMounts": [self.volume_mount],
                         "resources": {
+                            "limits": {
+                                "cpu": "100m",
+                                "memory": "100Mi",
+                            },
                             "requests": {
                                 "cpu": "100m",
                                 "memory": "100Mi",
-                            }
+                            },
                         },
                     }
                 ],
@@ -68,6 +89,7 @@ class HelperPod:
             body=pod_manifest,
             namespace=self.context.namespace,
         )
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
         while True:
             resp = self.context.core_v1_api.read_namespaced_pod(
                 name=self.pod_name,
@@ -75,6 +97,12 @@ class HelperPod:
             )
             if resp.status.phase != "Pending":
                 break
+            if deadline is not None and time.monotonic() > deadline:
+                self.dismiss()
+                raise TimeoutError(
+                    f"helper pod {self.pod_name} still pending after "
+                    f"{self.timeout} seconds"
+                )
             time.sleep(1)
 
     def dismiss(self):
@@ -89,6 +117,85 @@ class HelperPod:
                 file=sys.stderr,
             )
 
+    def exec(
+        self,
+        command: List[str],
+        timeout: int = 300,
+        stdin: str = None,
+        chunk_size: int = 65536,
+    ) -> str:
+        """
+        Runs a command in the helper pod and checks its exit status
+
+        :param command: the command and its arguments
+        :param timeout: seconds to wait for the command to complete
+        :param stdin: text written to the command standard input, the
+            websocket exec cannot close it: the command must stop reading
+            on its own
+        :param chunk_size: characters of stdin sent per websocket message
+        :return: the command standard output
+        :raises RuntimeError: if the command fails or does not complete
+        """
+        response = stream(
+            self.context.stream_core_v1_api.connect_get_namespaced_pod_exec,
+            self.pod_name,
+            self.context.namespace,
+            command=command,
+            stderr=True,
+            stdin=stdin is not None,
+            stdout=True,
+            tty=False,
+            _preload_content=False,
+        )
+        try:
+            for start in range(0, len(stdin or ""), chunk_size):
+                end = start + chunk_size
+                response.write_stdin(stdin[start:end])
+            response.run_forever(timeout=timeout)
+            stdout, stderr = response.read_stdout(), response.read_stderr()
+            returncode = response.returncode
+        finally:
+            response.close()
+
+        if returncode != 0:
+            raise RuntimeError(
+                f"{command[0]} failed in helper pod {self.pod_name} "
+                f"(exit status {returncode}): {stderr.strip()}"
+            )
+
+        return stdout
+
+    def write_to_volume(self, content: bytes, dest_path: str, chunk_size=65536):
+        """
+        Writes content to a file of the volume, streamed base64 encoded through
+        the exec stdin. head reads exactly the encoded length, busybox tar
+        would wait for the end of a stdin the websocket exec never closes.
+        The size of the written file is checked
+
+        :param content: the file content
+        :param dest_path: path of the file in the helper pod
+        :param chunk_size: characters sent per websocket message
+        :raises RuntimeError: if a command fails or the file is incomplete
+        """
+        self.exec(["mkdir", "-p", os.path.dirname(dest_path)])
+
+        encoded = base64.b64encode(content).decode()
+        self.exec(
+            [
+                "/bin/sh",
+                "-c",
+                f"head -c {len(encoded)} | base64 -d > {shlex.quote(dest_path)}",
+            ],
+            stdin=encoded,
+            chunk_size=chunk_size,
+        )
+
+        size = self.exec(["/bin/sh", "-c", f"wc -c < {shlex.quote(dest_path)}"])
+        if size.strip() != str(len(content)):
+            raise RuntimeError(
+                f"{dest_path} has {size.strip()} bytes, {len(content)} were written"
+            )
+
     def copy_to_volume(self, src_path, dest_path):
         """
         This function copies a file inside the pod
@@ -109,7 +216,7 @@ class HelperPod:
                 "--absolute-names",
             ]
             api_response = stream(
-                self.context.core_v1_api.connect_get_namespaced_pod_exec,
+                self.context.stream_core_v1_api.connect_get_namespaced_pod_exec,
                 self.pod_name,
                 self.context.namespace,
                 command=exec_command,
@@ -165,7 +272,7 @@ class HelperPod:
 
             with TemporaryFile() as tar_buffer:
                 resp = stream(
-                    self.context.core_v1_api.connect_get_namespaced_pod_exec,
+                    self.context.stream_core_v1_api.connect_get_namespaced_pod_exec,
                     self.pod_name,
                     self.context.namespace,
                     command=exec_command,
@@ -316,20 +423,193 @@ class HelperPod:
                     break
 
 
-def copy_to_volume(
-    context: CalrissianContext,
-    volume: Dict,
-    volume_mount: Dict,
-    source_paths: list,
-    destination_path: str,
+class SharedHelperPod:
+    """Helper pod of a context reused by the copies to and from a volume, it is
+    created on first use, checked before being reused and deleted once idle"""
+
+    def __init__(
+        self,
+        context: CalrissianContext,
+        volume: Dict,
+        volume_mount: Dict,
+        max_idle_time: float = 300,
+        check_interval: float = 30,
+    ):
+        """Creates a SharedHelperPod object, the pod is created on first use
+
+        Args:
+            context (CalrissianContext): the context of the pod
+            volume (Dict): the volume mounted by the pod
+            volume_mount (Dict): the volume mount of the pod container
+            max_idle_time (float): seconds without use before the pod is deleted
+            check_interval (float): seconds during which a pod found running is
+                reused without checking it again
+
+        Returns:
+            None: none
+        """
+        self.context = context
+        self.volume = volume
+        self.volume_mount = volume_mount
+        self.max_idle_time = max_idle_time
+        self.check_interval = check_interval
+
+        self.helper_pod: HelperPod = None
+        self._checked = 0.0
+        self._users = 0
+        self._lock = threading.Lock()
+        self._timer: threading.Timer = None
+
+    @contextmanager
+    def use(self):
+        """Yields the running helper pod, created or replaced if needed"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._is_healthy():
+                self._replace()
+            self._users += 1
+            helper_pod = self.helper_pod
+
+        try:
+            yield helper_pod
+        finally:
+            with self._lock:
+                self._users -= 1
+                if self._users == 0 and self.helper_pod is not None:
+                    self._timer = threading.Timer(self.max_idle_time, self._reap)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def dismiss(self, delete: bool = True):
+        """Deletes the pod, or forgets it if it is already deleted (e.g. with the
+        namespace pods), the next use creates a new one"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.helper_pod is not None and delete:
+                self.helper_pod.dismiss()
+            self.helper_pod = None
+            _shared_helper_pods.discard(self)
+
+    def _is_healthy(self) -> bool:
+
+        if self.helper_pod is None:
+            return False
+        if time.monotonic() - self._checked < self.check_interval:
+            return True
+
+        try:
+            if self.context.raw_json:
+                pod = call_raw(
+                    self.context.core_v1_api.read_namespaced_pod,
+                    name=self.helper_pod.pod_name,
+                    namespace=self.context.namespace,
+                )
+                phase = (pod.get("status") or {}).get("phase")
+                deleted = pod["metadata"].get("deletionTimestamp") is not None
+            else:
+                pod = self.context.core_v1_api.read_namespaced_pod(
+                    name=self.helper_pod.pod_name,
+                    namespace=self.context.namespace,
+                )
+                phase = pod.status.phase
+                deleted = pod.metadata.deletion_timestamp is not None
+        except ApiException as e:
+            if e.status != HTTPStatus.NOT_FOUND:
+                raise e
+            phase, deleted = None, True
+
+        if phase != "Running" or deleted:
+            logger.warning(f"helper pod {self.helper_pod.pod_name} is {phase}")
+            return False
+
+        self._checked = time.monotonic()
+        return True
+
+    def _replace(self):
+
+        if self.helper_pod is not None:
+            self.helper_pod.dismiss()
+
+        self.helper_pod = HelperPod(
+            context=self.context,
+            volume=self.volume,
+            volume_mount=self.volume_mount,
+        )
+        self._checked = time.monotonic()
+        _shared_helper_pods.add(self)
+        logger.info(f"helper pod {self.helper_pod.pod_name} created")
+
+    def _reap(self):
+
+        with self._lock:
+            if self._users or self.helper_pod is None:
+                return
+            logger.info(f"helper pod {self.helper_pod.pod_name} idle, deleting it")
+            self.helper_pod.dismiss()
+            self.helper_pod = None
+            self._timer = None
+            _shared_helper_pods.discard(self)
+
+
+@atexit.register
+def _dismiss_shared_helper_pods():
+
+    for shared_helper_pod in list(_shared_helper_pods):
+        shared_helper_pod.dismiss()
+
+
+def get_shared_helper_pod(
+    context: CalrissianContext, volume: Dict, volume_mount: Dict
+) -> SharedHelperPod:
+    """Returns the shared helper pod of a context mounting a volume"""
+    key = (json.dumps(volume, sort_keys=True), json.dumps(volume_mount, sort_keys=True))
+
+    with context.helper_pods_lock:
+        if key not in context.helper_pods:
+            context.helper_pods[key] = SharedHelperPod(
+                context=context,
+                volume=volume,
+                volume_mount=volume_mount,
+                max_idle_time=context.helper_pod_idle_time,
+            )
+        return context.helper_pods[key]
+
+
+@contextmanager
+def get_helper_pod(
+    context: CalrissianContext, volume: Dict, volume_mount: Dict, shared: bool = True
 ):
+    """Yields the shared helper pod of the context or, if shared is False, a
+    helper pod deleted after use"""
+    if shared:
+        with get_shared_helper_pod(context, volume, volume_mount).use() as helper_pod:
+            yield helper_pod
+        return
+
     helper_pod = HelperPod(
         context=context,
         volume=volume,
         volume_mount=volume_mount,
     )
-
     try:
+        yield helper_pod
+    finally:
+        helper_pod.dismiss()
+
+
+def copy_to_volume(
+    context: CalrissianContext,
+    volume: Dict,
+    volume_mount: Dict,
+    source_paths: list,
+    destination_path: str,
+    shared: bool = True,
+):
+    with get_helper_pod(context, volume, volume_mount, shared=shared) as helper_pod:
         for source_path in source_paths:
             print(f"copy {source_path} to {destination_path}")
             """
@@ -344,8 +624,6 @@ def copy_to_volume(
             helper_pod.copy_to_volume_using_kubectl(
                 src_path=source_path, dest_path=destination_path
             )
-    finally:
-        helper_pod.dismiss()
 
 
 def copy_from_volume(
@@ -354,28 +632,23 @@ def copy_from_volume(
     volume_mount: Dict,
     source_paths: list,
     destination_path: str,
+    shared: bool = True,
 ):
-    helper_pod = HelperPod(
-        context=context,
-        volume=volume,
-        volume_mount=volume_mount,
-    )
-
-    try:
-        old_out_fd = os.dup(sys.stdout.fileno())
-        old_out = sys.stdout
-        os.dup2(sys.stderr.fileno(), 1)
-        for source_path in source_paths:
-            print(
-                f"copy {source_path} to {destination_path}",
-                file=sys.stderr,
-            )
-            helper_pod.copy_from_volume(
-                src_path=source_path,
-                dest_path=destination_path,
-            )
-    finally:
-        sys.stdout.flush()
-        os.dup2(old_out_fd, old_out.fileno())
-        sys.stdout = old_out
-        helper_pod.dismiss()
+    with get_helper_pod(context, volume, volume_mount, shared=shared) as helper_pod:
+        try:
+            old_out_fd = os.dup(sys.stdout.fileno())
+            old_out = sys.stdout
+            os.dup2(sys.stderr.fileno(), 1)
+            for source_path in source_paths:
+                print(
+                    f"copy {source_path} to {destination_path}",
+                    file=sys.stderr,
+                )
+                helper_pod.copy_from_volume(
+                    src_path=source_path,
+                    dest_path=destination_path,
+                )
+        finally:
+            sys.stdout.flush()
+            os.dup2(old_out_fd, old_out.fileno())
+            sys.stdout = old_out
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import unittest
+from types import SimpleNamespace
+
+import yaml
+
+from pycalrissian.aio import AsyncCalrissianContext, AsyncCalrissianExecution, _exec
+from pycalrissian.execution import JobStatus
+from pycalrissian.job import CalrissianJob
+
+os.environ["KUBECONFIG"] = "~/.kube/kubeconfig-t2-dev.yaml"
+
+
+class TestAsyncCalrissianJob(unittest.IsolatedAsyncioTestCase):
+    async def test_staged_documents(self):
+
+        with open("tests/simple.cwl", "r") as stream:
+            cwl = yaml.safe_load(stream)
+
+        session = AsyncCalrissianContext(
+            namespace="async-job-namespace",
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+        )
+        job = CalrissianJob(
+            cwl=cwl,
+            params={"message": "hello " * 1000},
+            runtime_context=session,
+            compression_threshold=1024,
+            staging_threshold=16,
+        )
+
+        execution = AsyncCalrissianExecution(job=job, runtime_context=session)
+
+        # rejected before connecting to the cluster
+        with self.assertRaises(ValueError):
+            await execution.submit()
+        self.assertIsNone(session.api_client)
+
+    def test_deferred_config_maps(self):
+
+        with open("tests/simple.cwl", "r") as stream:
+            cwl = yaml.safe_load(stream)
+
+        job = CalrissianJob(
+            cwl=cwl,
+            params={"message": "hello world!"},
+            runtime_context=AsyncCalrissianContext(
+                namespace="async-job-namespace",
+                storage_class="microk8s-hostpath",
+                volume_size="1G",
+            ),
+            pod_env_vars={"A": "1"},
+            bundle_config_maps=True,
+        )
+
+        self.assertEqual(
+            [config_map["name"] for config_map in job.get_config_maps()],
+            [job.get_cwl_config_map_name(), f"{job.job_name}-inputs"],
+        )
+
+
+class TestAsyncCalrissianContext(unittest.TestCase):
+    def test_event_loops(self):
+
+        # created outside of an event loop, used in two of them
+        session = AsyncCalrissianContext(
+            namespace="async-job-namespace",
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+        )
+
+        for _ in range(2):
+            asyncio.run(session.dismiss_helper_pod())
+        self.assertIsNone(session.helper_pod_name)
+
+
+class FakeExecApi:
+    """Stands for a WsApiClient backed CoreV1Api sending websocket messages"""
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def connect_get_namespaced_pod_exec(self, *args, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def __aiter__(self):
+        for channel, data in self.messages:
+            yield SimpleNamespace(data=bytes([channel]) + data)
+
+
+class TestExec(unittest.IsolatedAsyncioTestCase):
+    async def test_exec(self):
+
+        api = FakeExecApi(
+            [
+                (1, b"hello "),
+                (2, b"warning"),
+                (1, b"world"),
+                (3, b'{"status": "Success"}'),
+            ]
+        )
+
+        self.assertEqual(await _exec(api, "pod", "namespace", ["cat"]), "hello world")
+
+    async def test_exec_failure(self):
+
+        api = FakeExecApi(
+            [
+                (2, b"cat: missing.json: No such file or directory"),
+                (
+                    3,
+                    b'{"status": "Failure", "reason": "NonZeroExitCode", '
+                    b'"details": {"causes": [{"reason": "ExitCode", "message": "1"}]}}',
+                ),
+            ]
+        )
+
+        with self.assertRaisesRegex(RuntimeError, "exit status 1.*No such file"):
+            await _exec(api, "pod", "namespace", ["cat", "missing.json"])
+
+
+class TestAsyncCalrissianExecution(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.session = AsyncCalrissianContext(
+            namespace="async-job-namespace",
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+        )
+
+        await self.session.initialise()
+
+    async def asyncTearDown(self):
+        await self.session.dispose()
+        await self.session.close()
+
+    @unittest.skipIf(
+        os.getenv("CI_TEST_SKIP") == "1", "Test is skipped via env variable"
+    )
+    async def test_simple_job(self):
+
+        with open("tests/simple.cwl", "r") as stream:
+            cwl = yaml.safe_load(stream)
+
+        job = CalrissianJob(
+            cwl=cwl,
+            params={"message": "hello world!"},
+            runtime_context=self.session,
+            max_cores=2,
+            max_ram="4G",
+        )
+
+        execution = AsyncCalrissianExecution(job=job, runtime_context=self.session)
+
+        await execution.submit()
+
+        status = await execution.wait(interval=5)
+
+        self.assertEqual(status, JobStatus.SUCCEEDED)
+        self.assertIsNotNone(await execution.get_output())
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import unittest
+
+from pycalrissian.array import (
+    ARRAY_INDEX_LABEL,
+    CalrissianJobArray,
+    parse_indexes,
+)
+from pycalrissian.execution import JobStatus
+from pycalrissian.fake import FakeKubernetes
+
+
+class TestCalrissianJobArray(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwl = {
+            "cwlVersion": "v1.0",
+            "$graph": [{"class": "Workflow", "id": "main"}],
+        }
+        cls.params = [{"tile": f"T{index}"} for index in range(5)]
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_parse_indexes(self):
+
+        self.assertEqual(parse_indexes("1,3-5"), {1, 3, 4, 5})
+        self.assertEqual(parse_indexes(""), set())
+        self.assertEqual(parse_indexes(None), set())
+
+    def test_indexed_job(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        array = CalrissianJobArray(
+            cwl=self.cwl,
+            params=self.params,
+            runtime_context=session,
+            parallelism=2,
+            cwl_entry_point="main",
+        )
+        manifest = array.job.to_manifest()
+        self.assertEqual(manifest["spec"]["completionMode"], "Indexed")
+        self.assertEqual(manifest["spec"]["completions"], 5)
+        self.assertEqual(manifest["spec"]["parallelism"], 2)
+
+        array.submit()
+
+        results = sorted(array.as_completed(interval=0.05, timeout=5))
+
+        self.assertEqual(
+            results,
+            [
+                (index, JobStatus.SUCCEEDED, params)
+                for index, params in enumerate(self.params)
+            ],
+        )
+        self.assertEqual(array.get_status(), JobStatus.SUCCEEDED)
+        self.assertEqual(array.get_counts(), {JobStatus.SUCCEEDED: 5})
+        # one job and the shared CWL and job config maps
+        self.assertEqual(cluster.requests[("POST", "jobs", None)], 1)
+        self.assertEqual(cluster.requests[("POST", "configmaps", None)], 2)
+
+    def test_indexed_job_failed_index(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.2,
+            outputs=lambda params: params,
+            index_succeeds=lambda job, index: index != 3,
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        array = CalrissianJobArray(
+            cwl=self.cwl,
+            params=self.params,
+            runtime_context=session,
+            cwl_entry_point="main",
+        )
+        manifest = array.job.to_manifest()
+        self.assertEqual(manifest["spec"]["backoffLimitPerIndex"], 2)
+        self.assertEqual(manifest["spec"]["backoffLimit"], 15)
+
+        array.submit()
+
+        results = list(array.as_completed(interval=0.02, timeout=5))
+
+        # the failed index does not stop the others
+        self.assertEqual(results[0], (3, JobStatus.FAILED, None))
+        self.assertEqual(
+            sorted(results[1:]),
+            [
+                (index, JobStatus.SUCCEEDED, params)
+                for index, params in enumerate(self.params)
+                if index != 3
+            ],
+        )
+        self.assertEqual(array.get_status(), JobStatus.FAILED)
+        self.assertEqual(
+            array.get_counts(), {JobStatus.SUCCEEDED: 4, JobStatus.FAILED: 1}
+        )
+
+    def test_indexed_job_too_large(self):
+
+        session = FakeKubernetes().context(namespace="fake-namespace")
+
+        with self.assertRaises(ValueError):
+            CalrissianJobArray(
+                cwl=self.cwl,
+                params=[{"message": "hello " * 10000} for _ in range(20)],
+                runtime_context=session,
+            )
+
+    def test_batch(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.1,
+            outputs=lambda params: params,
+            job_succeeds=lambda job: job["metadata"]["labels"][ARRAY_INDEX_LABEL]
+            != "3",
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        array = CalrissianJobArray(
+            cwl=self.cwl,
+            params=iter(self.params),
+            runtime_context=session,
+            parallelism=2,
+            indexed=False,
+            cwl_entry_point="main",
+        )
+        array.submit()
+        self.assertEqual(len(cluster.list("jobs", "fake-namespace")), 2)
+
+        results = {
+            index: (status, output)
+            for index, status, output in array.as_completed(interval=0.05, timeout=10)
+        }
+
+        self.assertEqual(
+            results,
+            {
+                index: (
+                    (JobStatus.FAILED, None)
+                    if index == 3
+                    else (JobStatus.SUCCEEDED, params)
+                )
+                for index, params in enumerate(self.params)
+            },
+        )
+        self.assertEqual(array.size, 5)
+        self.assertEqual(array.get_status(), JobStatus.FAILED)
+        self.assertEqual(
+            array.get_counts(), {JobStatus.SUCCEEDED: 4, JobStatus.FAILED: 1}
+        )
+        # the CWL config map is shared
+        self.assertEqual(cluster.requests[("POST", "configmaps", None)], 6)
+
+    def test_batch_retried_pod(self):
+
+        cluster = FakeKubernetes(job_duration=5)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        array = CalrissianJobArray(
+            cwl=self.cwl,
+            params=self.params,
+            runtime_context=session,
+            parallelism=2,
+            indexed=False,
+            cwl_entry_point="main",
+        )
+        array.submit()
+
+        # a pod failed and the job controller is about to retry it
+        job = next(
+            job
+            for job in cluster.list("jobs", "fake-namespace")
+            if job["metadata"]["labels"][ARRAY_INDEX_LABEL] == "0"
+        )
+        cluster.update(
+            "jobs",
+            "fake-namespace",
+            job["metadata"]["name"],
+            {
+                "status": {
+                    "active": None,
+                    "failed": 1,
+                    "startTime": "2022-01-01T00:00:00Z",
+                }
+            },
+        )
+        array._update()
+
+        self.assertEqual(array.get_statuses()[0], JobStatus.ACTIVE)
+        # the slot of the job is not refilled
+        self.assertEqual(len(cluster.list("jobs", "fake-namespace")), 2)
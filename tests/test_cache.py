@@ -0,0 +1,143 @@
+import os
+import unittest
+
+from pycalrissian.context import CalrissianContext
+from pycalrissian.fake import FakeKubernetes
+
+os.environ["KUBECONFIG"] = "~/.kube/kubeconfig-t2-dev.yaml"
+
+
+class TestInformerCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.namespace = "cache-namespace"
+
+    def test_cached_config_map(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace=self.namespace, use_cache=True)
+        session.create_namespace()
+
+        self._check_cached_config_map(session)
+
+        # answered from the cache
+        reads = cluster.requests[("GET", "configmaps", None)]
+        self.assertTrue(session.is_config_map_created(name="cached-cm"))
+        self.assertEqual(cluster.requests[("GET", "configmaps", None)], reads)
+
+        session.dispose()
+
+        self.assertIsNone(session.cache.get("read_namespaced_config_map", "cached-cm"))
+
+    def test_restart(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace=self.namespace, use_cache=True)
+        session.create_namespace()
+        self.assertTrue(session.cache.wait_for_sync(timeout=10))
+
+        session.cache.stop()
+        self.assertIsNone(session.cache.resource_version("read_namespaced_config_map"))
+
+        cluster.create(
+            "configmaps",
+            self.namespace,
+            {"metadata": {"name": "created-while-stopped"}, "data": {}},
+        )
+        lists = cluster.requests[("GET", "configmaps", None)]
+
+        # listed again, not resumed from the resourceVersion before the stop
+        session.cache.start()
+        self.assertTrue(session.cache.wait_for_sync(timeout=10))
+        self.assertGreater(cluster.requests[("GET", "configmaps", None)], lists)
+        self.assertIsNotNone(
+            session.cache.get("read_namespaced_config_map", "created-while-stopped")
+        )
+
+        session.cache.stop()
+
+    def test_stale_cached_config_map(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace=self.namespace, use_cache=True)
+        session.create_namespace()
+        self.assertTrue(session.cache.wait_for_sync(timeout=10))
+
+        created = session.create_configmap(name="cached-cm", key="key", content="1")
+        self.assertIsNotNone(
+            session.retry(
+                session.cache.get,
+                interval=0.05,
+                timeout=10,
+                read_method="read_namespaced_config_map",
+                name="cached-cm",
+            )
+        )
+
+        # a deleted config map the cache has not caught up with
+        stale = session.cache.get("read_namespaced_config_map", "cached-cm")
+        cluster.delete("configmaps", self.namespace, "cached-cm")
+        session.retry(
+            lambda: session.cache.get("read_namespaced_config_map", "cached-cm")
+            is None,
+            interval=0.05,
+            timeout=10,
+        )
+        session.cache._objects["read_namespaced_config_map"]["cached-cm"] = stale
+
+        # any object of the name is accepted without a uid, the stale one too
+        self.assertTrue(
+            session.wait_for_object("read_namespaced_config_map", name="cached-cm")
+        )
+        # not with the uid of a recreated config map
+        self.assertFalse(
+            session.wait_for_object(
+                "read_namespaced_config_map",
+                name="cached-cm",
+                uid="uid-of-the-recreated-config-map",
+                timeout=1,
+            )
+        )
+
+        recreated = session.create_configmap(name="cached-cm", key="key", content="2")
+        self.assertNotEqual(recreated.metadata.uid, created.metadata.uid)
+
+    @unittest.skipUnless(
+        os.getenv("CI_TEST_LIVE") == "1", "needs a live cluster, set CI_TEST_LIVE=1"
+    )
+    def test_cached_config_map_live(self):
+
+        session = CalrissianContext(
+            namespace=self.namespace,
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+            use_cache=True,
+        )
+
+        if not session.is_namespace_created():
+            session.create_namespace()
+
+        self._check_cached_config_map(session)
+
+        session.dispose()
+
+        self.assertIsNone(session.cache.get("read_namespaced_config_map", "cached-cm"))
+
+    def _check_cached_config_map(self, session: CalrissianContext):
+
+        self.assertTrue(session.cache.wait_for_sync(timeout=10))
+
+        session.create_configmap(name="cached-cm", key="key", content="value")
+
+        session.retry(
+            session.cache.get,
+            interval=0.1,
+            timeout=10,
+            read_method="read_namespaced_config_map",
+            name="cached-cm",
+        )
+
+        self.assertIsNotNone(
+            session.cache.get("read_namespaced_config_map", "cached-cm")
+        )
+        self.assertTrue(session.is_config_map_created(name="cached-cm"))
@@ -0,0 +1,149 @@
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from pycalrissian.capacity import (
+    fit_job_to_capacity,
+    get_node_capacity,
+    get_quota_headroom,
+)
+from pycalrissian.execution import CalrissianExecution
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob
+
+
+def node(name, cpu, memory, labels=None, ready=True, unschedulable=False):
+
+    return {
+        "metadata": {"name": name, "labels": labels or {}},
+        "spec": {"unschedulable": unschedulable},
+        "status": {
+            "allocatable": {"cpu": cpu, "memory": memory},
+            "conditions": [{"type": "Ready", "status": str(ready)}],
+        },
+    }
+
+
+class TestCapacity(unittest.TestCase):
+    def setUp(self):
+
+        self.cluster = FakeKubernetes(
+            nodes=[
+                node("node-1", "4", "16Gi", {"pool": "processing"}),
+                node("node-2", "3500m", "8Gi", {"pool": "processing"}),
+                node("node-3", "8", "32Gi", {"pool": "processing"}, ready=False),
+                node("node-4", "8", "32Gi", {"pool": "processing"}, unschedulable=True),
+                node("node-5", "16", "64Gi", {"pool": "system"}),
+            ]
+        )
+        self.session = self.cluster.context(
+            namespace="fake-namespace",
+            resource_quota={"requests.cpu": "10", "limits.memory": "20G"},
+        )
+        self.session.initialise()
+        self.cluster.update(
+            "resourcequotas",
+            "fake-namespace",
+            "calrissian-resource-quota",
+            {"status": {"used": {"requests.cpu": "2500m", "limits.memory": "4G"}}},
+        )
+
+    def _job(self, **kwargs):
+
+        return CalrissianJob(
+            cwl={"cwlVersion": "v1.0", "class": "Workflow"},
+            params={},
+            runtime_context=self.session,
+            **kwargs,
+        )
+
+    def test_quota_headroom(self):
+
+        headroom = get_quota_headroom(self.session)
+
+        self.assertEqual(headroom["cpu"], 7.5)
+        self.assertEqual(headroom["memory"], 16 * 1000**3)
+
+    def test_node_capacity(self):
+
+        capacity = get_node_capacity(self.session, {"pool": "processing"})
+
+        self.assertEqual(capacity["cpu"], 7.5)
+        self.assertEqual(capacity["memory"], 24 * 1024**3)
+        self.assertEqual(
+            get_node_capacity(self.session, {"pool": "gpu"}),
+            {"cpu": None, "memory": None},
+        )
+
+    def test_fit_job_to_capacity(self):
+
+        job = self._job(pod_node_selector={"pool": "processing"})
+
+        self.assertTrue(fit_job_to_capacity(job, self.session))
+        # the quota minus the calrissian container (2 CPUs, 2G limits)
+        self.assertEqual((job.max_cores, job.max_ram), ("5", "14000M"))
+
+        job = self._job(max_cores="2", max_ram="4G")
+        fit_job_to_capacity(job, self.session, cap_only=True)
+        self.assertEqual((job.max_cores, job.max_ram), ("2", "4000M"))
+
+    def test_init_container_resources(self):
+
+        job = self._job(
+            pod_node_selector={"pool": "processing"},
+            resources={
+                "limits": {"cpu": "50m", "memory": "64M"},
+                "requests": {"cpu": "50m", "memory": "64M"},
+            },
+        )
+        init_container = job.to_manifest()["spec"]["template"]["spec"][
+            "initContainers"
+        ][0]
+        self.assertEqual(init_container["resources"], job.get_init_resources())
+
+        # the init container (100m, 128Mi) is larger than the calrissian one
+        self.assertTrue(fit_job_to_capacity(job, self.session))
+        self.assertEqual((job.max_cores, job.max_ram), ("7", "15865M"))
+
+        # the pod is admitted under the quota
+        execution = CalrissianExecution(job=job, runtime_context=self.session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+        self.assertTrue(execution.is_succeeded())
+
+    def test_quota_admission(self):
+
+        with self.assertRaises(ApiException) as raised:
+            self.session.core_v1_api.create_namespaced_pod(
+                namespace="fake-namespace",
+                body={
+                    "metadata": {"name": "no-resources"},
+                    "spec": {"containers": [{"name": "main", "image": "busybox"}]},
+                },
+            )
+        self.assertEqual(raised.exception.status, 403)
+
+    def test_no_capacity_information(self):
+
+        session = FakeKubernetes().context(namespace="fake-namespace")
+        session.initialise()
+
+        job = CalrissianJob(
+            cwl={"cwlVersion": "v1.0", "class": "Workflow"},
+            params={},
+            runtime_context=session,
+        )
+
+        self.assertFalse(fit_job_to_capacity(job, session))
+        self.assertEqual((job.max_cores, job.max_ram), ("16", "8G"))
+
+    def test_execution(self):
+
+        job = self._job(pod_node_selector={"pool": "processing"}, fit_to_capacity=True)
+        execution = CalrissianExecution(job=job, runtime_context=self.session)
+        execution.submit()
+
+        args = self.cluster.get("jobs", "fake-namespace", job.job_name)["spec"][
+            "template"
+        ]["spec"]["containers"][0]["args"]
+        self.assertEqual(args[args.index("--max-cores") + 1], "5")
@@ -1,6 +1,7 @@
 import base64
 import json
 import os
+import threading
 import unittest
 
 import yaml
@@ -11,6 +12,7 @@ from kubernetes.client.models.v1_role_binding import V1RoleBinding
 from kubernetes.client.models.v1_secret import V1Secret
 
 from pycalrissian.context import CalrissianContext
+from pycalrissian.fake import FakeKubernetes
 
 os.environ["KUBECONFIG"] = "~/.kube/kubeconfig-t2-dev.yaml"
 
@@ -32,6 +34,25 @@ class TestCalrissianContext(unittest.TestCase):
 
         self.assertIsNotNone(session.core_v1_api)
 
+    def test_shared_api_client(self):
+
+        session = CalrissianContext(
+            namespace=self.namespace, storage_class="dummy", volume_size="1G"
+        )
+        other_session = CalrissianContext(
+            namespace="other-namespace", storage_class="dummy", volume_size="1G"
+        )
+        own_session = CalrissianContext(
+            namespace=self.namespace,
+            storage_class="dummy",
+            volume_size="1G",
+            share_api_client=False,
+        )
+
+        self.assertIs(session.api_client, other_session.api_client)
+        self.assertIsNot(session.api_client, own_session.api_client)
+        self.assertIsNot(session.api_client, session.stream_api_client)
+
     def test_rbac_authorization_v1_api(self):
 
         session = CalrissianContext(
@@ -221,6 +242,129 @@ class TestCalrissianContext(unittest.TestCase):
 
         self.assertIsInstance(response, V1Secret)
 
+    def test_initialise_report(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(
+            namespace=self.namespace, resource_quota={"requests.cpu": "4"}
+        )
+
+        report = session.initialise(max_workers=2)
+
+        self.assertIn("namespace", report)
+        self.assertIn("pvc/calrissian-wdir", report)
+        self.assertIn("rolebinding/pod-manager-default-binding", report)
+        self.assertIn("resourcequota/calrissian-resource-quota", report)
+        self.assertIsNotNone(
+            cluster.get("resourcequotas", self.namespace, "calrissian-resource-quota")
+        )
+        self.assertIsNotNone(
+            cluster.get("persistentvolumeclaims", self.namespace, "calrissian-wdir")
+        )
+
+    @unittest.skipUnless(
+        os.getenv("CI_TEST_LIVE") == "1", "needs a live cluster, set CI_TEST_LIVE=1"
+    )
+    def test_initialise_report_live(self):
+
+        session = CalrissianContext(
+            namespace=self.namespace,
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+            resource_quota={"requests.cpu": "4"},
+        )
+
+        report = session.initialise(max_workers=2)
+
+        self.assertIn("namespace", report)
+        self.assertIn("pvc/calrissian-wdir", report)
+        self.assertIn("rolebinding/pod-manager-default-binding", report)
+        self.assertIn("resourcequota/calrissian-resource-quota", report)
+
+    def test_provision_dependencies(self):
+
+        completed = []
+
+        def task(name):
+            return lambda: completed.append(name)
+
+        tasks = {
+            "binding": (task("binding"), ["role"]),
+            "role": (task("role"), ["namespace"]),
+            "namespace": (task("namespace"), []),
+            "pvc": (task("pvc"), ["namespace"]),
+        }
+
+        report = CalrissianContext._provision(tasks, max_workers=4)
+
+        self.assertEqual(set(report.keys()), set(tasks.keys()))
+        self.assertEqual(completed[0], "namespace")
+        self.assertLess(completed.index("role"), completed.index("binding"))
+
+    def test_provision_unresolvable_dependencies(self):
+
+        tasks = {"binding": (lambda: None, ["role"])}
+
+        with self.assertRaises(ValueError):
+            CalrissianContext._provision(tasks)
+
+    def test_wait_for_object(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace=self.namespace)
+        session.create_namespace()
+
+        self.assertTrue(session.wait_for_object("read_namespace", timeout=10))
+        self.assertFalse(
+            session.wait_for_object(
+                "read_namespaced_config_map", name="not-there", timeout=1
+            )
+        )
+
+        # created while waiting, seen by the watch
+        threading.Timer(
+            0.2,
+            cluster.create,
+            args=("configmaps", self.namespace, {"metadata": {"name": "late"}}),
+        ).start()
+        self.assertTrue(
+            session.wait_for_object(
+                "read_namespaced_config_map", name="late", timeout=5
+            )
+        )
+
+    @unittest.skipUnless(
+        os.getenv("CI_TEST_LIVE") == "1", "needs a live cluster, set CI_TEST_LIVE=1"
+    )
+    def test_wait_for_object_live(self):
+
+        session = CalrissianContext(
+            namespace=self.namespace, storage_class="dummy", volume_size="1G"
+        )
+
+        if not session.is_namespace_created():
+            session.create_namespace()
+
+        self.assertTrue(session.wait_for_object("read_namespace", timeout=10))
+        self.assertFalse(
+            session.wait_for_object(
+                "read_namespaced_config_map", name="not-there", timeout=2
+            )
+        )
+
+    def test_retry_backoff(self):
+
+        responses = [None, None, "created"]
+
+        response = CalrissianContext.retry(
+            lambda: responses.pop(0), max_tries=5, interval=0.01
+        )
+
+        self.assertEqual(response, "created")
+        self.assertIsNone(
+            CalrissianContext.retry(lambda: None, max_tries=3, interval=0.01)
+        )
+
 
 # # if __name__ == "__main__":
 # #     import nose2
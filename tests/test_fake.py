@@ -0,0 +1,533 @@
+import gzip
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import yaml
+
+from pycalrissian.execution import CalrissianExecution, JobStatus, submit_many
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import DECOMPRESS_SCRIPT, CalrissianJob
+from pycalrissian.utils import HelperPod
+
+
+class TestFakeKubernetes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwl = {
+            "cwlVersion": "v1.0",
+            "$graph": [{"class": "Workflow", "id": "main"}],
+        }
+        cls.params = {"message": "hello"}
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _execution(self, session, params=None, **kwargs):
+
+        job = CalrissianJob(
+            cwl=self.cwl,
+            params=params or self.params,
+            runtime_context=session,
+            cwl_entry_point="main",
+            max_cores=1,
+            max_ram="1G",
+            tool_logs=True,
+            **kwargs,
+        )
+        return CalrissianExecution(job=job, runtime_context=session)
+
+    def test_execution(self):
+
+        cluster = FakeKubernetes(job_duration=0.2, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        self.assertTrue(session.is_namespace_created())
+        self.assertTrue(session.is_pvc_created(name="calrissian-wdir"))
+
+        execution = self._execution(session)
+        execution.submit()
+        self.assertEqual(execution.get_status(), JobStatus.ACTIVE)
+
+        execution.monitor(interval=0.05)
+
+        self.assertTrue(execution.is_succeeded())
+        self.assertIsNotNone(execution.get_completion_time())
+        self.assertEqual(execution.get_output(), self.params)
+        self.assertIn("children", execution.get_usage_report())
+        self.assertEqual(execution.get_log(), cluster.log)
+        self.assertEqual(execution.get_tool_logs(), ["./tool.log"])
+
+        session.dispose()
+
+        self.assertFalse(session.is_namespace_created())
+        self.assertEqual(cluster.list("jobs"), [])
+
+    def test_concurrent_executions(self):
+
+        cluster = FakeKubernetes(job_duration=0.2, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        executions = [
+            self._execution(session, params={"index": index}) for index in range(3)
+        ]
+        for execution in executions:
+            execution.submit()
+        for execution in executions:
+            execution.monitor(interval=0.05)
+
+        self.assertEqual(
+            [execution.get_output() for execution in executions],
+            [{"index": index} for index in range(3)],
+        )
+        self.assertEqual(
+            sorted(cluster.volumes[("fake-namespace", "calrissian-wdir")]),
+            sorted(
+                f"{execution.job.job_name}/{filename}"
+                for execution in executions
+                for filename in ["output.json", "report.json", "stderr.log", "tool.log"]
+            ),
+        )
+
+    def test_shared_cwl_config_map(self):
+
+        cluster = FakeKubernetes(job_duration=0.1)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        executions = [self._execution(session) for _ in range(2)]
+        for execution in executions:
+            execution.submit()
+        name = executions[0].job.get_cwl_config_map_name()
+
+        self.assertEqual(executions[1].job.get_cwl_config_map_name(), name)
+        # one CWL config map and two params config maps
+        self.assertEqual(cluster.requests[("POST", "configmaps", None)], 3)
+        self.assertTrue(cluster.get("configmaps", "fake-namespace", name)["immutable"])
+
+        session.delete_workloads()
+        self.assertIsNotNone(cluster.get("configmaps", "fake-namespace", name))
+
+        session.dispose()
+        session.initialise()
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        self.assertTrue(execution.is_succeeded())
+        self.assertIsNotNone(cluster.get("configmaps", "fake-namespace", name))
+
+    def test_bundled_config_maps(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        for bundle_config_maps in [True, False]:
+            execution = self._execution(
+                session,
+                pod_env_vars={"A": "1"},
+                pod_node_selector={"disk": "ssd"},
+                bundle_config_maps=bundle_config_maps,
+            )
+            execution.submit()
+            execution.monitor(interval=0.05)
+
+            self.assertEqual(execution.get_output(), self.params)
+
+        # the shared CWL config map, one bundled and three single config maps
+        self.assertEqual(cluster.requests[("POST", "configmaps", None)], 5)
+
+    def test_compressed_documents(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        params = {"message": "hello " * 1000}
+        execution = self._execution(
+            session, params=params, compression_threshold=1024, bundle_config_maps=True
+        )
+        job = execution.job
+        execution.submit()
+
+        config_map = cluster.get(
+            "configmaps", "fake-namespace", f"{job.job_name}-inputs"
+        )
+        self.assertIn("params", config_map["binaryData"])
+        self.assertEqual(
+            job._get_document_path("params"),
+            f"/calrissian/{job.job_name}/inputs/params.yml",
+        )
+        self.assertIn(
+            "/calrissian-inputs/params.yml.gz",
+            job.to_k8s_job().spec.template.spec.init_containers[0].args,
+        )
+
+        execution.monitor(interval=0.05)
+
+        self.assertEqual(execution.get_output(), params)
+
+    def test_staged_documents(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        params = {"message": "hello " * 1000}
+        execution = self._execution(
+            session, params=params, compression_threshold=1024, staging_threshold=16
+        )
+        job = execution.job
+        execution.submit()
+
+        self.assertEqual(
+            [document["key"] for document in job.get_staged_documents()], ["params"]
+        )
+        # the gzip is staged and decompressed by the init container
+        staged = cluster.volumes[("fake-namespace", "calrissian-wdir")][
+            f"{job.job_name}/inputs/params.yml.gz"
+        ]
+        self.assertEqual(yaml.safe_load(gzip.decompress(staged)), params)
+        self.assertIn(
+            f"{job.calrissian_inputs_path}/params.yml.gz",
+            job.to_k8s_job().spec.template.spec.init_containers[0].args,
+        )
+
+        execution.monitor(interval=0.05)
+
+        self.assertEqual(execution.get_output(), params)
+
+    def test_write_to_volume_failure(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        helper_pod = HelperPod(
+            context=session,
+            volume={
+                "name": "volume-calrissian-wdir",
+                "persistentVolumeClaim": {"claimName": "calrissian-wdir"},
+            },
+            volume_mount={"name": "volume-calrissian-wdir", "mountPath": "/data"},
+        )
+
+        helper_pod.write_to_volume(b"staged", "/data/inputs/staged")
+        self.assertEqual(
+            cluster.volumes[("fake-namespace", "calrissian-wdir")]["inputs/staged"],
+            b"staged",
+        )
+
+        # streamed through stdin in several websocket messages
+        content = os.urandom(200000)
+        helper_pod.write_to_volume(content, "/data/inputs/large", chunk_size=4096)
+        self.assertEqual(
+            cluster.volumes[("fake-namespace", "calrissian-wdir")]["inputs/large"],
+            content,
+        )
+
+        # not on the volume, the written file is not found
+        with self.assertRaises(RuntimeError):
+            helper_pod.write_to_volume(b"staged", "/tmp/staged")
+
+    def test_decompress_script(self):
+
+        with open("params.yml.gz", "wb") as compressed:
+            compressed.write(gzip.compress(b"message: hello"))
+
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                DECOMPRESS_SCRIPT,
+                "inputs",
+                "params.yml.gz",
+                "inputs/params.yml",
+            ],
+            check=True,
+        )
+
+        with open("inputs/params.yml") as plain:
+            self.assertEqual(plain.read(), "message: hello")
+
+    def test_side_effect_free_job(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+        requests = sum(cluster.requests.values())
+
+        executions = [
+            self._execution(session, params={"index": index}) for index in range(10)
+        ]
+        executions[0].job.to_yaml("job.yml")
+
+        self.assertEqual(sum(cluster.requests.values()), requests)
+        self.assertEqual(
+            cluster.list("configmaps", "fake-namespace"),
+            [cluster.get("configmaps", "fake-namespace", "kube-root-ca.crt")],
+        )
+
+        self.assertEqual(submit_many(executions, max_workers=4), [None] * 10)
+        for execution in executions:
+            execution.monitor(interval=0.05)
+
+        self.assertEqual(
+            [execution.get_output() for execution in executions],
+            [{"index": index} for index in range(10)],
+        )
+
+    def test_manifest(self):
+
+        session = FakeKubernetes().context(namespace="fake-namespace")
+
+        job = self._execution(session, pod_env_vars={"A": "1"}, keep_pods=True).job
+        manifest = job.to_manifest()
+
+        self.assertEqual(
+            session.api_client.sanitize_for_serialization(job.to_k8s_job()), manifest
+        )
+        self.assertIs(job.to_manifest(), manifest)
+        self.assertIs(job.to_k8s_job(), job.to_k8s_job())
+
+        job.max_cores = 4
+        self.assertIn(
+            "4", job.to_manifest()["spec"]["template"]["spec"]["containers"][0]["args"]
+        )
+
+        job.params["message"] = "bye"
+        job.invalidate()
+        self.assertEqual(job.get_config_maps()[1]["data"]["params"], "message: bye\n")
+
+        job.to_yaml("job.yml")
+        with open("job.yml") as stream:
+            content = stream.read()
+        self.assertNotIn("&id", content)
+        self.assertEqual(yaml.safe_load(content), job.to_manifest())
+
+    def test_failed_execution(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, job_succeeds=lambda job: False)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        self.assertEqual(execution.get_status(), JobStatus.FAILED)
+        self.assertTrue(execution.record.finished)
+        self.assertEqual(execution.record.exit_reason, "BackoffLimitExceeded")
+
+    def test_image_pull_backoff(self):
+
+        cluster = FakeKubernetes(failing_images=["terradue/calrissian:0.12.0"])
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05, grace_period=0.1)
+
+        self.assertEqual(execution.get_status(), JobStatus.KILLED)
+
+    def test_watched_monitor(self):
+
+        cluster = FakeKubernetes(job_duration=1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        self.assertEqual(execution.get_status(), JobStatus.SUCCEEDED)
+        self.assertFalse(hasattr(execution.record, "__dict__"))
+        self.assertIsNone(execution.record.exit_reason)
+        self.assertEqual(
+            execution.record.output_location,
+            os.path.join(execution.job.calrissian_job_path, "output.json"),
+        )
+        # one read before the watch, none once the job finished
+        self.assertLessEqual(cluster.requests[("GET", "jobs", "status")], 2)
+        self.assertIsNotNone(execution.get_start_time())
+        self.assertIsNotNone(execution.get_completion_time())
+        self.assertLessEqual(cluster.requests[("GET", "jobs", "status")], 2)
+
+    def test_deprecated_namespaced_job(self):
+
+        cluster = FakeKubernetes(job_duration=0.1)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        self.assertIsNone(execution.namespaced_job)
+
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        reads = cluster.requests[("GET", "jobs", None)]
+        namespaced_job = execution.namespaced_job
+
+        self.assertEqual(namespaced_job.metadata.name, execution.job.job_name)
+        self.assertEqual(namespaced_job.status.succeeded, 1)
+        self.assertEqual(cluster.requests[("GET", "jobs", None)], reads + 1)
+
+    def test_polled_monitor(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.5,
+            fault=lambda method, path: (
+                500 if method == "GET" and path.endswith("/jobs") else None
+            ),
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05, max_interval=0.2)
+
+        self.assertEqual(execution.get_status(), JobStatus.SUCCEEDED)
+        # the watch is given up after three failures
+        self.assertEqual(cluster.requests[("GET", "jobs", None)], 3)
+
+    def test_closed_watch(self):
+
+        cluster = FakeKubernetes(job_duration=0.5)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+
+        # the server closes every watch at once
+        watches = []
+        execution._watch_status = lambda timeout: watches.append(timeout)
+        execution.monitor(interval=0.1, max_interval=0.1)
+
+        self.assertEqual(execution.get_status(), JobStatus.SUCCEEDED)
+        # not reconnected in a busy loop, the status is read between watches
+        self.assertLessEqual(len(watches), 10)
+        self.assertEqual(cluster.requests[("GET", "jobs", "status")], len(watches) + 1)
+
+    def test_raw_json(self):
+
+        cluster = FakeKubernetes(job_duration=0.2, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace", raw_json=True)
+        session.initialise()
+
+        self.assertTrue(session.is_pvc_created(name="calrissian-wdir"))
+        self.assertTrue(
+            session.wait_for_object(
+                "read_namespaced_config_map", name="kube-root-ca.crt"
+            )
+        )
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        self.assertTrue(execution.is_succeeded())
+        self.assertEqual(execution.get_log(), cluster.log)
+        self.assertEqual(execution.get_waiting_pods(), [])
+
+        self.assertEqual(session.dispose()["kind"], "Namespace")
+        self.assertFalse(session.is_namespace_created())
+
+    def test_raw_waiting_pods(self):
+
+        cluster = FakeKubernetes(failing_images=["terradue/calrissian:0.12.0"])
+        session = cluster.context(namespace="fake-namespace", raw_json=True)
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05, grace_period=0.1)
+
+        self.assertEqual(execution.get_status(), JobStatus.KILLED)
+
+    def test_shared_helper_pod(self):
+
+        cluster = FakeKubernetes(job_duration=0.1, outputs=lambda params: params)
+        session = cluster.context(namespace="fake-namespace", helper_pod_idle_time=0.5)
+        session.initialise()
+
+        execution = self._execution(session)
+        execution.submit()
+        execution.monitor(interval=0.05)
+
+        def helper_pods():
+            return [
+                pod["metadata"]["name"]
+                for pod in cluster.list("pods", "fake-namespace")
+                if pod["metadata"]["name"].startswith("kube-cp-")
+            ]
+
+        created = cluster.requests[("POST", "pods", None)]
+        self.assertEqual(execution.get_output(), self.params)
+        self.assertIn("children", execution.get_usage_report())
+        self.assertEqual(execution.get_tool_logs(), ["./tool.log"])
+        # one helper pod for the three copies
+        self.assertEqual(cluster.requests[("POST", "pods", None)], created + 1)
+        self.assertEqual(len(helper_pods()), 1)
+
+        # a deleted helper pod is replaced
+        (shared_helper_pod,) = session.helper_pods.values()
+        shared_helper_pod.check_interval = 0
+        cluster.delete("pods", "fake-namespace", helper_pods()[0])
+        self.assertEqual(execution.get_output(), self.params)
+        self.assertEqual(cluster.requests[("POST", "pods", None)], created + 2)
+
+        # and deleted once idle
+        time.sleep(1)
+        self.assertEqual(helper_pods(), [])
+
+        self.assertEqual(execution.get_output(), self.params)
+        session.dispose()
+        self.assertEqual(session.helper_pods, {})
+
+    def test_cached_session(self):
+
+        cluster = FakeKubernetes()
+        session = cluster.context(namespace="fake-namespace", use_cache=True)
+        session.create_namespace()
+
+        self.assertTrue(session.cache.wait_for_sync(timeout=5))
+
+        session.create_configmap(name="cached-cm", key="key", content="value")
+
+        self.assertIsNotNone(
+            session.retry(
+                session.cache.get,
+                interval=0.05,
+                timeout=5,
+                read_method="read_namespaced_config_map",
+                name="cached-cm",
+            )
+        )
+
+        session.dispose()
+
+    def test_latency(self):
+
+        cluster = FakeKubernetes(latency=0.05)
+        session = cluster.context(namespace="fake-namespace")
+
+        start = time.perf_counter()
+        session.is_namespace_created()
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual(cluster.requests[("GET", "namespaces", None)], 1)
@@ -0,0 +1,176 @@
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.instrumentation import Instrumentation, parse_method
+from pycalrissian.throttling import RetryPolicy
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_parse_method(self):
+
+        self.assertEqual(
+            parse_method("read_namespaced_job_status"), ("get", "Job", "status")
+        )
+        self.assertEqual(
+            parse_method("delete_collection_namespaced_pod"),
+            ("deletecollection", "Pod", ""),
+        )
+        self.assertEqual(
+            parse_method("list_namespaced_role_binding"), ("list", "RoleBinding", "")
+        )
+        self.assertEqual(parse_method("read_namespaced_pod_log"), ("get", "Pod", "log"))
+
+    def test_histograms(self):
+
+        instrumentation = Instrumentation(buckets=[0.1, 1])
+        instrumentation.record("get", "Pod", 0.05, 200)
+        instrumentation.record("get", "Pod", 0.5, 200, attempt=2)
+        instrumentation.record("get", "Pod", 5, 200)
+
+        histogram = instrumentation.get_histograms()[("get", "Pod", "", 200)]
+
+        self.assertEqual(histogram["buckets"], {0.1: 1, 1: 2})
+        self.assertEqual(histogram["count"], 3)
+        # one retried call
+        self.assertEqual(instrumentation.get_retries(), {("get", "Pod", ""): 1})
+
+        text = instrumentation.to_prometheus()
+        self.assertIn(
+            'pycalrissian_api_request_duration_seconds_bucket{verb="get",kind="Pod",'
+            'subresource="",code="200",le="+Inf"} 3',
+            text,
+        )
+        self.assertIn(
+            'pycalrissian_api_request_retries_total{verb="get",kind="Pod",'
+            'subresource=""} 1',
+            text,
+        )
+
+    def test_spans(self):
+
+        spans = []
+
+        class Span:
+            def __init__(self, name, start_time, attributes):
+                self.name = name
+                self.start_time = start_time
+                self.attributes = attributes
+                spans.append(self)
+
+            def set_status(self, status):
+                pass
+
+            def end(self, end_time):
+                self.end_time = end_time
+
+        class Tracer:
+            def start_span(self, name, start_time, attributes):
+                return Span(name, start_time, attributes)
+
+        instrumentation = Instrumentation(tracer=Tracer())
+        instrumentation.record("get", "Job", 0.25, 200, subresource="status")
+
+        self.assertEqual(spans[0].name, "get Job/status")
+        self.assertEqual(spans[0].end_time - spans[0].start_time, 250000000)
+        self.assertEqual(spans[0].attributes["http.status_code"], 200)
+        self.assertEqual(spans[0].attributes["retry.attempt"], 0)
+
+        # not set when the status is unknown
+        instrumentation.record("get", "Job", 0.25, None, attempt=1)
+        self.assertNotIn("http.status_code", spans[1].attributes)
+        self.assertEqual(spans[1].attributes["retry.attempt"], 1)
+
+    def test_instrumented_context(self):
+
+        cluster = FakeKubernetes()
+        instrumentation = Instrumentation()
+        session = cluster.context(
+            namespace="instrumented-namespace", instrumentation=instrumentation
+        )
+        session.create_namespace()
+
+        self.assertEqual(
+            instrumentation.get_request_count(),
+            sum(cluster.requests.values()),
+        )
+
+        with self.assertRaises(ApiException):
+            session.retry(
+                session.core_v1_api.read_namespaced_config_map,
+                name="missing",
+                namespace=session.namespace,
+            )
+
+        histograms = instrumentation.get_histograms()
+        self.assertEqual(histograms[("get", "ConfigMap", "", 404)]["count"], 1)
+        self.assertEqual(histograms[("create", "Namespace", "", 201)]["count"], 1)
+
+    def test_retry_count(self):
+
+        cluster = FakeKubernetes()
+        instrumentation = Instrumentation()
+        session = cluster.context(
+            namespace="instrumented-namespace", instrumentation=instrumentation
+        )
+
+        session.retry(
+            session.is_namespace_created, max_tries=3, interval=0.01, max_interval=0.01
+        )
+
+        # the first read is not a retry
+        self.assertEqual(instrumentation.get_retries(), {("get", "Namespace", ""): 2})
+
+    def test_retried_call_count(self):
+
+        failures = 3
+        reads = []
+
+        def fault(method, path):
+            if method == "GET" and path.endswith("/configmaps/cm"):
+                reads.append(path)
+                if len(reads) <= failures:
+                    return 503
+            return None
+
+        cluster = FakeKubernetes(fault=fault)
+        instrumentation = Instrumentation()
+        session = cluster.context(
+            namespace="instrumented-namespace",
+            instrumentation=instrumentation,
+            retry_policy=RetryPolicy(max_tries=5, interval=0.01, max_interval=0.01),
+        )
+        cluster.create("namespaces", None, {"metadata": {"name": session.namespace}})
+        cluster.create("configmaps", session.namespace, {"metadata": {"name": "cm"}})
+
+        session.core_v1_api.read_namespaced_config_map(
+            name="cm", namespace=session.namespace
+        )
+
+        # succeeded on the 4th attempt, 3 retries
+        self.assertEqual(len(reads), failures + 1)
+        self.assertEqual(
+            instrumentation.get_retries(), {("get", "ConfigMap", ""): failures}
+        )
+        histograms = instrumentation.get_histograms()
+        self.assertEqual(histograms[("get", "ConfigMap", "", 503)]["count"], failures)
+        self.assertEqual(histograms[("get", "ConfigMap", "", 200)]["count"], 1)
+
+    def test_status_codes(self):
+
+        cluster = FakeKubernetes()
+        instrumentation = Instrumentation()
+        session = cluster.context(
+            namespace="instrumented-namespace", instrumentation=instrumentation
+        )
+        session.create_namespace()
+        session.core_v1_api.read_namespace(
+            name="instrumented-namespace", _preload_content=False
+        )
+        session.core_v1_api.delete_namespace(name="instrumented-namespace")
+
+        histograms = instrumentation.get_histograms()
+        self.assertIn(("create", "Namespace", "", 201), histograms)
+        self.assertIn(("get", "Namespace", "", 200), histograms)
+        self.assertIn(("delete", "Namespace", "", 200), histograms)
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+from pycalrissian.execution import CalrissianExecution, JobStatus
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob
+from pycalrissian.manager import MANAGER_LABEL, ExecutionManager
+
+
+class TestExecutionManager(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwl = {
+            "cwlVersion": "v1.0",
+            "$graph": [{"class": "Workflow", "id": "main"}],
+        }
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _executions(self, session, count):
+
+        return [
+            CalrissianExecution(
+                job=CalrissianJob(
+                    cwl=self.cwl,
+                    params={"tile": f"T{index}"},
+                    runtime_context=session,
+                    cwl_entry_point="main",
+                ),
+                runtime_context=session,
+            )
+            for index in range(count)
+        ]
+
+    def test_wait_all(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.2,
+            job_succeeds=lambda job: job["metadata"]["name"] != failing_job,
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        manager = ExecutionManager(interval=0.05)
+        executions = self._executions(session, 20)
+        failing_job = executions[3].job.job_name
+        self.assertEqual(manager.submit(executions), [None] * 20)
+        self.assertIn(
+            MANAGER_LABEL, executions[0].job.to_manifest()["metadata"]["labels"]
+        )
+
+        completed = manager.wait_all(timeout=10)
+        manager.stop()
+
+        self.assertEqual(len(completed), 20)
+        statuses = {
+            execution.job.job_name: execution.get_status() for execution in completed
+        }
+        self.assertEqual(statuses.pop(failing_job), JobStatus.FAILED)
+        self.assertEqual(set(statuses.values()), {JobStatus.SUCCEEDED})
+
+        # one list and watch of the jobs and pods, no status read
+        self.assertEqual(cluster.requests[("GET", "jobs", "status")], 0)
+        self.assertLessEqual(cluster.requests[("GET", "jobs", None)], 2)
+        self.assertLessEqual(cluster.requests[("GET", "pods", None)], 2)
+
+    def test_image_pull_backoff(self):
+
+        cluster = FakeKubernetes(failing_images=["terradue/calrissian:0.12.0"])
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        manager = ExecutionManager(interval=0.05, grace_period=0.1)
+        execution = self._executions(session, 1)[0]
+        manager.submit([execution])
+
+        self.assertEqual(list(manager.as_completed(timeout=5)), [execution])
+        manager.stop()
+
+        self.assertEqual(execution.get_status(), JobStatus.KILLED)
+
+    def test_register_submitted(self):
+
+        cluster = FakeKubernetes(job_duration=0.1)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        execution = self._executions(session, 1)[0]
+        execution.submit()
+
+        with self.assertRaises(ValueError):
+            ExecutionManager().register(execution)
+
+    def test_restart(self):
+
+        cluster = FakeKubernetes(job_duration=0.2)
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        manager = ExecutionManager(interval=0.05)
+        dispatched = Counter()
+        dispatch_job = manager._dispatch_job
+
+        def count(event_type, job):
+            dispatched[(event_type, job["metadata"]["resourceVersion"])] += 1
+            dispatch_job(event_type, job)
+
+        manager._dispatch_job = count
+
+        first, second = self._executions(session, 2)
+        manager.submit([first])
+        manager.wait_all(timeout=10)
+        manager.stop()
+
+        # the watches of the stopped manager may still be streaming
+        manager.submit([second])
+        self.assertEqual(manager.wait_all(timeout=10), [second])
+        manager.stop()
+
+        self.assertEqual(set(dispatched.values()), {1})
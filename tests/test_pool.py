@@ -0,0 +1,158 @@
+import os
+import threading
+import unittest
+
+from pycalrissian.context import CalrissianContext
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.pool import NamespacePool
+
+os.environ["KUBECONFIG"] = "~/.kube/kubeconfig-t2-dev.yaml"
+
+
+class TestNamespacePool(unittest.TestCase):
+    def setUp(self):
+        self.cluster = FakeKubernetes()
+        self.pool = NamespacePool(
+            namespace_prefix="pool-namespace",
+            storage_class="standard",
+            volume_size="1G",
+            size=1,
+            api_client=self.cluster.api_client,
+        )
+        self.pool.start(wait=True, timeout=10)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_lease(self):
+
+        with self.pool.leased(timeout=10) as context:
+            self.assertIsInstance(context, CalrissianContext)
+            self.assertTrue(context.is_pvc_created(name=context.calrissian_wdir))
+
+        metrics = self.pool.get_metrics()
+
+        self.assertEqual(metrics["hits"] + metrics["misses"], 1)
+        self.assertIsNotNone(metrics["lease_wait_time_avg"])
+
+    def test_recycle(self):
+
+        context = self.pool.lease(timeout=10)
+        volume = self.cluster.volumes.setdefault(
+            (context.namespace, context.calrissian_wdir), {}
+        )
+        volume["job/output.json"] = b"{}"
+
+        self.pool.release(context)
+
+        # cleaned and back in the pool
+        recycled = context.retry(
+            lambda: context in [idle for idle, _ in self.pool._idle],
+            max_tries=200,
+            interval=0.05,
+            timeout=10,
+        )
+        self.assertTrue(recycled)
+        self.assertEqual(volume, {})
+
+    def test_closed(self):
+
+        self.pool.close()
+
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            self.pool.lease(timeout=1)
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            self.pool.refill()
+
+    def test_release_closing(self):
+
+        context = self.pool.lease(timeout=10)
+        # close() shut the workers down after the release checked the pool
+        self.pool._executor.shutdown(wait=True)
+
+        self.pool.release(context)
+
+        self.assertIsNone(self.cluster.get("namespaces", None, context.namespace))
+
+    def test_refill_closing(self):
+
+        self.pool.size = 3
+        # close() shut the workers down after the refill checked the pool
+        self.pool._executor.shutdown(wait=True)
+
+        with self.assertRaises(RuntimeError):
+            self.pool.refill()
+        self.assertEqual(self.pool.get_metrics()["provisioning"], 0)
+
+    def test_helper_pod_pending(self):
+
+        cluster = FakeKubernetes(failing_images=["busybox"])
+        pool = NamespacePool(
+            namespace_prefix="pool-namespace",
+            storage_class="standard",
+            volume_size="1G",
+            size=1,
+            helper_pod_timeout=0.1,
+            api_client=cluster.api_client,
+        )
+        try:
+            pool.start()
+            provisioned = CalrissianContext.retry(
+                lambda: pool.get_metrics()["provisioning"] == 0,
+                max_tries=200,
+                interval=0.05,
+                timeout=10,
+            )
+        finally:
+            pool.close()
+
+        # a provisioning failure: the namespace is disposed, not pooled
+        self.assertTrue(provisioned)
+        self.assertEqual(pool.get_metrics()["idle"], 0)
+        self.assertEqual(cluster.list("namespaces"), [])
+
+    def test_maintain_closing(self):
+
+        context = self.pool._idle[0][0]
+        self.pool.max_idle_time = 0
+        self.pool.maintenance_interval = 0.05
+        # close() shut the workers down after the maintenance checked the pool
+        self.pool._executor.shutdown(wait=True)
+
+        maintenance = threading.Thread(target=self.pool._maintain, daemon=True)
+        maintenance.start()
+        maintenance.join(timeout=5)
+
+        self.assertFalse(maintenance.is_alive())
+        # the expired namespace is disposed even though it was not submitted
+        self.assertIsNone(self.cluster.get("namespaces", None, context.namespace))
+
+
+@unittest.skipUnless(
+    os.getenv("CI_TEST_LIVE") == "1", "needs a live cluster, set CI_TEST_LIVE=1"
+)
+class TestLiveNamespacePool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = NamespacePool(
+            namespace_prefix="pool-namespace",
+            storage_class="microk8s-hostpath",
+            volume_size="1G",
+            size=1,
+        )
+        cls.pool.start(wait=True, timeout=300)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_lease(self):
+
+        with self.pool.leased(timeout=300) as context:
+            self.assertIsInstance(context, CalrissianContext)
+            self.assertTrue(context.is_pvc_created(name=context.calrissian_wdir))
+
+        metrics = self.pool.get_metrics()
+
+        self.assertEqual(metrics["hits"] + metrics["misses"], 1)
+        self.assertIsNotNone(metrics["lease_wait_time_avg"])
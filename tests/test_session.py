@@ -2,7 +2,7 @@ import base64
 import os
 import unittest
 
-from pycalrissian.context import CalrissianContext
+from pycalrissian.context import CalrissianContext, dispose_many
 
 os.environ["KUBECONFIG"] = "~/.kube/kubeconfig-t2-dev.yaml"
 
@@ -53,3 +53,34 @@ class TestCalrissianExecution(unittest.TestCase):
     def test_session_dispose(self):
 
         self.session.dispose()
+
+    def test_session_dispose_background(self):
+
+        session = CalrissianContext(
+            namespace="background-deleted-namespace",
+            storage_class="longhorn",
+            volume_size="1G",
+        )
+        session.create_namespace()
+
+        future = session.dispose(wait=False)
+
+        self.assertIsNotNone(future.result(timeout=60))
+
+    def test_dispose_many(self):
+
+        sessions = [
+            CalrissianContext(
+                namespace=f"many-deleted-namespace-{index}",
+                storage_class="longhorn",
+                volume_size="1G",
+            )
+            for index in range(3)
+        ]
+        for session in sessions:
+            session.create_namespace()
+
+        responses = dispose_many(sessions, max_workers=3)
+
+        self.assertEqual(len(responses), 3)
+        self.assertFalse(any(isinstance(r, Exception) for r in responses))
@@ -0,0 +1,203 @@
+import os
+import tempfile
+import unittest
+
+from pycalrissian.array import ARRAY_INDEX_LABEL
+from pycalrissian.execution import JobStatus
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.sharding import (
+    ShardedCalrissianJob,
+    get_dotproduct_inputs,
+    get_scatter_inputs,
+    merge_outputs,
+    shard_params,
+)
+
+
+class TestSharding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwl = {
+            "cwlVersion": "v1.0",
+            "$graph": [
+                {
+                    "class": "Workflow",
+                    "id": "main",
+                    "inputs": {"tiles": "string[]", "date": "string"},
+                    "outputs": {},
+                    "requirements": [{"class": "ScatterFeatureRequirement"}],
+                    "steps": {
+                        "process": {
+                            "run": "#process",
+                            "in": {"tile": "tiles", "date": {"source": "date"}},
+                            "out": [],
+                            "scatter": "tile",
+                        }
+                    },
+                },
+                {"class": "CommandLineTool", "id": "process"},
+            ],
+        }
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_get_scatter_inputs(self):
+
+        self.assertEqual(get_scatter_inputs(self.cwl, "main"), ["tiles"])
+
+        workflow = {
+            "class": "Workflow",
+            "inputs": [{"id": "#main/items", "type": "string[]"}],
+            "steps": [
+                {
+                    "id": "#main/step",
+                    "in": [{"id": "#main/step/item", "source": "#main/items"}],
+                    "scatter": ["#main/step/item"],
+                }
+            ],
+        }
+        self.assertEqual(get_scatter_inputs(workflow), ["items"])
+
+    def test_shard_params(self):
+
+        params = {"tiles": list(range(10)), "date": "2023-01-01"}
+
+        shards = shard_params(params, "tiles", 3)
+
+        self.assertEqual(
+            [shard["tiles"] for shard in shards],
+            [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]],
+        )
+        self.assertTrue(all(shard["date"] == "2023-01-01" for shard in shards))
+        self.assertEqual(len(shard_params({"tiles": [1, 2]}, "tiles", 4)), 2)
+
+        with self.assertRaises(ValueError):
+            shard_params(params, "tiles", 0)
+
+    def test_shard_dotproduct_params(self):
+
+        cwl = {
+            "class": "Workflow",
+            "inputs": {"tiles": "string[]", "dates": "string[]"},
+            "steps": {
+                "process": {
+                    "in": {"tile": "tiles", "date": "dates"},
+                    "scatter": ["tile", "date"],
+                    "scatterMethod": "dotproduct",
+                }
+            },
+        }
+        self.assertEqual(get_dotproduct_inputs(cwl, "tiles"), ["tiles", "dates"])
+
+        params = {"tiles": list(range(5)), "dates": list("abcde")}
+
+        shards = shard_params(params, ["tiles", "dates"], 2)
+
+        self.assertEqual(
+            [(shard["tiles"], shard["dates"]) for shard in shards],
+            [([0, 1, 2], ["a", "b", "c"]), ([3, 4], ["d", "e"])],
+        )
+        with self.assertRaises(ValueError):
+            shard_params({"tiles": [1, 2], "dates": ["a"]}, ["tiles", "dates"], 2)
+
+        cwl["steps"]["process"]["scatterMethod"] = "flat_crossproduct"
+        self.assertEqual(get_dotproduct_inputs(cwl, "tiles"), ["tiles"])
+
+    def test_merge_outputs(self):
+
+        self.assertEqual(
+            merge_outputs(
+                [
+                    {"results": [1, 2], "name": "a", "size": 2},
+                    {"results": [3], "name": "a", "size": 1},
+                ]
+            ),
+            {"results": [1, 2, 3], "name": "a", "size": [2, 1]},
+        )
+
+    def test_sharded_job(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.1,
+            outputs=lambda params: {
+                "results": [f"{tile}-{params['date']}" for tile in params["tiles"]],
+                "date": params["date"],
+            },
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        params = {"tiles": [f"T{index}" for index in range(10)], "date": "2023"}
+
+        for indexed in [True, False]:
+            job = ShardedCalrissianJob(
+                cwl=self.cwl,
+                params=params,
+                runtime_context=session,
+                shards=3,
+                indexed=indexed,
+                cwl_entry_point="main",
+            )
+            self.assertEqual(job.scatter_input, "tiles")
+
+            job.submit()
+
+            self.assertEqual(
+                job.monitor(interval=0.05, timeout=10), JobStatus.SUCCEEDED
+            )
+            self.assertEqual(
+                job.get_merged_output(),
+                {
+                    "results": [f"{tile}-2023" for tile in params["tiles"]],
+                    "date": "2023",
+                },
+            )
+
+    def test_sharded_job_failed_shard(self):
+
+        cluster = FakeKubernetes(
+            job_duration=0.1,
+            job_succeeds=lambda job: job["metadata"]["labels"][ARRAY_INDEX_LABEL]
+            != "0",
+        )
+        session = cluster.context(namespace="fake-namespace")
+        session.initialise()
+
+        job = ShardedCalrissianJob(
+            cwl=self.cwl,
+            params={"tiles": [f"T{index}" for index in range(10)], "date": "2023"},
+            runtime_context=session,
+            shards=3,
+            parallelism=1,
+            indexed=False,
+            cwl_entry_point="main",
+        )
+        job.submit()
+
+        # the failed shard completes before the others are submitted
+        index, status, _ = next(job.as_completed(interval=0.05, timeout=10))
+        self.assertEqual((index, status), (0, JobStatus.FAILED))
+        self.assertIsNone(job.get_merged_output())
+
+        self.assertEqual(job.monitor(interval=0.05, timeout=10), JobStatus.FAILED)
+        self.assertIsNone(job.get_merged_output())
+
+    def test_no_scatter_input(self):
+
+        session = FakeKubernetes().context(namespace="fake-namespace")
+
+        with self.assertRaises(ValueError):
+            ShardedCalrissianJob(
+                cwl=self.cwl,
+                params={"tiles": "T1", "date": "2023"},
+                runtime_context=session,
+                shards=3,
+                cwl_entry_point="main",
+            )
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+from pycalrissian.execution import CalrissianExecution
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.job import CalrissianJob
+from pycalrissian.sizing import SizingAdvisor
+
+
+class TestSizingAdvisor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwl = {
+            "cwlVersion": "v1.0",
+            "$graph": [{"class": "Workflow", "id": "main"}],
+        }
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        self.session = FakeKubernetes(job_duration=0.1).context(
+            namespace="fake-namespace"
+        )
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _job(self, cwl=None):
+
+        return CalrissianJob(
+            cwl=cwl or self.cwl,
+            params={},
+            runtime_context=self.session,
+            cwl_entry_point="main",
+        )
+
+    def test_advise(self):
+
+        advisor = SizingAdvisor(history_path="history.json", window=2)
+        job = self._job()
+
+        self.assertIsNone(advisor.advise(job))
+        self.assertFalse(advisor.apply(job))
+
+        for cpus, ram in [(16, 16000), (2, 3000), (3, 2000)]:
+            advisor.record(
+                job,
+                {
+                    "max_parallel_cpus": cpus,
+                    "max_parallel_ram_megabytes": ram,
+                    "max_parallel_tasks": 2,
+                },
+            )
+
+        # the history of the workflow is shared by its jobs and persisted
+        job = self._job()
+        advice = SizingAdvisor(history_path="history.json").advise(job)
+
+        self.assertEqual(advice["max_cores"], "4")
+        self.assertEqual(advice["max_ram"], "3750M")
+        self.assertEqual(
+            advice["resources"]["requests"], {"cpu": "350m", "memory": "576M"}
+        )
+
+        self.assertTrue(advisor.apply(job))
+        container = job.to_manifest()["spec"]["template"]["spec"]["containers"][0]
+        self.assertEqual(container["resources"], advice["resources"])
+        self.assertIn("3750M", container["args"])
+
+        self.assertIsNone(advisor.advise(self._job(cwl={**self.cwl, "id": "other"})))
+
+    def test_execution(self):
+
+        self.session.initialise()
+        advisor = SizingAdvisor()
+
+        for _ in range(2):
+            job = self._job()
+            execution = CalrissianExecution(
+                job=job, runtime_context=self.session, sizing_advisor=advisor
+            )
+            execution.submit()
+            execution.monitor(interval=0.05)
+
+        # the fake usage report peaks at 1 CPU and 256MB
+        self.assertEqual(len(advisor.get_history(job)), 2)
+        self.assertEqual((job.max_cores, job.max_ram), ("2", "1024M"))
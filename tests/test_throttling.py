@@ -0,0 +1,115 @@
+import time
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from pycalrissian.fake import FakeKubernetes
+from pycalrissian.throttling import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    TokenBucket,
+)
+
+
+class TestThrottling(unittest.TestCase):
+    def test_token_bucket(self):
+
+        bucket = TokenBucket(qps=20, burst=5)
+
+        start = time.perf_counter()
+        for _ in range(10):
+            bucket.acquire()
+
+        # the burst is immediate, the five other tokens take 1/20s each
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertFalse(bucket.acquire(timeout=0.001))
+
+    def test_retry_policy(self):
+
+        policy = RetryPolicy(interval=0.1, max_interval=1)
+
+        self.assertTrue(policy.is_retryable(ApiException(status=503), "get"))
+        self.assertTrue(policy.is_retryable(ApiException(status=429), "create"))
+        self.assertFalse(policy.is_retryable(ApiException(status=503), "create"))
+        self.assertFalse(policy.is_retryable(ApiException(status=404), "get"))
+        self.assertTrue(policy.is_retryable(ConnectionRefusedError(), "list"))
+        self.assertFalse(policy.is_retryable(TypeError(), "list"))
+
+        exc = ApiException(status=429)
+        exc.headers = {"Retry-After": "0.5"}
+        self.assertEqual(policy.get_delay(0, exc), 0.5)
+        self.assertLessEqual(policy.get_delay(10, ApiException(status=503)), 1)
+
+    def test_circuit_breaker(self):
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+
+        breaker.record_failure(ApiException(status=500))
+        breaker.record_failure(ApiException(status=404))
+        breaker.record_failure(ApiException(status=500))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        breaker.record_failure(ApiException(status=500))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # a single trial call
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retry_after(self):
+
+        failures = [429, 429]
+        cluster = FakeKubernetes(
+            fault=lambda method, path: failures.pop(0) if failures else None,
+            retry_after=0.1,
+        )
+        session = cluster.context(namespace="throttled-namespace")
+
+        start = time.perf_counter()
+        self.assertFalse(session.is_namespace_created())
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertEqual(cluster.requests[("GET", "namespaces", None)], 3)
+
+    def test_circuit_open(self):
+
+        cluster = FakeKubernetes(fault=lambda method, path: 503)
+        session = cluster.context(
+            namespace="throttled-namespace",
+            retry_policy=RetryPolicy(max_tries=1),
+            circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+        )
+
+        for _ in range(3):
+            with self.assertRaises(ApiException):
+                session.is_namespace_created()
+
+        with self.assertRaises(CircuitOpenError):
+            session.is_namespace_created()
+
+        self.assertEqual(cluster.requests[("GET", "namespaces", None)], 3)
+
+    def test_shared_rate_limiter(self):
+
+        cluster = FakeKubernetes()
+        rate_limiter = TokenBucket(qps=50, burst=1)
+        sessions = [
+            cluster.context(namespace=f"namespace-{index}", rate_limiter=rate_limiter)
+            for index in range(2)
+        ]
+
+        start = time.perf_counter()
+        for _ in range(3):
+            for session in sessions:
+                session.is_namespace_created()
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)